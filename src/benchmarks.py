@@ -0,0 +1,227 @@
+import argparse
+import json
+import multiprocessing
+import pathlib
+import platform
+import subprocess
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import nltk
+import numpy as np
+import polars as pl
+from dotenv import dotenv_values
+from gensim.corpora.dictionary import Dictionary
+from nltk.corpus import stopwords
+
+# Local imports
+import coherence
+import corpora
+import frex
+import generate_topics
+import instrumentation
+import preprocessing
+import synthetic
+from stemming import StemCache
+
+
+STAGES = ["preprocess", "stem", "preprocess_and_stem", "corpus", "frex", "lda"]
+# Default CLI options
+SIZES = [1_000, 10_000, 100_000, 1_000_000]
+N_TOPICS = 10
+WORKERS = 4
+RAW_FILE = "raw.parquet"
+STEMMED_FILE = "stemmed.parquet"
+
+
+def main():
+    args = parse_args()
+    config = dotenv_values(".env")
+    output_dir = pathlib.Path(config["OUTPUT_DIR"]) / "benchmarks"
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    settings = {
+        "doc_length": args.doc_length,
+        "vocab_size": args.vocab_size,
+        "zipf_exponent": args.zipf_exponent,
+        "seed": args.seed,
+        "n_topics": args.n_topics,
+        "workers": args.workers,
+    }
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "machine": {"platform": platform.platform(), "processor": platform.processor(), "python": platform.python_version()},
+        "settings": settings,
+        "results": [],
+    }
+    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    out_path = pathlib.Path(args.output) if args.output else output_dir / f"benchmark_{timestamp}.json"
+
+    for n_docs in args.sizes:
+        with tempfile.TemporaryDirectory() as work_dir:
+            work_dir = pathlib.Path(work_dir)
+            print(f"Generating {n_docs} documents...")
+            try:
+                # Stopwords are part of the texts and removed from the stemmed inputs of later stages
+                prepare_inputs(work_dir, n_docs, settings)
+            except LookupError:
+                print(f"{n_docs:>9} docs: skipped, nltk data is missing")
+                continue
+            for stage in args.stages:
+                try:
+                    result = run_isolated(stage, work_dir, settings)
+                except LookupError:
+                    # Missing nltk data, which cannot be downloaded on an offline box
+                    print(f"{stage:>20} {n_docs:>9} docs: skipped, nltk data is missing")
+                    continue
+                print(
+                    f"{stage:>20} {n_docs:>9} docs: {result['seconds']:9.2f} s, "
+                    f"{result['docs_per_second']:12.1f} docs/s, peak memory {result['peak_memory_mb']} MB"
+                )
+                report["results"].append(result)
+                # Saved after every stage, so the results of an interrupted run are kept
+                with open(out_path, "w") as f:
+                    json.dump(report, f, indent=4)
+    print(f"Results saved to '{out_path}'")
+
+
+def parse_args():
+    """
+    Instantiates parser and sets up arguments. Returns parsed args.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages on synthetic corpora")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES,
+        help=f"Numbers of documents to benchmark (default: {SIZES})")
+    parser.add_argument("--stages", type=str, nargs="+", choices=STAGES, default=STAGES,
+        help="Stages to benchmark (default: every stage)")
+    parser.add_argument("--doc_length", type=int, default=synthetic.DOC_LENGTH,
+        help=f"Average number of words per document (default: {synthetic.DOC_LENGTH})")
+    parser.add_argument("--vocab_size", type=int, default=synthetic.VOCAB_SIZE,
+        help=f"Number of distinct words (default: {synthetic.VOCAB_SIZE})")
+    parser.add_argument("--zipf_exponent", type=float, default=synthetic.ZIPF_EXPONENT,
+        help=f"Exponent of the Zipf distribution of words (default: {synthetic.ZIPF_EXPONENT})")
+    parser.add_argument("--seed", type=int, default=synthetic.SEED, help=f"Random seed (default: {synthetic.SEED})")
+    parser.add_argument("--n_topics", type=int, default=N_TOPICS,
+        help=f"Number of topics of the LDA and FREX stages (default: {N_TOPICS})")
+    parser.add_argument("--workers", type=int, default=WORKERS,
+        help=f"Number of workers to train LDA (default: {WORKERS})")
+    parser.add_argument("--output", type=str, default=None,
+        help="Output JSON file (default: timestamped file in the benchmarks output directory)")
+    return parser.parse_args()
+
+
+def prepare_inputs(work_dir: pathlib.Path, n_docs: int, settings: dict):
+    """
+    Writes the synthetic raw texts and their stemmed version, which later stages start from.
+    """
+    stop_words = stopwords.words("english")
+    df = synthetic.generate_texts(
+        n_docs, doc_length=settings["doc_length"], vocab_size=settings["vocab_size"],
+        zipf_exponent=settings["zipf_exponent"], stop_words=stop_words, seed=settings["seed"])
+    df.write_parquet(work_dir / RAW_FILE)
+
+    stem_cache = StemCache(work_dir)
+    lf = preprocessing.preprocess_and_stem(pl.scan_parquet(work_dir / RAW_FILE), "text", set(stop_words), stem_cache)
+    lf.sink_parquet(work_dir / STEMMED_FILE)
+
+
+def run_isolated(stage: str, work_dir: pathlib.Path, settings: dict) -> dict:
+    """
+    Runs one stage in a fresh process, so that its peak memory is not inflated by earlier stages.
+    """
+    # Spawning rather than forking, since polars' thread pool does not survive a fork
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        return executor.submit(run_stage, stage, work_dir, settings).result()
+
+
+def run_stage(stage: str, work_dir: pathlib.Path, settings: dict) -> dict:
+    """
+    Loads the inputs of a stage, then times it.
+
+    Returns
+    -------
+    dict
+        Result row: stage, number of documents and tokens, measurements of `instrumentation.StageTimer`
+        and throughput. Start memory is that of the process with the inputs loaded.
+    """
+    stop_words = set(stopwords.words("english"))
+    raw = pl.read_parquet(work_dir / RAW_FILE)["text"]
+    n_docs = len(raw)
+    n_tokens = int(raw.str.count_matches(" ").sum()) + int((raw.str.len_chars() > 0).sum())
+
+    run = stage_function(stage, raw, work_dir, stop_words, settings)
+    timer = instrumentation.StageTimer()
+    with timer.stage(stage, n_docs=n_docs, n_tokens=n_tokens):
+        run()
+    row = timer.rows[0]
+
+    return {
+        **row,
+        "docs_per_second": n_docs / row["seconds"],
+        "tokens_per_second": n_tokens / row["seconds"],
+    }
+
+
+def stage_function(stage: str, raw: pl.Series, work_dir: pathlib.Path, stop_words: set, settings: dict):
+    """
+    Prepares the inputs of a stage outside of the timed section and returns a function running it.
+    """
+    if stage == "preprocess":
+        texts = raw.to_list()
+        return lambda: [preprocessing.preprocess(t, stop_words) for t in texts]
+
+    if stage == "stem":
+        texts = [preprocessing.preprocess(t, stop_words) for t in raw]
+        stemmer = nltk.stem.SnowballStemmer("english")
+        return lambda: [preprocessing.stem(t, stemmer) for t in texts]
+
+    if stage == "preprocess_and_stem":
+        # A new, empty stem cache, so every token of the vocabulary is stemmed
+        def run():
+            stem_cache = StemCache(work_dir / "stem_cache")
+            lf = preprocessing.preprocess_and_stem(pl.scan_parquet(work_dir / RAW_FILE), "text", stop_words, stem_cache)
+            lf.sink_parquet(work_dir / "preprocess_and_stem.parquet")
+        return run
+
+    texts = corpora.ParquetTexts(work_dir / STEMMED_FILE)
+    if stage == "corpus":
+        return lambda: corpora.CorpusCache(work_dir, "corpus").build(texts, {})
+
+    if stage == "frex":
+        # Random topics over the vocabulary of the corpus, as the stage does not depend on the model
+        n_words = len(Dictionary(texts))
+        topics = np.random.default_rng(settings["seed"]).dirichlet(np.full(n_words, 0.1), size=settings["n_topics"])
+        return lambda: frex.exclusivity(topics)
+
+    if stage == "lda":
+        cache = corpora.CorpusCache(work_dir, "lda")
+        cache.build(texts, {})
+        gensim_dict, corpus, cached_texts = cache.load()
+
+        def run():
+            index = coherence.CoherenceIndex(cached_texts, gensim_dict)
+            generate_topics.train_model(
+                settings["n_topics"], gensim_dict, corpus, index, workers=settings["workers"], seed=settings["seed"])
+        return run
+
+    raise ValueError(f"Unknown stage '{stage}'")
+
+
+def git_commit() -> str | None:
+    """
+    Returns the current commit hash, so results can be compared across commits.
+    """
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=pathlib.Path(__file__).parent,
+            capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import numpy as np
+from bertopic import BERTopic
+from bertopic.dimensionality import BaseDimensionalityReduction
+from gensim.corpora.dictionary import Dictionary
+from sklearn.cluster import KMeans
+from sklearn.feature_extraction.text import CountVectorizer
+from umap import UMAP
+
+
+# Parameters of the UMAP reduction of the embeddings, BERTopic's defaults
+UMAP_PARAMS = {"n_neighbors": 15, "n_components": 5, "min_dist": 0.0, "metric": "cosine"}
+
+
+class BertopicModel:
+    """
+    Fitted BERTopic model, seen as a topic-word matrix over a gensim dictionary.
+    Has the attributes of gensim's LDA models that scoring and exports use, so that both are
+    scored and saved the same way.
+
+    Topic-word weights are the c-TF-IDF of each topic normalized to sum to 1, in place of
+    LDA's word probabilities.
+
+    Parameters
+    ----------
+    model : BERTopic
+        Model fitted with the vectorizer of `vectorizer`.
+    gensim_dict : Dictionary
+        Dictionary of the corpus, which is the vocabulary of the model.
+    """
+    def __init__(self, model: BERTopic, gensim_dict: Dictionary):
+        self.model = model
+        self.id2word = gensim_dict
+        self.num_terms = len(gensim_dict)
+        # Rows of c-TF-IDF are in order of topic id, like the topics of `topic_representations_`.
+        # k-means assigns every document, so there is no outlier topic -1, but it is left out if there is one.
+        topic_ids = sorted(model.topic_representations_)
+        rows = [row for row, topic in enumerate(topic_ids) if topic != -1]
+        weights = model.c_tf_idf_[rows].toarray().astype(np.float32)
+        weights /= np.maximum(weights.sum(axis=1, keepdims=True), np.finfo(np.float32).tiny)
+        self.topics = weights
+        self.num_topics = weights.shape[0]
+
+    def get_topics(self) -> np.ndarray:
+        return self.topics
+
+    def save(self, path: str):
+        # The embeddings are given to `fit`, so the model has no embedding model to save
+        self.model.save(path, serialization="pickle", save_embedding_model=False)
+
+
+def vectorizer(gensim_dict: Dictionary) -> CountVectorizer:
+    """
+    Returns a vectorizer counting the words of the dictionary in space-separated texts, in dictionary order.
+    """
+    vocab = [gensim_dict[i] for i in range(len(gensim_dict))]
+    return CountVectorizer(vocabulary=vocab, tokenizer=str.split, token_pattern=None, lowercase=False)
+
+
+def reduce_embeddings(embeddings: np.ndarray, seed: int | None = None) -> np.ndarray:
+    """
+    Reduces the embeddings with UMAP, as BERTopic does before clustering.
+    Done once per sweep, since it does not depend on the number of topics.
+    """
+    return UMAP(random_state=seed, **UMAP_PARAMS).fit_transform(embeddings)
+
+
+def fit(
+        n: int, texts: list[str], reduced_embeddings: np.ndarray, gensim_dict: Dictionary,
+        seed: int | None = None) -> BertopicModel:
+    """
+    Fits a BERTopic model with `n` topics.
+
+    Documents are clustered into exactly `n` topics with k-means, rather than HDBSCAN's data-driven number
+    of topics, so that a sweep over numbers of topics compares like with like, as with LDA.
+    The embeddings are already reduced, so BERTopic's own reduction is skipped.
+
+    Parameters
+    ----------
+    n : int
+        Number of topics.
+    texts : list[str]
+        Documents, as space-separated tokens.
+    reduced_embeddings : np.ndarray
+        Embeddings of the documents reduced by `reduce_embeddings`.
+    gensim_dict : Dictionary
+        Dictionary of the corpus. Topic words are drawn from it.
+    seed : int, optional
+        Random seed of k-means.
+    """
+    model = BERTopic(
+        umap_model=BaseDimensionalityReduction(),
+        hdbscan_model=KMeans(n_clusters=n, random_state=seed, n_init="auto"),
+        vectorizer_model=vectorizer(gensim_dict),
+    )
+    model.fit(texts, embeddings=reduced_embeddings)
+    return BertopicModel(model, gensim_dict)
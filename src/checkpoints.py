@@ -0,0 +1,201 @@
+import hashlib
+import json
+import pathlib
+
+import polars as pl
+from gensim.corpora.dictionary import Dictionary
+from gensim.models.ldamulticore import LdaMulticore
+
+
+CONFIG_FILE = "config.json"
+MODELS_DIR = "models"
+METRICS_DIR = "metrics"
+DICTIONARY_FILE = "dictionary.dict"
+UPDATES_DIR = "updates"
+UPDATES_FILE = "updates.json"
+COARSE_DIR = "coarse"
+TIMINGS_DIR = "timings"
+PROFILES_DIR = "profiles"
+# Columns of the metrics rows, as returned by `generate_topics.score_model`
+METRICS_SCHEMA = {"n_topics": pl.Int64, "exclusivity": pl.Float64, "coherence": pl.Float64}
+
+
+class RunDirectory:
+    """
+    Output directory of a sweep, with one checkpoint per number of topics.
+    Each model is saved as soon as it is trained, followed by its metrics row,
+    so that a restarted sweep only trains the numbers of topics that are missing.
+
+    Parameters
+    ----------
+    path : pathlib.Path
+        Output directory. Created if it doesn't exist.
+    config : dict
+        Settings that determine the trained models (dataset, seed, LDA parameters, ...).
+        Must be JSON serializable. Checkpoints written with different settings are ignored.
+    prefix : str, optional
+        Prefix of the files of each model, the name of the topic model backend. Default `"lda"`.
+    execution : dict, optional
+        Settings of how the run is executed, such as the number of workers. Saved in `config.json`
+        for reference but not hashed, so changing them does not invalidate finished checkpoints.
+
+    Notes
+    -----
+    Layout of the directory, for the default prefix:
+    - `config.json`: settings of the latest run.
+    - `models/lda_XX.model`: gensim model trained with XX topics.
+    - `metrics/lda_XX.json`: metrics row of that model, along with the hash of its settings.
+    - `lda_XX_topics.csv`: top words of each topic.
+    - `lda_XX_frex.csv`: words with the highest FREX in each topic.
+    - `lda_XX_topic_dist.parquet` and `lda_XX_theta.parquet`: topic-word log probabilities
+    and document-topic distributions, when exported.
+    - `dictionary.dict`, `updates.json` and `updates/`: after models are updated with new documents,
+    the extended dictionary, the log of updates and the cached corpus of each update.
+    - `timings/lda_XX.json`: time and memory of each stage of the latest training or update of that model.
+    - `profiles/`: cProfile stats of each stage, when profiled.
+    - `coarse/`: run directory of the cheap models of an adaptive search, with the same layout.
+    """
+    def __init__(self, path: pathlib.Path, config: dict, prefix: str = "lda", execution: dict | None = None):
+        self.path = pathlib.Path(path)
+        self.config = config
+        self.prefix = prefix
+        self.execution = execution or {}
+        self.config_hash = config_hash(config)
+
+        (self.path / MODELS_DIR).mkdir(parents=True, exist_ok=True)
+        (self.path / METRICS_DIR).mkdir(parents=True, exist_ok=True)
+        (self.path / TIMINGS_DIR).mkdir(parents=True, exist_ok=True)
+        with open(self.path / CONFIG_FILE, "w") as f:
+            json.dump({"config_hash": self.config_hash, **config, "execution": self.execution}, f, indent=4)
+
+    def model_path(self, n: int) -> pathlib.Path:
+        return self.path / MODELS_DIR / f"{self.prefix}_{n:02}.model"
+
+    def metrics_path(self, n: int) -> pathlib.Path:
+        return self.path / METRICS_DIR / f"{self.prefix}_{n:02}.json"
+
+    def topics_path(self, n: int) -> pathlib.Path:
+        return self.path / f"{self.prefix}_{n:02}_topics.csv"
+
+    def timings_path(self, n: int) -> pathlib.Path:
+        return self.path / TIMINGS_DIR / f"{self.prefix}_{n:02}.json"
+
+    def profiles_dir(self) -> pathlib.Path:
+        return self.path / PROFILES_DIR
+
+    def frex_path(self, n: int) -> pathlib.Path:
+        return self.path / f"{self.prefix}_{n:02}_frex.csv"
+
+    def topic_dist_path(self, n: int) -> pathlib.Path:
+        return self.path / f"{self.prefix}_{n:02}_topic_dist.parquet"
+
+    def theta_path(self, n: int) -> pathlib.Path:
+        return self.path / f"{self.prefix}_{n:02}_theta.parquet"
+
+    def finished(self) -> dict[int, dict]:
+        """
+        Returns the metrics rows of the models already trained with the current settings, by number of topics.
+        """
+        rows = {}
+        for path in sorted((self.path / METRICS_DIR).glob(f"{self.prefix}_*.json")):
+            with open(path) as f:
+                row = json.load(f)
+            if row["config_hash"] == self.config_hash and self.model_path(row["n_topics"]).exists():
+                rows[row["n_topics"]] = row
+        return rows
+
+    def save_model(self, n: int, lda: LdaMulticore, topics_df: pl.DataFrame):
+        """
+        Saves a trained model and its topics. Called as soon as the model is trained.
+        Other backends' models are saved through their own `save` method, like gensim's.
+        """
+        lda.save(str(self.model_path(n)))
+        topics_df.write_csv(self.topics_path(n))
+
+    def save_metrics(self, metrics: dict):
+        """
+        Saves the metrics row of a model. Written last, so a row always has a saved model behind it.
+        """
+        row = {**metrics, "config_hash": self.config_hash}
+        path = self.metrics_path(metrics["n_topics"])
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(row, f, indent=4)
+        tmp_path.replace(path)
+
+    def save_timings(self, n: int, rows: list[dict]):
+        """
+        Saves the stage timings of a model, as recorded by `instrumentation.StageTimer`.
+        """
+        path = self.timings_path(n)
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(rows, f, indent=4)
+        tmp_path.replace(path)
+
+    def timings_df(self) -> pl.DataFrame:
+        """
+        Returns the stage timings of every finished model in the directory, sorted by number of topics.
+        """
+        rows = []
+        for n in sorted(self.finished()):
+            path = self.timings_path(n)
+            if path.exists():
+                with open(path) as f:
+                    rows.extend({"n_topics": n, **row} for row in json.load(f))
+        return pl.DataFrame(rows)
+
+    def load_model(self, n: int) -> LdaMulticore:
+        return LdaMulticore.load(str(self.model_path(n)))
+
+    def load_dictionary(self) -> Dictionary | None:
+        """
+        Returns the dictionary extended by earlier updates, or `None` if the models were never updated.
+        """
+        path = self.path / DICTIONARY_FILE
+        return Dictionary.load(str(path)) if path.exists() else None
+
+    def save_dictionary(self, gensim_dict: Dictionary):
+        gensim_dict.save(str(self.path / DICTIONARY_FILE))
+
+    def updates(self) -> list[dict]:
+        """
+        Returns the log of updates, oldest first.
+        Each entry holds the input file, its corpus cache key and the numbers of topics of the updated models.
+        """
+        path = self.path / UPDATES_FILE
+        if not path.exists():
+            return []
+        with open(path) as f:
+            return json.load(f)
+
+    def record_update(self, entry: dict):
+        """
+        Adds or replaces an entry of the log of updates, matched on its corpus cache key.
+        """
+        log = [e for e in self.updates() if e["key"] != entry["key"]] + [entry]
+        path = self.path / UPDATES_FILE
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(log, f, indent=4)
+        tmp_path.replace(path)
+
+    def metrics_df(self) -> pl.DataFrame:
+        """
+        Returns the metrics of every finished model in the directory, sorted by number of topics.
+        Empty, with the columns of `METRICS_SCHEMA`, if no model has finished yet.
+        """
+        rows = [
+            {k: v for k, v in row.items() if k != "config_hash"}
+            for row in self.finished().values()
+        ]
+        if not rows:
+            return pl.DataFrame(schema=METRICS_SCHEMA)
+        return pl.DataFrame(rows).sort("n_topics")
+
+
+def config_hash(config: dict) -> str:
+    """
+    Returns a short hash of the settings of a run.
+    """
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()[:16]
@@ -0,0 +1,430 @@
+import itertools
+import pathlib
+import tempfile
+from collections.abc import Iterable
+
+import numpy as np
+import scipy.sparse as sps
+
+from gensim.corpora.dictionary import Dictionary
+
+
+# Window sizes used by gensim for each measure. `None` means whole documents.
+WINDOW_SIZES = {"c_v": 110, "c_npmi": 10, "u_mass": None}
+MEASURES = list(WINDOW_SIZES)
+# Same as gensim's `direct_confirmation_measure.EPSILON`
+EPSILON = 1e-12
+# Default number of top words per topic, same as gensim's `CoherenceModel`
+TOP_N = 20
+# Maximum number of (window, word) entries expanded at once when counting window co-occurrences
+BLOCK_SIZE = 10_000_000
+# Number of documents tokenized at once, and of tokens grouped at once, when building an index
+BUILD_DOCS = 10_000
+BUILD_TOKENS = 10_000_000
+POSITIONS_FILE = "positions.npy"
+WORD_PTR_FILE = "word_ptr.npy"
+WORD_DOCS_FILE = "word_docs.npy"
+DOC_PTR_FILE = "doc_ptr.npy"
+DOC_LENGTHS_FILE = "doc_lengths.npy"
+# Largest absolute difference to gensim's `CoherenceModel` accepted by `check_parity`
+TOLERANCE = 1e-6
+
+
+class CoherenceIndex:
+    """
+    Word occurrence index of a corpus, built once and shared by every model in a sweep.
+
+    Gensim's `CoherenceModel` rescans the texts for each model to count how often its top words
+    occur and co-occur. Here the texts are scanned once, keeping the positions of each word and
+    the documents it occurs in. For each model, only the counts of its top words are computed,
+    with sparse matrix products, and the measures are scored in vectorized NumPy.
+
+    The index is built in batches of documents and written to a directory, and its arrays are memory-mapped
+    from there, so the token stream is never held in memory, and only the occurrences of the top words
+    being scored are read. Pickling the index, e.g. to send it to worker processes, only pickles its directory.
+
+    Layout of the index directory::
+
+        <directory>/
+            positions.npy    # corpus position of every occurrence of every word, grouped by word
+            word_ptr.npy     # start of the occurrences of each word in `positions`, and their end
+            word_docs.npy    # documents each word occurs in, grouped by word
+            doc_ptr.npy      # start of the documents of each word in `word_docs`, and their end
+            doc_lengths.npy  # number of tokens of each document. Written last.
+
+    Parameters
+    ----------
+    texts : Iterable[list[str]]
+        Tokenized documents. Iterated over once.
+    gensim_dict : Dictionary
+        Dictionary the topic models were trained with.
+        Tokens missing from it still take up a position in sliding windows, like in gensim.
+    exact_windows : bool, optional
+        Whether to count words in sliding windows exactly instead of the way gensim does. Default `False`.
+    directory : pathlib.Path, optional
+        Directory the index is written to. By default a temporary directory, removed with the index.
+        See `cached` to reuse an index across runs.
+
+    Notes
+    -----
+    Measures follow gensim's definitions:
+    - `u_mass`: mean log conditional probability of each top word given the ones ranked above it,
+    counted over whole documents.
+    - `c_npmi`: mean normalized pointwise mutual information (NPMI) of all pairs of top words,
+    counted over sliding windows of 10 tokens.
+    - `c_v`: mean cosine similarity between the NPMI vector of each top word and that of the whole topic,
+    counted over sliding windows of 110 tokens.
+
+    Gensim's sliding window accumulator drops a word from the window when one of its occurrences
+    leaves it, even if another occurrence is still inside, so it undercounts words that repeat
+    within a window. By default the same counts are reproduced, so that values match gensim up to
+    floating point error and stay comparable with earlier sweeps. With `exact_windows`, every window
+    containing a word is counted, which can move c_v by a few hundredths.
+    """
+    def __init__(
+            self, texts: Iterable[list[str]], gensim_dict: Dictionary, exact_windows: bool = False,
+            directory: pathlib.Path | None = None):
+        self._tmp = None
+        if directory is None:
+            self._tmp = tempfile.TemporaryDirectory(prefix="coherence_")
+            directory = self._tmp.name
+        build_index(texts, gensim_dict, pathlib.Path(directory))
+        self._open(pathlib.Path(directory), exact_windows)
+
+    @classmethod
+    def cached(
+            cls, directory: pathlib.Path, texts: Iterable[list[str]], gensim_dict: Dictionary,
+            exact_windows: bool = False, rebuild: bool = False) -> "CoherenceIndex":
+        """
+        Opens the index in a directory, building it from the texts first if it is not complete.
+        The directory must be specific to the texts and dictionary, e.g. inside their corpus cache.
+        """
+        directory = pathlib.Path(directory)
+        if rebuild or not (directory / DOC_LENGTHS_FILE).exists():
+            return cls(texts, gensim_dict, exact_windows, directory)
+        index = cls.__new__(cls)
+        index._tmp = None
+        index._open(directory, exact_windows)
+        return index
+
+    def _open(self, directory: pathlib.Path, exact_windows: bool):
+        self.directory = directory
+        self.exact_windows = exact_windows
+        self.positions = np.load(directory / POSITIONS_FILE, mmap_mode="r")
+        self.word_ptr = np.load(directory / WORD_PTR_FILE)
+        self.word_docs = np.load(directory / WORD_DOCS_FILE, mmap_mode="r")
+        self.doc_ptr = np.load(directory / DOC_PTR_FILE)
+        self.doc_lengths = np.load(directory / DOC_LENGTHS_FILE)
+        self.vocab_size = len(self.word_ptr) - 1
+        self.num_docs = len(self.doc_lengths)
+        self.doc_starts = np.concatenate(([0], np.cumsum(self.doc_lengths)[:-1])).astype(np.int64)
+
+    def __getstate__(self) -> dict:
+        # The temporary directory stays owned by the original index
+        return {"directory": self.directory, "exact_windows": self.exact_windows}
+
+    def __setstate__(self, state: dict):
+        self._tmp = None
+        self._open(state["directory"], state["exact_windows"])
+
+    def coherence(self, topics: np.ndarray, measure: str = "c_v", top_n: int = TOP_N) -> float:
+        """
+        Computes the coherence of a model.
+
+        Parameters
+        ----------
+        topics : np.ndarray
+            Topic matrix where each row is a topic and each column is a word within a topic.
+            Returned by `model.get_topics()` in gensim.
+        measure : str, optional
+            One of `MEASURES`. Default `"c_v"`.
+        top_n : int, optional
+            Number of top words per topic. Default `20`.
+
+        Returns
+        -------
+        float
+            Mean coherence across topics.
+        """
+        return float(np.mean(self.topic_coherences(top_word_ids(topics, top_n), measure)))
+
+    def topic_coherences(self, top_ids: np.ndarray, measure: str = "c_v") -> np.ndarray:
+        """
+        Computes the coherence of each topic.
+
+        Parameters
+        ----------
+        top_ids : np.ndarray
+            Word ids of the top words of each topic, one row per topic, as returned by `top_word_ids`.
+            Order matters for `u_mass`.
+        measure : str, optional
+            One of `MEASURES`. Default `"c_v"`.
+
+        Returns
+        -------
+        np.ndarray
+            Coherence of each topic.
+        """
+        if measure not in WINDOW_SIZES:
+            raise ValueError(f"Unknown coherence measure '{measure}'. Choose one of {MEASURES}")
+
+        words, cols = np.unique(top_ids, return_inverse=True)
+        cols = cols.reshape(top_ids.shape)
+        window_size = WINDOW_SIZES[measure]
+        if window_size is None:
+            co_occurrences, num_docs = self.document_co_occurrences(words)
+        else:
+            co_occurrences, num_docs = self.window_co_occurrences(words, window_size)
+
+        # Counts for every pair of top words within each topic: shape (topics, top_n, top_n)
+        pair_counts = co_occurrences[cols[:, :, None], cols[:, None, :]]
+        counts = np.diagonal(pair_counts, axis1=1, axis2=2)
+
+        if measure == "u_mass":
+            return _u_mass(pair_counts, counts, num_docs)
+        npmi = _npmi(pair_counts, counts, num_docs)
+        if measure == "c_npmi":
+            off_diagonal = ~np.eye(top_ids.shape[1], dtype=bool)
+            return npmi[:, off_diagonal].mean(axis=1)
+        return _cosine_to_topic(npmi)
+
+    def document_co_occurrences(self, words: np.ndarray) -> tuple[np.ndarray, int]:
+        """
+        Counts the documents in which each pair of words occurs.
+
+        Returns
+        -------
+        tuple[np.ndarray, int]
+            Dense co-occurrence matrix, with occurrence counts on the diagonal, and number of documents.
+        """
+        docs = [self.word_docs[self.doc_ptr[w]:self.doc_ptr[w + 1]] for w in words]
+        indptr = np.concatenate(([0], np.cumsum([len(d) for d in docs]))).astype(np.int64)
+        indices = np.concatenate(docs) if docs else np.zeros(0, dtype=np.int64)
+        sub = sps.csc_matrix(
+            (np.ones(len(indices), dtype=np.int32), indices, indptr), shape=(self.num_docs, len(words)))
+        return (sub.T @ sub).toarray().astype(np.float64), self.num_docs
+
+    def window_co_occurrences(self, words: np.ndarray, window_size: int) -> tuple[np.ndarray, int]:
+        """
+        Counts the sliding windows in which each pair of words occurs.
+        Windows follow gensim: each document of length `L` has `max(1, L - window_size + 1)` windows,
+        so documents shorter than the window count as a single window.
+        See the class notes for how occurrences are counted.
+
+        Returns
+        -------
+        tuple[np.ndarray, int]
+            Dense co-occurrence matrix, with occurrence counts on the diagonal, and number of windows.
+        """
+        n_windows = np.maximum(1, self.doc_lengths - window_size + 1)
+        window_starts = np.concatenate(([0], np.cumsum(n_windows)[:-1]))
+        total_windows = int(n_windows.sum())
+
+        # Every occurrence of the words, with its column, document and position within the document
+        occurrences = [self.positions[self.word_ptr[w]:self.word_ptr[w + 1]] for w in words]
+        word_cols = np.repeat(np.arange(len(words)), [len(o) for o in occurrences])
+        pos = np.concatenate(occurrences) if occurrences else np.zeros(0, dtype=np.int64)
+        docs = np.searchsorted(self.doc_starts, pos, side="right") - 1
+        local_pos = pos - self.doc_starts[docs]
+
+        # An occurrence at position p enters the window starting at p - window_size + 1
+        # and is in every window up to the one starting at p
+        entry = np.maximum(0, local_pos - window_size + 1)
+        if self.exact_windows:
+            exit = local_pos
+        else:
+            # Gensim drops the word as soon as its first occurrence inside the window leaves it
+            key = word_cols * (int(self.doc_lengths.sum()) + 1) + pos
+            exit = pos[np.searchsorted(key, key - local_pos + entry)] - self.doc_starts[docs]
+        first = window_starts[docs] + entry
+        last = window_starts[docs] + np.minimum(exit, n_windows[docs] - 1)
+        spans = last - first + 1
+
+        # Expanding the spans block by block, splitting only between documents,
+        # so that no window is shared between two blocks
+        order = np.argsort(docs, kind="stable")
+        docs, word_cols, first, spans = docs[order], word_cols[order], first[order], spans[order]
+        block_ends = _block_boundaries(docs, spans, BLOCK_SIZE)
+
+        co_occurrences = np.zeros((len(words), len(words)), dtype=np.float64)
+        start = 0
+        for end in block_ends:
+            windows = _expand_spans(first[start:end], spans[start:end])
+            windows -= windows.min()
+            cols = np.repeat(word_cols[start:end], spans[start:end])
+            membership = sps.csr_matrix(
+                (np.ones(len(windows), dtype=np.int32), (windows, cols)),
+                shape=(windows.max() + 1, len(words)),
+            )
+            membership.sum_duplicates()
+            membership.data[:] = 1
+            co_occurrences += (membership.T @ membership).toarray()
+            start = end
+        return co_occurrences, total_windows
+
+
+def build_index(texts: Iterable[list[str]], gensim_dict: Dictionary, directory: pathlib.Path):
+    """
+    Writes the files of a `CoherenceIndex`, reading the texts once in batches of documents.
+
+    Each batch is appended to a temporary token stream on disk, along with the distinct words of each
+    document. Both are then grouped by word with a counting sort over chunks of the stream, writing
+    straight into memory-mapped outputs, and the stream is deleted.
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    # Removed first, so an interrupted build is never mistaken for a finished one
+    (directory / DOC_LENGTHS_FILE).unlink(missing_ok=True)
+    token2id = gensim_dict.token2id
+    vocab_size = len(gensim_dict)
+    tokens_path, pairs_path = directory / "tokens.tmp", directory / "pairs.tmp"
+
+    lengths = []
+    word_counts = np.zeros(vocab_size, dtype=np.int64)
+    doc_counts = np.zeros(vocab_size, dtype=np.int64)
+    texts = iter(texts)
+    with open(tokens_path, "wb") as tokens_file, open(pairs_path, "wb") as pairs_file:
+        while batch := list(itertools.islice(texts, BUILD_DOCS)):
+            ids = [np.fromiter((token2id.get(w, -1) for w in t), dtype=np.int32, count=len(t)) for t in batch]
+            batch_lengths = np.array([len(d) for d in ids], dtype=np.int64)
+            ids = np.concatenate(ids)
+            tokens_file.write(ids.tobytes())
+
+            in_dict = ids >= 0
+            docs = np.repeat(np.arange(len(lengths), len(lengths) + len(batch), dtype=np.int64), batch_lengths)
+            # Distinct (document, word) pairs, as one key sorted by document then word
+            pairs = np.unique(docs[in_dict] * vocab_size + ids[in_dict])
+            pairs_file.write(pairs.tobytes())
+            word_counts += np.bincount(ids[in_dict], minlength=vocab_size)
+            doc_counts += np.bincount(pairs % vocab_size, minlength=vocab_size)
+            lengths.extend(batch_lengths.tolist())
+
+    word_ptr = np.concatenate(([0], np.cumsum(word_counts))).astype(np.int64)
+    doc_ptr = np.concatenate(([0], np.cumsum(doc_counts))).astype(np.int64)
+    positions = np.lib.format.open_memmap(directory / POSITIONS_FILE, mode="w+", dtype=np.int64, shape=(word_ptr[-1],))
+    word_docs = np.lib.format.open_memmap(directory / WORD_DOCS_FILE, mode="w+", dtype=np.int64, shape=(doc_ptr[-1],))
+    tokens = _read_stream(tokens_path, np.int32)
+    pairs = _read_stream(pairs_path, np.int64)
+    cursor = word_ptr[:-1].copy()
+    for start in range(0, len(tokens), BUILD_TOKENS):
+        ids = np.asarray(tokens[start:start + BUILD_TOKENS])
+        _scatter_by_word(ids, np.arange(start, start + len(ids), dtype=np.int64), cursor, positions)
+    cursor = doc_ptr[:-1].copy()
+    for start in range(0, len(pairs), BUILD_TOKENS):
+        chunk = np.asarray(pairs[start:start + BUILD_TOKENS])
+        _scatter_by_word((chunk % vocab_size).astype(np.int32), chunk // vocab_size, cursor, word_docs)
+    positions.flush()
+    word_docs.flush()
+    del positions, word_docs, tokens, pairs
+    tokens_path.unlink()
+    pairs_path.unlink()
+
+    np.save(directory / WORD_PTR_FILE, word_ptr)
+    np.save(directory / DOC_PTR_FILE, doc_ptr)
+    np.save(directory / DOC_LENGTHS_FILE, np.array(lengths, dtype=np.int64))
+
+
+def top_word_ids(topics: np.ndarray, top_n: int = TOP_N) -> np.ndarray:
+    """
+    Returns the ids of the `top_n` most probable words of each topic, most probable first.
+    """
+    top_n = min(top_n, topics.shape[1])
+    top = np.argpartition(-topics, top_n - 1, axis=1)[:, :top_n]
+    order = np.argsort(-np.take_along_axis(topics, top, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(top, order, axis=1)
+
+
+def check_parity(model, index: CoherenceIndex, corpus, texts, measure: str = "c_v"):
+    """
+    Checks that `CoherenceIndex` agrees with gensim's `CoherenceModel` for a trained model.
+
+    Raises
+    ------
+    ValueError
+        If the difference is larger than `TOLERANCE`.
+    """
+    from gensim.models.coherencemodel import CoherenceModel
+
+    top_ids = top_word_ids(model.get_topics())
+    expected = CoherenceModel(
+        topics=top_ids.tolist(), dictionary=model.id2word, corpus=corpus, texts=texts, coherence=measure
+    ).get_coherence()
+    result = float(np.mean(index.topic_coherences(top_ids, measure)))
+    if abs(result - expected) > TOLERANCE:
+        raise ValueError(f"{measure} coherence is {result:.4f}, but gensim computes {expected:.4f}")
+
+
+def _u_mass(pair_counts: np.ndarray, counts: np.ndarray, num_docs: int) -> np.ndarray:
+    # Each word is conditioned on every word ranked above it
+    n = counts.shape[1]
+    below_diagonal = np.tril(np.ones((n, n), dtype=bool), k=-1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        log_cond = np.log((pair_counts / num_docs + EPSILON) / (counts[:, None, :] / num_docs))
+    return log_cond[:, below_diagonal].mean(axis=1)
+
+
+def _npmi(pair_counts: np.ndarray, counts: np.ndarray, num_docs: int) -> np.ndarray:
+    joint = pair_counts / num_docs
+    marginal = counts / num_docs
+    with np.errstate(divide="ignore", invalid="ignore"):
+        log_ratio = np.log((joint + EPSILON) / (marginal[:, :, None] * marginal[:, None, :]))
+        return log_ratio / -np.log(joint + EPSILON)
+
+
+def _cosine_to_topic(npmi: np.ndarray) -> np.ndarray:
+    # The context vector of the whole topic is the sum of the vectors of its words
+    topic_vectors = npmi.sum(axis=1)
+    dots = np.einsum("kij,kj->ki", npmi, topic_vectors)
+    norms = np.linalg.norm(npmi, axis=2) * np.linalg.norm(topic_vectors, axis=1)[:, None]
+    return (dots / norms).mean(axis=1)
+
+
+def _block_boundaries(docs: np.ndarray, spans: np.ndarray, block_size: int) -> list[int]:
+    """
+    Splits occurrences sorted by document into blocks of about `block_size` expanded entries.
+    Returns the end index of each block. Blocks only end between documents.
+    """
+    if len(docs) == 0:
+        return []
+    doc_ends = np.append(np.flatnonzero(np.diff(docs)) + 1, len(docs))
+    cumulative = np.cumsum(spans)[doc_ends - 1]
+    ends = []
+    done = 0
+    while True:
+        i = np.searchsorted(cumulative, done + block_size)
+        if i >= len(doc_ends) - 1:
+            ends.append(len(docs))
+            return ends
+        ends.append(int(doc_ends[i]))
+        done = cumulative[i]
+
+
+def _read_stream(path: pathlib.Path, dtype) -> np.ndarray:
+    """
+    Memory-maps a raw array written by `build_index`. Empty files cannot be mapped.
+    """
+    if path.stat().st_size == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r")
+
+
+def _scatter_by_word(ids: np.ndarray, values: np.ndarray, cursor: np.ndarray, out: np.ndarray):
+    """
+    Writes the values of the words in `ids` (-1 for none) to their group in `out`, at `cursor`,
+    keeping their order within each word, and moves `cursor` past them. Counting sort of one chunk.
+    """
+    in_dict = ids >= 0
+    ids, values = ids[in_dict], values[in_dict]
+    order = np.argsort(ids, kind="stable")
+    ids, values = ids[order], values[order]
+    # Rank of each value among those of its word in the chunk
+    rank = np.arange(len(ids)) - np.searchsorted(ids, ids)
+    out[cursor[ids] + rank] = values
+    cursor += np.bincount(ids, minlength=len(cursor))
+
+
+def _expand_spans(first: np.ndarray, spans: np.ndarray) -> np.ndarray:
+    """
+    Expands ranges `[first[i], first[i] + spans[i])` into one flat array.
+    """
+    offsets = np.arange(spans.sum()) - np.repeat(np.cumsum(spans) - spans, spans)
+    return np.repeat(first, spans) + offsets
@@ -0,0 +1,227 @@
+import hashlib
+import json
+import pathlib
+from collections.abc import Iterable, Iterator
+
+import numpy as np
+import polars as pl
+from gensim.corpora.dictionary import Dictionary
+from gensim.corpora.mmcorpus import MmCorpus
+
+
+DICTIONARY_FILE = "dictionary.dict"
+CORPUS_FILE = "corpus.mm"
+TEXTS_FILE = "texts.txt"
+SETTINGS_FILE = "settings.json"
+DOC_IDS_FILE = "doc_ids.npy"
+# Suffix of the settings written next to a pruned dictionary by `vocabulary.py`
+VOCABULARY_SETTINGS_SUFFIX = ".json"
+# Size of the blocks read when hashing input files
+HASH_BLOCK_SIZE = 1 << 20
+# Number of documents read at once from parquet files
+BATCH_SIZE = 10_000
+
+
+class TextFile:
+    """
+    Tokenized documents stored one per line, separated by spaces.
+    Reads the file lazily and can be iterated over as many times as needed,
+    which is what gensim expects from `texts`.
+
+    Parameters
+    ----------
+    path : pathlib.Path
+        Path to the file.
+    """
+    def __init__(self, path: pathlib.Path):
+        self.path = pathlib.Path(path)
+
+    def __iter__(self) -> Iterator[list[str]]:
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                yield line.split()
+
+
+class ParquetTexts:
+    """
+    Tokenized documents streamed from a text column of a parquet file.
+    Documents are read in batches of rows and split on whitespace, so only one batch
+    is held in memory at a time. Can be iterated over as many times as needed.
+
+    Parameters
+    ----------
+    path : pathlib.Path
+        Path to the parquet file, e.g. the output of `news_processing.py`.
+    column : str, optional
+        Column holding whitespace-separated tokens. Default `"text"`.
+    batch_size : int, optional
+        Number of documents read at once. Default `10_000`.
+    """
+    def __init__(self, path: pathlib.Path, column: str = "text", batch_size: int = BATCH_SIZE):
+        self.path = pathlib.Path(path)
+        self.column = column
+        self.batch_size = batch_size
+
+    def __len__(self) -> int:
+        return pl.scan_parquet(self.path).select(pl.len()).collect().item()
+
+    def __iter__(self) -> Iterator[list[str]]:
+        lf = pl.scan_parquet(self.path).select(self.column)
+        for offset in range(0, len(self), self.batch_size):
+            # Slices are pushed down to the parquet reader, which skips row groups outside of them
+            batch = lf.slice(offset, self.batch_size).collect()
+            for text in batch[self.column]:
+                yield text.split() if text is not None else []
+
+
+class SubsampledCorpus:
+    """
+    Random subset of the documents of a corpus, streamed in their original order.
+    Can be iterated over as many times as needed and always yields the same documents.
+
+    Parameters
+    ----------
+    corpus
+        Bag-of-words corpus with a length, e.g. an `MmCorpus`.
+    fraction : float
+        Fraction of the documents kept. At least one document is kept.
+    seed : int, optional
+        Seed of the random draw.
+    """
+    def __init__(self, corpus, fraction: float, seed: int | None = None):
+        self.corpus = corpus
+        n_docs = len(corpus)
+        rng = np.random.default_rng(seed)
+        self.keep = np.zeros(n_docs, dtype=bool)
+        self.keep[rng.choice(n_docs, size=max(1, round(n_docs * fraction)), replace=False)] = True
+
+    def __len__(self) -> int:
+        return int(self.keep.sum())
+
+    def __iter__(self):
+        for doc, keep in zip(self.corpus, self.keep):
+            if keep:
+                yield doc
+
+
+class CorpusCache:
+    """
+    Gensim dictionary, bag-of-words corpus and tokenized texts stored on disk.
+    The corpus is serialized in Matrix Market format and streamed from disk,
+    so it never needs to be fully loaded into memory.
+
+    Parameters
+    ----------
+    cache_dir : pathlib.Path
+        Directory holding all cached corpora.
+    key : str
+        Cache key, as returned by `cache_key`. Each key gets its own subdirectory.
+    """
+    def __init__(self, cache_dir: pathlib.Path, key: str):
+        self.directory = pathlib.Path(cache_dir) / key
+
+    def exists(self) -> bool:
+        return all(
+            (self.directory / f).exists()
+            for f in (DICTIONARY_FILE, CORPUS_FILE, TEXTS_FILE, SETTINGS_FILE)
+        )
+
+    def build(self, texts: Iterable[list[str]], settings: dict, gensim_dict: Dictionary | None = None):
+        """
+        Builds and saves the dictionary, corpus and texts.
+
+        Parameters
+        ----------
+        texts : Iterable[list[str]]
+            Tokenized documents. Iterated over once.
+        settings : dict
+            Settings used to build the cache key. Saved alongside the cache for reference.
+        gensim_dict : Dictionary, optional
+            Existing dictionary to build the corpus with, e.g. when caching new documents for a trained model.
+            Left unchanged. Terms missing from it are dropped from the corpus.
+            By default, a new dictionary is built from the texts.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        build_dict = gensim_dict is None
+        if build_dict:
+            gensim_dict = Dictionary()
+        with open(self.directory / TEXTS_FILE, "w", encoding="utf-8") as f:
+            for t in texts:
+                if build_dict:
+                    gensim_dict.add_documents([t])
+                f.write(" ".join(t) + "\n")
+        gensim_dict.save(str(self.directory / DICTIONARY_FILE))
+
+        texts = TextFile(self.directory / TEXTS_FILE)
+        MmCorpus.serialize(
+            str(self.directory / CORPUS_FILE),
+            (gensim_dict.doc2bow(t) for t in texts),
+            id2word=gensim_dict,
+        )
+        # Written last, so an interrupted build is never mistaken for a finished one
+        with open(self.directory / SETTINGS_FILE, "w") as f:
+            json.dump(settings, f, indent=4)
+
+    def doc_ids(self) -> np.ndarray | None:
+        """
+        Returns the `documents.DOC_ID` of each document of the corpus, in order, or `None` if they were not saved.
+        """
+        path = self.directory / DOC_IDS_FILE
+        return np.load(path) if path.exists() else None
+
+    def save_doc_ids(self, doc_ids: np.ndarray):
+        """
+        Saves the ID of each document of the corpus, e.g. read from the input file, so that outputs can be keyed by it.
+        """
+        path = self.directory / DOC_IDS_FILE
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "wb") as f:
+            np.save(f, np.asarray(doc_ids, dtype=np.int64))
+        tmp_path.replace(path)
+
+    def load(self) -> tuple[Dictionary, MmCorpus, TextFile]:
+        """
+        Loads the cached dictionary, corpus and texts.
+
+        Returns
+        -------
+        tuple[Dictionary, MmCorpus, TextFile]
+            Dictionary, streamed bag-of-words corpus and streamed tokenized texts.
+        """
+        gensim_dict = Dictionary.load(str(self.directory / DICTIONARY_FILE))
+        corpus = MmCorpus(str(self.directory / CORPUS_FILE))
+        texts = TextFile(self.directory / TEXTS_FILE)
+        return gensim_dict, corpus, texts
+
+
+def vocabulary_settings_path(vocabulary: pathlib.Path) -> pathlib.Path:
+    """
+    Returns the path of the settings of a pruned dictionary, including the dataset it was built for.
+    """
+    return pathlib.Path(vocabulary).with_suffix(VOCABULARY_SETTINGS_SUFFIX)
+
+
+def cache_key(settings: dict, path: pathlib.Path | None = None) -> str:
+    """
+    Computes a cache key from the preprocessing settings and the contents of the input file.
+
+    Parameters
+    ----------
+    settings : dict
+        Settings that change the resulting corpus. Must be JSON serializable.
+    path : pathlib.Path, optional
+        Input file. Its contents are hashed, so a changed file gets a new key.
+
+    Returns
+    -------
+    str
+        Hexadecimal SHA-256 digest.
+    """
+    h = hashlib.sha256()
+    h.update(json.dumps(settings, sort_keys=True).encode())
+    if path is not None:
+        with open(path, "rb") as f:
+            while block := f.read(HASH_BLOCK_SIZE):
+                h.update(block)
+    return h.hexdigest()
@@ -0,0 +1,232 @@
+import argparse
+import hashlib
+import pathlib
+
+import numpy as np
+import polars as pl
+
+
+# Column holding the stable ID of a news article, from filtering to the final files
+DOC_ID = "doc_id"
+# Raw row number of the article in the Nasdaq CSV, the source of the ID in files filtered before it was named
+LEGACY_ID = "row_number"
+
+INDEX_DIR = "data/processed/document_index"
+LOCATIONS_FILE = "locations.parquet"
+HASHES_FILE = "text_hashes.parquet"
+# Files of the news pipeline that carry the ID, by key
+NEWS_FILES = {
+    "raw": "data/filtered/04_no_null_articles.parquet",
+    "stemmed": "data/filtered/06_stemmed_text.parquet",
+    "sampled": "data/filtered/07_sampled_news.parquet",
+    "final": "data/processed/news_final.parquet",
+}
+# File whose texts are hashed, which are the same as the texts of the modelled files
+HASHED_FILE = "stemmed"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the lookup index from document IDs to rows of the news files")
+    parser.add_argument("--index_dir", type=str, default=INDEX_DIR,
+        help=f"Directory of the index (default: {INDEX_DIR})")
+    args = parser.parse_args()
+
+    files = {key: pathlib.Path(path) for key, path in NEWS_FILES.items() if pathlib.Path(path).exists()}
+    missing = set(NEWS_FILES) - set(files)
+    if missing:
+        print(f"Skipping missing files: {sorted(missing)}")
+    unkeyed = DocumentIndex.build(files, args.index_dir, hashed_file=HASHED_FILE if HASHED_FILE in files else None)
+    if unkeyed:
+        print(f"Left out files without a document ID, whose texts can be looked up in the text hash table: {unkeyed}")
+    print(f"Saved document index to '{args.index_dir}'")
+
+
+def with_doc_id(lf: pl.LazyFrame) -> pl.LazyFrame:
+    """
+    Returns the frame with a `DOC_ID` column first.
+    Files filtered before the ID was named have it as the `LEGACY_ID` column, which is renamed.
+    Otherwise the position of each row is used, which is only stable as long as the file is,
+    so it may only key outputs of that one file. See `has_doc_id`.
+    """
+    names = lf.collect_schema().names()
+    if DOC_ID in names:
+        return lf
+    if LEGACY_ID in names:
+        return lf.rename({LEGACY_ID: DOC_ID}).select(DOC_ID, pl.exclude(DOC_ID))
+    return lf.with_row_index(DOC_ID).with_columns(pl.col(DOC_ID).cast(pl.Int64))
+
+
+def has_doc_id(lf: pl.LazyFrame) -> bool:
+    """
+    Returns whether a frame carries a stable ID, as `DOC_ID` or `LEGACY_ID`, rather than only row positions.
+    """
+    names = lf.collect_schema().names()
+    return DOC_ID in names or LEGACY_ID in names
+
+
+def digest(text: str) -> int:
+    """
+    Returns a 64-bit hash of a text, stable across runs and library versions, unlike `pl.Expr.hash`.
+    """
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), "little")
+
+
+def text_hash(column: str) -> pl.Expr:
+    """
+    Returns the `digest` of each text of a column.
+    """
+    def hash_batch(texts: pl.Series) -> pl.Series:
+        return pl.Series([None if t is None else digest(t) for t in texts], dtype=pl.UInt64)
+    return pl.col(column).map_batches(hash_batch, return_dtype=pl.UInt64)
+
+
+class DocumentIndex:
+    """
+    Lookup index from document IDs to their rows in the files of the pipeline, e.g. from a document with a high
+    theta in `news_final.parquet` to its URL and raw article in `04_no_null_articles.parquet`.
+
+    Locations are kept as sorted arrays, so looking IDs up is a binary search, and fetching a document is a point
+    read: the scan is sliced to its row, and polars only reads the row group holding it.
+    Files written before the ID was carried through can be mapped to IDs by text, with the text hash table.
+
+    Layout of the index directory::
+
+        <index_dir>/
+            locations.parquet    # doc_id, file, path, row
+            text_hashes.parquet  # text_hash, doc_id
+
+    Parameters
+    ----------
+    index_dir : pathlib.Path
+        Directory written by `build`.
+    """
+    def __init__(self, index_dir: pathlib.Path = INDEX_DIR):
+        self.index_dir = pathlib.Path(index_dir)
+        locations = pl.read_parquet(self.index_dir / LOCATIONS_FILE)
+        self.paths = {}
+        self._ids = {}
+        self._rows = {}
+        for (key, path), df in locations.group_by("file", "path"):
+            df = df.sort(DOC_ID)
+            self.paths[key] = pathlib.Path(path)
+            self._ids[key] = df[DOC_ID].to_numpy()
+            self._rows[key] = df["row"].to_numpy()
+
+        hashes_path = self.index_dir / HASHES_FILE
+        self._hashes = pl.read_parquet(hashes_path) if hashes_path.exists() else None
+
+    @staticmethod
+    def build(files: dict[str, pathlib.Path], index_dir: pathlib.Path = INDEX_DIR, hashed_file: str | None = None,
+              text_column: str = "text") -> list[str]:
+        """
+        Scans the ID column of each file once and writes the index.
+        Files without an ID column are left out, since their row positions are not stable IDs.
+        Their documents can be found by text with `doc_ids_for_texts` instead.
+
+        Parameters
+        ----------
+        files : dict[str, pathlib.Path]
+            Files to index, by key. IDs are read as in `with_doc_id`.
+        index_dir : pathlib.Path, optional
+            Output directory. Default `data/processed/document_index`.
+        hashed_file : str, optional
+            Key of the file whose `text_column` is hashed into the text hash table.
+        text_column : str, optional
+            Text column of `hashed_file`. Default `"text"`.
+
+        Returns
+        -------
+        list[str]
+            Keys of the files left out.
+
+        Raises
+        ------
+        ValueError
+            If no file, or the `hashed_file`, has an ID column.
+        """
+        unkeyed = [key for key, path in files.items() if not has_doc_id(pl.scan_parquet(path))]
+        if len(unkeyed) == len(files):
+            raise ValueError(f"None of the files has a {DOC_ID} or {LEGACY_ID} column")
+        if hashed_file in unkeyed:
+            raise ValueError(f"'{files[hashed_file]}' has no {DOC_ID} or {LEGACY_ID} column to hash its texts with")
+        index_dir = pathlib.Path(index_dir)
+        index_dir.mkdir(parents=True, exist_ok=True)
+        locations = pl.concat([
+            with_doc_id(pl.scan_parquet(path))
+            .select(pl.col(DOC_ID).cast(pl.Int64))
+            .with_row_index("row")
+            .select(DOC_ID, pl.lit(key).alias("file"), pl.lit(str(path)).alias("path"), "row")
+            for key, path in files.items()
+            if key not in unkeyed
+        ])
+        _sink(locations.sort("file", DOC_ID), index_dir / LOCATIONS_FILE)
+
+        if hashed_file is not None:
+            hashes = (
+                with_doc_id(pl.scan_parquet(files[hashed_file]))
+                .select(text_hash(text_column).alias("text_hash"), pl.col(DOC_ID).cast(pl.Int64))
+                .sort("text_hash")
+            )
+            _sink(hashes, index_dir / HASHES_FILE)
+        return unkeyed
+
+    def rows(self, doc_ids: list[int], file: str) -> np.ndarray:
+        """
+        Returns the row of each document in a file.
+
+        Raises
+        ------
+        KeyError
+            If a document is not in the file.
+        """
+        ids, rows = self._ids[file], self._rows[file]
+        doc_ids = np.asarray(doc_ids, dtype=np.int64)
+        positions = np.searchsorted(ids, doc_ids).clip(max=len(ids) - 1)
+        found = ids[positions] == doc_ids
+        if not found.all():
+            raise KeyError(f"Documents {doc_ids[~found].tolist()} are not in '{file}'")
+        return rows[positions]
+
+    def fetch(self, doc_ids: list[int], file: str = "raw", columns: list[str] | None = None) -> pl.DataFrame:
+        """
+        Reads the rows of the given documents from a file, in the order of `doc_ids`.
+
+        Parameters
+        ----------
+        doc_ids : list[int]
+            IDs of the documents.
+        file : str, optional
+            Key of the file to read from. Default `"raw"`, which has the URL and the raw article.
+        columns : list[str], optional
+            Columns to read. Default all columns.
+        """
+        lf = with_doc_id(pl.scan_parquet(self.paths[file]))
+        if columns is not None:
+            lf = lf.select(columns)
+        rows = self.rows(doc_ids, file)
+        return pl.concat([lf.slice(int(row), 1).collect() for row in rows]) if len(rows) else lf.clear().collect()
+
+    def doc_ids_for_texts(self, texts: pl.Series) -> pl.DataFrame:
+        """
+        Finds the IDs of documents by their text, for files that do not carry the ID.
+
+        Returns
+        -------
+        pl.DataFrame
+            Table with the `position` of each text in `texts` and the `DOC_ID` of every document with that text.
+            Texts of no indexed document are left out.
+        """
+        if self._hashes is None:
+            raise FileNotFoundError(f"No text hash table in '{self.index_dir}'")
+        df = pl.DataFrame({"text": texts}).with_row_index("position").select("position", text_hash("text").alias("text_hash"))
+        return df.join(self._hashes, on="text_hash", how="inner", maintain_order="left").select("position", DOC_ID)
+
+
+def _sink(lf: pl.LazyFrame, path: pathlib.Path):
+    tmp_path = path.with_suffix(".tmp")
+    lf.sink_parquet(tmp_path)
+    tmp_path.replace(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+import argparse
+import json
+import pathlib
+import shutil
+
+from dotenv import dotenv_values
+import polars as pl
+from gensim.corpora.dictionary import Dictionary
+
+# Local imports
+import corpora
+import documents
+import generate_topics
+import instrumentation
+
+
+CONFIG = dotenv_values(".env")
+# Directory of the exported matrices, relative to `DATA_DIR`. Each dataset gets its own subdirectory.
+DTM_DIR = "processed/dtm"
+MATRIX_FILE = "dtm.mtx"
+VOCAB_FILE = "vocab.txt"
+ROWS_FILE = "rows.parquet"
+SETTINGS_FILE = "settings.json"
+TIMINGS_FILE = "dtm_timings.csv"
+# Files read by `run_stm.R` and `searchK.R`, relative to `DATA_DIR`. The matrix is built from the same file,
+# so that its rows are the rows R attaches as metadata. `fed` is the filtered file, not the CSV used by LDA.
+DATASET_FILES = {
+    "fed": "processed/communications_final.parquet",
+    "news": "processed/news_final.parquet",
+    "dummy": "processed/dummy_news.parquet",
+}
+# Columns written next to the matrix when the dataset has them, which R checks row by row
+KEY_COLUMNS = [documents.DOC_ID, "date"]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Export the document-term matrix and vocabulary of a dataset, shared by the LDA and STM scripts")
+    parser.add_argument("--dataset", type=str, choices=list(DATASET_FILES), default="fed",
+        help="Dataset to export, one of those the STM scripts load (default: fed)")
+    parser.add_argument("-o", "--output", type=str, default=None,
+        help=f"Output directory (default: '<DATA_DIR>/{DTM_DIR}/<dataset>')")
+    parser.add_argument("--rebuild_cache", action="store_true",
+        help="Rebuild the dictionary and corpus even if they are cached")
+    parser.add_argument("--vocabulary", type=str, default=None,
+        help="Pruned dictionary written by vocabulary.py, the same as given to generate_topics.py "
+        "(default: every term of the dataset)")
+    args = parser.parse_args()
+    if args.vocabulary is not None and (error := generate_topics.vocabulary_error(args.vocabulary, args.dataset)) is not None:
+        parser.error(error)
+
+    data_dir = pathlib.Path(CONFIG["DATA_DIR"])
+    output = pathlib.Path(args.output) if args.output is not None else data_dir / DTM_DIR / args.dataset
+    timer = instrumentation.StageTimer()
+    path = data_dir / DATASET_FILES[args.dataset]
+    cache = timer.timed("load_corpus")(build_cache)(
+        args.dataset, path, data_dir / "cache", rebuild=args.rebuild_cache, vocabulary=args.vocabulary)
+    timer.timed()(export)(cache, output, row_keys(path))
+    print(f"Saved document-term matrix to '{output}'")
+    timer.write_csv(output / TIMINGS_FILE)
+
+
+def build_cache(
+        dataset: str, path: pathlib.Path, cache_dir: pathlib.Path, rebuild: bool = False,
+        vocabulary: pathlib.Path | None = None) -> corpora.CorpusCache:
+    """
+    Builds the corpus cache of a dataset file read by R, if needed, and returns it.
+    The cache key is computed like `generate_topics.corpus_key`, so a file also used by LDA,
+    like `news`, shares its cache with the LDA sweeps.
+
+    Parameters
+    ----------
+    dataset : str
+        Name of the dataset, one of `DATASET_FILES`.
+    path : pathlib.Path
+        Parquet file of the dataset, with a `"text"` column of stemmed tokens.
+    cache_dir : pathlib.Path
+        Directory holding all cached corpora.
+    rebuild : bool, optional
+        Whether to rebuild the cache even if it exists. Default `False`.
+    vocabulary : pathlib.Path, optional
+        Pruned dictionary, as written by `vocabulary.py`.
+
+    Returns
+    -------
+    corpora.CorpusCache
+        Built corpus cache.
+    """
+    settings = generate_topics.corpus_settings(dataset, vocabulary)
+    cache = corpora.CorpusCache(cache_dir, corpora.cache_key(settings, path))
+    if rebuild or not cache.exists():
+        print(f"Building corpus cache in '{cache.directory}'...")
+        gensim_dict = Dictionary.load(str(vocabulary)) if vocabulary is not None else None
+        cache.build(corpora.ParquetTexts(path), settings, gensim_dict=gensim_dict)
+    return cache
+
+
+def row_keys(path: pathlib.Path) -> pl.DataFrame:
+    """
+    Returns the `KEY_COLUMNS` of a dataset file that it has, with the position of each row.
+    """
+    names = pl.read_parquet_schema(path)
+    columns = [c for c in KEY_COLUMNS if c in names]
+    return pl.scan_parquet(path).select(columns).with_row_index("row").collect()
+
+
+def export(cache: corpora.CorpusCache, output: pathlib.Path, rows: pl.DataFrame):
+    """
+    Writes the document-term matrix and vocabulary of a corpus cache in formats R reads without re-tokenizing.
+
+    The matrix is the cached bag-of-words corpus, which gensim already stores in Matrix Market format with
+    one row per document, in input order, and one column per dictionary term. It is copied as is, so the
+    export costs one file copy once the cache exists, and the STM scripts fit on the same vocabulary as LDA.
+    The keys of its rows are written next to it, so that R can check them against the dataset it loads.
+
+    Layout of the output directory::
+
+        <output>/
+            dtm.mtx        # documents x terms counts, Matrix Market, readable with `Matrix::readMM`
+            vocab.txt      # term of each column, one per line
+            rows.parquet   # position, and `doc_id` and `date` if the dataset has them, of each row
+            settings.json  # preprocessing settings and cache key of the corpus
+
+    Parameters
+    ----------
+    cache : corpora.CorpusCache
+        Built corpus cache.
+    output : pathlib.Path
+        Output directory. Created if it doesn't exist.
+    rows : pl.DataFrame
+        Keys of the documents of the corpus, in order, as returned by `row_keys`.
+
+    Raises
+    ------
+    ValueError
+        If the corpus and the keys have a different number of documents.
+    """
+    output = pathlib.Path(output)
+    gensim_dict, corpus, _ = cache.load()
+    if len(corpus) != len(rows):
+        raise ValueError(f"The corpus in '{cache.directory}' has {len(corpus)} documents, but there are {len(rows)} keys")
+    output.mkdir(parents=True, exist_ok=True)
+
+    tmp_path = (output / MATRIX_FILE).with_suffix(".tmp")
+    shutil.copyfile(cache.directory / corpora.CORPUS_FILE, tmp_path)
+    tmp_path.replace(output / MATRIX_FILE)
+
+    tmp_path = (output / VOCAB_FILE).with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for i in range(len(gensim_dict)):
+            f.write(gensim_dict[i] + "\n")
+    tmp_path.replace(output / VOCAB_FILE)
+
+    tmp_path = (output / ROWS_FILE).with_suffix(".tmp")
+    rows.write_parquet(tmp_path)
+    tmp_path.replace(output / ROWS_FILE)
+
+    with open(cache.directory / corpora.SETTINGS_FILE) as f:
+        settings = json.load(f)
+    # Written last, so the settings always describe the matrix next to them
+    with open(output / SETTINGS_FILE, "w") as f:
+        json.dump({**settings, "cache_key": cache.directory.name}, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,9 @@
-from sklearn.datasets import fetch_20newsgroups
 from nltk.corpus import stopwords
 from dotenv import dotenv_values
 import polars as pl
-import nltk
 import preprocessing
+import synthetic
+from stemming import StemCache
 import pathlib
 
 
@@ -16,16 +16,13 @@ def main():
     data_dir = pathlib.Path(config["DATA_DIR"]) / "processed"
 
     stop_words = set(stopwords.words("english"))
-    stemmer = nltk.stem.SnowballStemmer("english")
+    stem_cache = StemCache(data_dir)
 
-    data = fetch_20newsgroups(
-        subset="all",
-        remove=("headers", "footers", "quotes"),
-        categories=["sci.space", "rec.sport.baseball"])
-
-    sample = data["data"][:ROWS]
+    # Synthetic texts, so the pipeline can be tested without network access
+    sample = synthetic.generate_texts(ROWS, stop_words=list(stop_words))["text"].to_list()
     preprocessed_text = [preprocessing.preprocess(s, stop_words=stop_words) for s in sample]
-    stemmed_text = [preprocessing.stem(s, stemmer=stemmer) for s in preprocessed_text]
+    stemmed_text = stem_cache.stem_texts(preprocessed_text)
+    stem_cache.save()
 
     df = pl.DataFrame({"raw_text": sample, "clean_text": preprocessed_text, "stemmed_text": stemmed_text})
     filename = data_dir / FILE
@@ -0,0 +1,176 @@
+import json
+import pathlib
+import re
+from collections.abc import Sequence
+from typing import Protocol
+
+import numpy as np
+from sklearn.feature_extraction.text import HashingVectorizer
+
+# Local imports
+import documents
+
+
+VECTORS_FILE = "vectors.f32"
+HASHES_FILE = "hashes.u64"
+META_FILE = "meta.json"
+# Default CLI options
+# Same as BERTopic's default English model
+EMBEDDER = "all-MiniLM-L6-v2"
+BATCH_SIZE = 256
+# Dimension of the stand-in embedder when none is given
+HASHING_DIM = 384
+
+
+class Embedder(Protocol):
+    """
+    Turns texts into vectors. `name` identifies the vectors it produces, so that stored ones are only reused by the same embedder.
+    """
+    name: str
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        ...
+
+
+class SentenceTransformerEmbedder:
+    """
+    Sentence-transformer model, from the Hugging Face hub or a local directory, which runs offline.
+
+    Parameters
+    ----------
+    model : str
+        Model name or path.
+    """
+    def __init__(self, model: str = EMBEDDER):
+        # Imported here, since PyTorch takes seconds to import and the stand-in embedder does not need it
+        from sentence_transformers import SentenceTransformer
+        self.name = model
+        self.model = SentenceTransformer(model)
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        return self.model.encode(texts, batch_size=len(texts), convert_to_numpy=True, show_progress_bar=False)
+
+
+class HashingEmbedder:
+    """
+    Stand-in embedder hashing the words of each text into a fixed number of signed buckets.
+    Needs no model or download, so pipelines and tests run offline, but the vectors carry no meaning beyond shared words.
+
+    Parameters
+    ----------
+    dim : int, optional
+        Dimension of the vectors. Default `384`, the same as `all-MiniLM-L6-v2`.
+    """
+    def __init__(self, dim: int = HASHING_DIM):
+        self.name = f"hashing-{dim}"
+        self.vectorizer = HashingVectorizer(n_features=dim, token_pattern=None, tokenizer=str.split, lowercase=False)
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        return self.vectorizer.transform(texts).toarray()
+
+
+def load_embedder(spec: str) -> Embedder:
+    """
+    Returns the embedder described by `spec`: `"hashing"` or `"hashing:<dim>"` for `HashingEmbedder`,
+    anything else is the name or path of a sentence-transformer model.
+    """
+    if spec == "hashing" or spec.startswith("hashing:"):
+        _, _, dim = spec.partition(":")
+        return HashingEmbedder(int(dim) if dim else HASHING_DIM)
+    return SentenceTransformerEmbedder(spec)
+
+
+class EmbeddingStore:
+    """
+    Persistent store of document embeddings, keyed by the hash of each document's text.
+    Documents are only encoded the first time they are seen, so later fits over the same or overlapping
+    corpora read their vectors back instead.
+
+    Vectors and hashes are appended to two flat files, in the same order, after every batch. Vectors are
+    written first, so an interrupted run loses at most the batch in progress. Vectors are read back through
+    a memory map, in single precision.
+
+    Layout of the directory::
+
+        <directory>/<embedder name>/
+            meta.json   # embedder name and dimension
+            vectors.f32 # one row of `dim` float32 per document
+            hashes.u64  # hash of the text of each row
+
+    Parameters
+    ----------
+    directory : pathlib.Path
+        Root directory of the stores. Each embedder gets its own subdirectory.
+    embedder : Embedder
+        Embedder of the missing documents.
+    """
+    def __init__(self, directory: pathlib.Path, embedder: Embedder):
+        self.embedder = embedder
+        self.directory = pathlib.Path(directory) / re.sub(r"[^\w.-]+", "_", embedder.name)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        meta_path = self.directory / META_FILE
+        self.dim = json.loads(meta_path.read_text())["dim"] if meta_path.exists() else None
+
+    def __len__(self) -> int:
+        return len(self._hashes())
+
+    def embed(self, texts: Sequence[str], batch_size: int = BATCH_SIZE) -> np.ndarray:
+        """
+        Returns the embedding of each text, encoding only those missing from the store.
+
+        Parameters
+        ----------
+        texts : Sequence[str]
+            Documents.
+        batch_size : int, optional
+            Number of documents encoded at once. Default `256`.
+
+        Returns
+        -------
+        np.ndarray
+            Embeddings, shape (len(texts), dim), float32. A view of the memory map when the texts
+            are exactly the stored documents in order, otherwise a copy of their rows.
+        """
+        digests = np.fromiter((documents.digest(t) for t in texts), dtype=np.uint64, count=len(texts))
+        stored = self._hashes()
+        missing = np.flatnonzero(~np.isin(digests, stored))
+        # Each missing text is encoded once, even if it occurs several times
+        _, first = np.unique(digests[missing], return_index=True)
+        missing = np.sort(missing[first])
+        for start in range(0, len(missing), batch_size):
+            batch = missing[start:start + batch_size]
+            self._append(self.embedder.encode([texts[i] for i in batch]), digests[batch])
+
+        stored = self._hashes()
+        vectors = self._vectors(len(stored))
+        if len(digests) == len(stored) and (digests == stored).all():
+            return vectors
+        order = np.argsort(stored, kind="stable")
+        rows = order[np.searchsorted(stored, digests, sorter=order)]
+        return np.asarray(vectors[rows])
+
+    def _hashes(self) -> np.ndarray:
+        path = self.directory / HASHES_FILE
+        return np.fromfile(path, dtype=np.uint64) if path.exists() else np.empty(0, dtype=np.uint64)
+
+    def _vectors(self, n: int) -> np.ndarray:
+        if n == 0:
+            return np.empty((0, self.dim or 0), dtype=np.float32)
+        return np.memmap(self.directory / VECTORS_FILE, dtype=np.float32, mode="r", shape=(n, self.dim))
+
+    def _append(self, vectors: np.ndarray, digests: np.ndarray):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+            meta = {"embedder": self.embedder.name, "dim": self.dim}
+            (self.directory / META_FILE).write_text(json.dumps(meta, indent=4))
+        vectors_path = self.directory / VECTORS_FILE
+        # Drops vectors written after the last hashes, by a run interrupted in between
+        row_bytes = self.dim * np.dtype(np.float32).itemsize
+        if vectors_path.exists() and vectors_path.stat().st_size != len(self) * row_bytes:
+            with open(vectors_path, "r+b") as f:
+                f.truncate(len(self) * row_bytes)
+        with open(vectors_path, "ab") as f:
+            f.write(vectors.tobytes())
+        with open(self.directory / HASHES_FILE, "ab") as f:
+            f.write(np.asarray(digests, dtype=np.uint64).tobytes())
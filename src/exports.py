@@ -0,0 +1,203 @@
+import pathlib
+import shutil
+from collections.abc import Iterable
+
+import numpy as np
+import polars as pl
+from gensim import utils
+from gensim.models.ldamulticore import LdaMulticore
+
+# Local imports
+import documents
+import frex
+
+
+# Number of documents inferred at once when exporting theta
+BATCH_SIZE = 10_000
+# Number of top words per topic in the topics CSV, same as gensim's `show_topics`
+TOP_WORDS = 10
+
+
+def topic_names(n_topics: int) -> list[str]:
+    """
+    Returns the column names of the topics in theta, the same as `run_stm.R`.
+    """
+    return [f"Topic_{i}" for i in range(1, n_topics + 1)]
+
+
+def top_words_df(lda: LdaMulticore, top_words: int = TOP_WORDS) -> pl.DataFrame:
+    """
+    Returns the top words of each topic and their probabilities, most probable first.
+
+    Returns
+    -------
+    pl.DataFrame
+        Table with a `word`, a `topic` (starting at 1) and a `prob` column, one row per topic and word.
+    """
+    topics = lda.get_topics()
+    top_words = min(top_words, topics.shape[1])
+    top = np.argpartition(-topics, top_words - 1, axis=1)[:, :top_words]
+    probs = np.take_along_axis(topics, top, axis=1)
+    order = np.argsort(-probs, axis=1, kind="stable")
+    top = np.take_along_axis(top, order, axis=1)
+    probs = np.take_along_axis(probs, order, axis=1)
+
+    vocab = np.array([lda.id2word[i] for i in range(lda.num_terms)], dtype=object)
+    return pl.DataFrame({
+        "word": vocab[top].ravel(),
+        "topic": np.repeat(np.arange(1, lda.num_topics + 1), top_words),
+        "prob": probs.ravel().astype(np.float64),
+    })
+
+
+def frex_words_df(lda: LdaMulticore, result: frex.FrexResult) -> pl.DataFrame:
+    """
+    Returns the words with the highest FREX in each topic, for each exclusivity weight.
+
+    Parameters
+    ----------
+    lda : LdaMulticore
+        Trained model.
+    result : frex.FrexResult
+        FREX scores and word lists of the model, as returned by `frex.exclusivity_batch`.
+
+    Returns
+    -------
+    pl.DataFrame
+        Table with a `weight`, a `topic` (starting at 1), a `rank` (starting at 1) and a `word` column.
+    """
+    n_weights, n_topics, n_words = result.words.shape
+    vocab = np.array([lda.id2word[i] for i in range(lda.num_terms)], dtype=object)
+    return pl.DataFrame({
+        "weight": np.repeat(result.weights, n_topics * n_words),
+        "topic": np.tile(np.repeat(np.arange(1, n_topics + 1), n_words), n_weights),
+        "rank": np.tile(np.arange(1, n_words + 1), n_weights * n_topics),
+        "word": vocab[result.words].ravel(),
+    })
+
+
+def topic_word_df(lda: LdaMulticore, dtype: type = np.float64) -> pl.DataFrame:
+    """
+    Returns the log probability of each word in each topic.
+    Same layout as the `topic_dist.parquet` files written by `run_stm.R`: one row per topic
+    and one column per word of the vocabulary, in dictionary order.
+
+    Parameters
+    ----------
+    lda : LdaMulticore
+        Trained model.
+    dtype : type, optional
+        Floating point type of the output. Default `np.float64`.
+    """
+    log_probs = np.log(lda.get_topics()).astype(dtype, copy=False)
+    vocab = [lda.id2word[i] for i in range(lda.num_terms)]
+    return pl.DataFrame(log_probs, schema=vocab, orient="row")
+
+
+def theta_batch(
+        lda: LdaMulticore, docs: list, offset: int, dtype: type = np.float64, top_n: int | None = None,
+        doc_ids: np.ndarray | None = None) -> pl.DataFrame:
+    """
+    Infers the topic distribution of a batch of documents.
+
+    Parameters
+    ----------
+    lda : LdaMulticore
+        Trained model.
+    docs : list
+        Bag-of-words documents.
+    offset : int
+        Position of the first document of the batch in the corpus.
+    dtype : type, optional
+        Floating point type of the output. Default `np.float64`.
+    top_n : int, optional
+        If given, only the `top_n` most probable topics of each document are kept, in long format.
+    doc_ids : np.ndarray, optional
+        `documents.DOC_ID` of each document of the batch.
+
+    Returns
+    -------
+    pl.DataFrame
+        A key column, followed by either one column per topic or, with `top_n`, a `topic` (starting at 1)
+        and a `prob` column. The key is the `documents.DOC_ID` of each document if `doc_ids` is given,
+        so that its article can be fetched with `documents.DocumentIndex`, otherwise a `doc` column
+        with its position in the corpus.
+    """
+    gamma, _ = lda.inference(docs)
+    theta = (gamma / gamma.sum(axis=1, keepdims=True)).astype(dtype, copy=False)
+    key = "doc" if doc_ids is None else documents.DOC_ID
+    if doc_ids is None:
+        doc_ids = np.arange(offset, offset + len(docs), dtype=np.int64)
+
+    if top_n is None:
+        df = pl.DataFrame(theta, schema=topic_names(lda.num_topics), orient="row")
+        return df.insert_column(0, pl.Series(key, doc_ids, dtype=pl.Int64))
+
+    top_n = min(top_n, lda.num_topics)
+    top = np.argpartition(-theta, top_n - 1, axis=1)[:, :top_n]
+    probs = np.take_along_axis(theta, top, axis=1)
+    order = np.argsort(-probs, axis=1, kind="stable")
+    return pl.DataFrame({
+        key: np.repeat(np.asarray(doc_ids, dtype=np.int64), top_n),
+        "topic": (np.take_along_axis(top, order, axis=1) + 1).ravel().astype(np.int32),
+        "prob": np.take_along_axis(probs, order, axis=1).ravel(),
+    })
+
+
+def write_theta(
+        lda: LdaMulticore, corpus: Iterable, path: pathlib.Path, dtype: type = np.float64,
+        top_n: int | None = None, batch_size: int = BATCH_SIZE, doc_ids: np.ndarray | None = None):
+    """
+    Infers the topic distribution of every document of a corpus and writes it to parquet.
+    The corpus is streamed in batches, each written to its own part file, so only one batch
+    of documents is held in memory. The parts are merged into `path` at the end.
+
+    Parameters
+    ----------
+    lda : LdaMulticore
+        Trained model.
+    corpus : Iterable
+        Bag-of-words corpus, e.g. an `MmCorpus`.
+    path : pathlib.Path
+        Output file.
+    dtype : type, optional
+        Floating point type of the output. Default `np.float64`.
+    top_n : int, optional
+        If given, only the `top_n` most probable topics of each document are kept. See `theta_batch`.
+    batch_size : int, optional
+        Number of documents inferred at once. Default `10_000`.
+    doc_ids : np.ndarray, optional
+        `documents.DOC_ID` of each document of the corpus, in order, written as the key of each row.
+        By default, rows are keyed by the position of their document.
+
+    Raises
+    ------
+    ValueError
+        If `doc_ids` does not have one ID per document.
+    """
+    path = pathlib.Path(path)
+    parts_dir = path.with_suffix(".parts")
+    parts_dir.mkdir(parents=True, exist_ok=True)
+    try:
+        parts = []
+        offset = 0
+        for docs in utils.grouper(corpus, batch_size):
+            part = parts_dir / f"part_{len(parts):05}.parquet"
+            batch_ids = None if doc_ids is None else doc_ids[offset:offset + len(docs)]
+            if batch_ids is not None and len(batch_ids) < len(docs):
+                raise ValueError(f"{len(doc_ids)} document IDs were given for more documents")
+            theta_batch(lda, docs, offset, dtype=dtype, top_n=top_n, doc_ids=batch_ids).write_parquet(part)
+            parts.append(part)
+            offset += len(docs)
+        if doc_ids is not None and len(doc_ids) != offset:
+            raise ValueError(f"{len(doc_ids)} document IDs were given for {offset} documents")
+
+        tmp_path = path.with_suffix(".tmp")
+        if parts:
+            pl.scan_parquet(parts).sink_parquet(tmp_path)
+        else:
+            empty_ids = None if doc_ids is None else np.empty(0, dtype=np.int64)
+            theta_batch(lda, [], 0, dtype=dtype, top_n=top_n, doc_ids=empty_ids).write_parquet(tmp_path)
+        tmp_path.replace(path)
+    finally:
+        shutil.rmtree(parts_dir)
@@ -5,6 +5,12 @@ from tqdm import tqdm
 from datetime import datetime
 from dotenv import dotenv_values
 import pathlib
+import functools
+import itertools
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from collections.abc import Callable, Iterable, Iterator
 
 import numpy as np
 import polars as pl
@@ -12,69 +18,136 @@ import matplotlib.pyplot as plt
 import matplotlib
 
 from gensim.models.ldamulticore import LdaMulticore
-from gensim.models.coherencemodel import CoherenceModel
 from gensim.corpora.dictionary import Dictionary
+from gensim.corpora.mmcorpus import MmCorpus
 from sklearn.datasets import fetch_20newsgroups
 from nltk.corpus import stopwords
-import nltk
 
 # Local imports
+import checkpoints
+import coherence
+import corpora
+import documents
+import embeddings
+import exports
 import frex
+import instrumentation
 import preprocessing
+import search
+import updates
+from stemming import StemCache
 
 
 CONFIG = dotenv_values(".env")
-DATASETS = ["fed", "newsgroups"]
+DATASETS = ["fed", "newsgroups", "news", "news_full"]
+BACKENDS = ["lda", "bertopic"]
+# Input files of the datasets, relative to `DATA_DIR`.
+# `news` is the sampled news set, `news_full` every stemmed news article.
+DATASET_FILES = {
+    "fed": "processed/communications.csv",
+    "news": "processed/news_final.parquet",
+    "news_full": "filtered/06_stemmed_text.parquet",
+}
+# Directory of the embedding stores, relative to the corpus cache
+EMBEDDINGS_DIR = "embeddings"
+# Directory of the coherence index, relative to the corpus cache. Memory-mapped by every job of a sweep.
+COHERENCE_DIR = "coherence"
 # Default CLI options
 WORKERS = 4
+JOBS = 1
+# Training parameters passed to `LdaMulticore`. Gensim's defaults.
+LDA_PARAMS = {"passes": 1, "iterations": 50, "chunksize": 2000}
 MIN_TOPICS = 5
 MAX_TOPICS = 30
+# Exclusivity weights of FREX. The first one gives the exclusivity metric, like R's `exclusivity`.
+# The second is the default of stm's `labelTopics`. Words are listed for both.
+FREX_WEIGHTS = [0.7, 0.5]
 
 
 def main():
     args = parse_args()
 
-    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    dir_name = "lda" + "_" + args.dataset + "_" + timestamp
-    data_dir = pathlib.Path(os.path.join(CONFIG["DATA_DIR"], "processed"))
+    if args.run_dir is None:
+        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        dir_name = args.backend + "_" + args.dataset + "_" + timestamp
+    else:
+        dir_name = args.run_dir
+    data_dir = pathlib.Path(CONFIG["DATA_DIR"])
     output_dir = os.path.join(CONFIG["OUTPUT_DIR"], dir_name)
     figures_dir = os.path.join(CONFIG["FIGURE_DIR"], dir_name)
-    os.makedirs(output_dir, exist_ok=True)
     os.makedirs(figures_dir, exist_ok=True)
 
-    texts = load_dataset(args.dataset, data_dir)
-    gensim_dict = Dictionary(documents=texts)
-    corpus = [gensim_dict.doc2bow(t) for t in texts]
-
-    metrics_dict = {"n_topics": [], "exclusivity": [], "coherence": []}
-
-    topic_range = range(args.min_topics, args.max_topics + 1)
-    for n in tqdm(topic_range, desc="Training LDA models", unit="model"):
-        lda = LdaMulticore(corpus, num_topics=n, workers=args.workers, id2word=gensim_dict)
-        topics_df = get_topics_df(lda)
-
-        topics = lda.get_topics()
-        frex_metric = frex.exclusivity(topics)
-        exclusivity = np.mean(frex_metric) # The original R `plotModels` function computes the average
-
-        cm = CoherenceModel(model=lda, corpus=corpus, texts=texts)
-        coherence = cm.get_coherence()
-
-        metrics_dict["n_topics"].append(n)
-        metrics_dict["exclusivity"].append(exclusivity)
-        metrics_dict["coherence"].append(coherence)
-
-        filename = f"{output_dir}/lda_{n:02}_topics.csv"
-        topics_df.write_csv(filename)
+    workers_per_job = max(1, args.workers // args.jobs)
+    # Hashes the whole input file, so it is only computed once per run
+    key = corpus_key(args.dataset, data_dir, args.vocabulary)
+    run_config = {
+        "dataset": args.dataset,
+        "corpus": key,
+        "seed": args.seed,
+        "lda": LDA_PARAMS,
+        "coherence": args.coherence,
+    }
+    if args.backend == "bertopic":
+        del run_config["lda"]
+        run_config["embedder"] = args.embedder
+    # Recorded in the run directory, but not part of the checkpoints' hash, since they don't define the models
+    execution = {"workers": workers_per_job, "jobs": args.jobs}
+    run_dir = checkpoints.RunDirectory(pathlib.Path(output_dir), run_config, prefix=args.backend, execution=execution)
+    # Stages that are not specific to one model. Those of each model are saved in the run directory.
+    timer = instrumentation.StageTimer(run_dir.profiles_dir() if args.profile else None)
+
+    @functools.cache
+    def corpus_data():
+        # Only loaded once, and only if a model needs to be trained
+        with timer.stage("load_corpus"):
+            gensim_dict, corpus, texts = load_corpus(
+                args.dataset, data_dir, rebuild=args.rebuild_cache, vocabulary=args.vocabulary, key=key)
+        print("Indexing word occurrences for coherence...")
+        with timer.stage("coherence_index"):
+            coherence_index = coherence.CoherenceIndex.cached(
+                corpora.CorpusCache(data_dir / "cache", key).directory / COHERENCE_DIR, texts, gensim_dict,
+                rebuild=args.rebuild_cache)
+        return gensim_dict, corpus, texts, coherence_index
+
+    coarse_df, coarse_timings = None, None
+    if args.update is not None:
+        update = update_models(
+            run_dir, pathlib.Path(args.update), args.dataset, data_dir, measure=args.coherence,
+            min_df=args.min_new_df, max_new_terms=args.max_new_terms, vocabulary=args.vocabulary,
+            base_key=key, timer=timer, profile=args.profile)
+        for metrics in tqdm(update, desc="Updating LDA models", unit="model"):
+            run_dir.save_metrics(metrics)
+    elif args.search:
+        coarse_df, coarse_timings = search_topics(run_dir, corpus_data, args, workers_per_job)
+    elif args.backend == "bertopic":
+        topic_range = list(range(args.min_topics, args.max_topics + 1))
+        train_bertopic(run_dir, topic_range, corpus_data, args, data_dir, timer)
+    else:
+        topic_range = list(range(args.min_topics, args.max_topics + 1))
+        train_pending(run_dir, topic_range, corpus_data, args, workers_per_job)
 
     print("All models have been run")
-    metrics_df = pl.DataFrame(metrics_dict)
-    metrics_filename = f"{output_dir}/lda_metrics.csv"
+    if args.export:
+        _, corpus, _ = load_corpus(args.dataset, data_dir, vocabulary=args.vocabulary, key=key)
+        doc_ids = corpora.CorpusCache(data_dir / "cache", key).doc_ids()
+        export_models(
+            run_dir, corpus, dtype=np.float32 if args.float32 else np.float64, top_n=args.theta_top_n,
+            doc_ids=doc_ids, timer=timer)
+
+    metrics_df = run_dir.metrics_df().with_columns(fidelity=pl.lit("full"))
+    timings = [timer.df(), run_dir.timings_df().with_columns(fidelity=pl.lit("full"))]
+    if coarse_df is not None:
+        metrics_df = pl.concat([coarse_df, metrics_df]).sort("n_topics", "fidelity")
+        timings.append(coarse_timings)
+    metrics_filename = f"{output_dir}/{args.backend}_metrics.csv"
     metrics_df.write_csv(metrics_filename)
     print(f"Metrics saved to {metrics_filename}")
+    timings_filename = f"{output_dir}/{args.backend}_timings.csv"
+    pl.concat([t for t in timings if not t.is_empty()], how="diagonal_relaxed").write_csv(timings_filename)
+    print(f"Stage timings saved to {timings_filename}")
 
     fig = plot_coherence_and_exclusivity(metrics_df)
-    fig.savefig(f"{figures_dir}/lda.png", bbox_inches='tight', dpi=300)
+    fig.savefig(f"{figures_dir}/{args.backend}.png", bbox_inches='tight', dpi=300)
     plt.close(fig)
 
 
@@ -83,19 +156,603 @@ def parse_args():
     Instantiates parser and sets up arguments. Returns parsed args.
     """
     parser = argparse.ArgumentParser(description="Train topic models")
-    parser.add_argument("--workers", type=int, default=WORKERS, help=f"Number of workers to train algorithms (default: {WORKERS})")
+    parser.add_argument("--backend", type=str, choices=BACKENDS, default="lda",
+        help=f"Topic model (choices: {BACKENDS}, default: lda)")
+    parser.add_argument("--workers", type=int, default=WORKERS,
+        help=f"Total number of workers to train algorithms, split between concurrent models (default: {WORKERS})")
+    parser.add_argument("--jobs", type=int, default=JOBS,
+        help=f"Number of models trained at the same time (default: {JOBS})")
     parser.add_argument("--min_topics", type=int, default=MIN_TOPICS, help=f"Number of topics for smallest model (default: {MIN_TOPICS})")
     parser.add_argument("--max_topics", type=int, default=MAX_TOPICS, help=f"Number of topics for largest number (default: {MAX_TOPICS})")
     parser.add_argument("--dataset", type=str, choices=DATASETS, default="fed",
         help=f"Dataset to be used to train the models (choices: {DATASETS})")
+    parser.add_argument("--coherence", type=str, choices=coherence.MEASURES, default="c_v",
+        help=f"Coherence measure (choices: {coherence.MEASURES}, default: c_v)")
+    parser.add_argument("--check_coherence", action="store_true",
+        help="Check the coherence of the first model against gensim's CoherenceModel")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for LDA (default: None)")
+    parser.add_argument("--run_dir", type=str, default=None,
+        help="Name of the output directory. Models already trained there with the same settings are skipped "
+        "(default: new timestamped directory)")
+    parser.add_argument("--rebuild_cache", action="store_true",
+        help="Rebuild the dictionary and corpus even if they are cached")
+    parser.add_argument("--vocabulary", type=str, default=None,
+        help="Pruned dictionary written by vocabulary.py. Terms missing from it are dropped from the corpus "
+        "(default: every term of the dataset)")
+    parser.add_argument("--update", type=str, default=None,
+        help="Parquet file of new stemmed documents. Updates the models trained in --run_dir with them "
+        "instead of training new models")
+    parser.add_argument("--min_new_df", type=int, default=updates.MIN_NEW_DF,
+        help=f"Minimum number of new documents a new term must occur in to be added (default: {updates.MIN_NEW_DF})")
+    parser.add_argument("--max_new_terms", type=int, default=updates.MAX_NEW_TERMS,
+        help=f"Maximum number of new terms added by an update (default: {updates.MAX_NEW_TERMS})")
+    parser.add_argument("--search", action="store_true",
+        help="Search the range of topics adaptively: train cheap models on a coarse grid first, "
+        "then fully train only the neighbourhood of the best ones")
+    parser.add_argument("--search_step", type=int, default=search.SEARCH_STEP,
+        help=f"Spacing of the coarse grid (default: {search.SEARCH_STEP})")
+    parser.add_argument("--search_fraction", type=float, default=search.SEARCH_FRACTION,
+        help=f"Fraction of the documents the coarse models are trained on (default: {search.SEARCH_FRACTION})")
+    parser.add_argument("--search_keep", type=int, default=search.SEARCH_KEEP,
+        help=f"Number of coarse models whose neighbourhood is fully trained (default: {search.SEARCH_KEEP})")
+    parser.add_argument("--export", action="store_true",
+        help="Export the topic-word matrix and theta of every model in the run directory to parquet")
+    parser.add_argument("--float32", action="store_true", help="Export single precision floats")
+    parser.add_argument("--theta_top_n", type=int, default=None,
+        help="Only export the N most probable topics of each document, in long format (default: every topic)")
+    parser.add_argument("--embedder", type=str, default=embeddings.EMBEDDER,
+        help="Embedder of the BERTopic backend: a sentence-transformer name or local path, or 'hashing[:dim]' "
+        f"for an offline stand-in (default: {embeddings.EMBEDDER})")
+    parser.add_argument("--embedding_batch_size", type=int, default=embeddings.BATCH_SIZE,
+        help=f"Number of documents embedded at once (default: {embeddings.BATCH_SIZE})")
+    parser.add_argument("--profile", action="store_true",
+        help="Profile every stage with cProfile and save the stats in the run directory")
     args = parser.parse_args()
 
     if args.min_topics > args.max_topics:
         parser.error("min_topics cannot be greater than max_topics")
+    if args.jobs < 1 or args.jobs > args.workers:
+        parser.error("jobs must be between 1 and the number of workers")
+    if args.update is not None and args.run_dir is None:
+        parser.error("--update requires the --run_dir of the models to be updated")
+    if args.update is not None and args.search:
+        parser.error("--update and --search cannot be used together")
+    if args.search_step < 1 or args.search_keep < 1:
+        parser.error("search_step and search_keep must be at least 1")
+    if not 0 < args.search_fraction <= 1:
+        parser.error("search_fraction must be between 0 and 1")
+    if args.theta_top_n is not None and args.theta_top_n < 1:
+        parser.error("theta_top_n must be at least 1")
+    if args.backend == "bertopic" and (args.update is not None or args.search or args.export):
+        parser.error("--update, --search and --export are only available with the lda backend")
+    if args.embedding_batch_size < 1:
+        parser.error("embedding_batch_size must be at least 1")
+    if args.vocabulary is not None and (error := vocabulary_error(args.vocabulary, args.dataset)) is not None:
+        parser.error(error)
     return args
 
 
-def load_dataset(dataset: str, data_dir: pathlib.Path) -> list[list[str]]:
+def vocabulary_error(vocabulary: pathlib.Path, dataset: str) -> str | None:
+    """
+    Returns why a pruned dictionary cannot be used with a dataset, or `None` if it was built for it.
+    The corpus cache key only hashes the dictionary file, so a dictionary of another dataset would
+    otherwise silently drop the terms it lacks.
+    """
+    path = corpora.vocabulary_settings_path(vocabulary)
+    if not path.exists():
+        return f"'{path}' is missing, prune '{vocabulary}' again with vocabulary.py"
+    with open(path) as f:
+        built_for = json.load(f)["dataset"]
+    if built_for != dataset:
+        return f"'{vocabulary}' was built for the {built_for} dataset, not {dataset}"
+    return None
+
+
+def train_pending(
+        run_dir: checkpoints.RunDirectory, topic_numbers: list[int], corpus_data: Callable[[], tuple],
+        args, workers_per_job: int, lda_params: dict = LDA_PARAMS, fraction: float | None = None):
+    """
+    Trains the models of the given numbers of topics that are not yet in the run directory.
+
+    Parameters
+    ----------
+    run_dir : checkpoints.RunDirectory
+        Run directory the models are saved to.
+    topic_numbers : list[int]
+        Numbers of topics to train models for.
+    corpus_data : Callable[[], tuple]
+        Returns the dictionary, corpus, texts and coherence index. Only called if a model is missing.
+    args
+        Parsed CLI arguments.
+    workers_per_job : int
+        Number of workers for each model.
+    lda_params : dict, optional
+        Training parameters passed to `LdaMulticore`. Default `LDA_PARAMS`.
+    fraction : float, optional
+        If given, models are trained on a random subsample of this fraction of the documents.
+        Coherence is still computed over every document.
+    """
+    finished = run_dir.finished()
+    pending = [n for n in topic_numbers if n not in finished]
+    if len(pending) < len(topic_numbers):
+        print(f"Skipping {len(topic_numbers) - len(pending)} models already trained in '{run_dir.path}'")
+    if not pending:
+        return
+
+    gensim_dict, corpus, texts, coherence_index = corpus_data()
+    parity_texts = texts if args.check_coherence else None
+    if fraction is not None:
+        corpus = corpora.SubsampledCorpus(corpus, fraction, seed=args.seed)
+        parity_texts = None
+
+    train = functools.partial(
+        train_model, gensim_dict=gensim_dict, corpus=corpus, coherence_index=coherence_index,
+        workers=workers_per_job, measure=args.coherence, seed=args.seed, run_dir=run_dir, lda_params=lda_params,
+        profile=args.profile)
+    sweep = run_sweep(pending, train, jobs=args.jobs, parity_texts=parity_texts)
+    for metrics in tqdm(sweep, total=len(pending), desc="Training LDA models", unit="model"):
+        run_dir.save_metrics(metrics)
+
+
+def train_bertopic(
+        run_dir: checkpoints.RunDirectory, topic_numbers: list[int], corpus_data: Callable[[], tuple],
+        args, data_dir: pathlib.Path, timer: instrumentation.StageTimer | None = None):
+    """
+    Trains the BERTopic models of the given numbers of topics that are not yet in the run directory.
+
+    Documents are embedded through the embedding store of the corpus cache, so only documents that were
+    never embedded by the same embedder are encoded. The embeddings are reduced once and clustered for
+    each number of topics. Models are scored and saved like LDA models, on the same dictionary.
+
+    Parameters
+    ----------
+    run_dir : checkpoints.RunDirectory
+        Run directory the models are saved to.
+    topic_numbers : list[int]
+        Numbers of topics to train models for.
+    corpus_data : Callable[[], tuple]
+        Returns the dictionary, corpus, texts and coherence index. Only called if a model is missing.
+    args
+        Parsed CLI arguments.
+    data_dir : pathlib.Path
+        Path to the data.
+    timer : instrumentation.StageTimer, optional
+        Timer of the stages shared by every model. Those of each model are saved in the run directory.
+    """
+    # Imported here, since BERTopic pulls in UMAP and numba, which the LDA backend does not need
+    import bertopic_models
+
+    finished = run_dir.finished()
+    pending = [n for n in topic_numbers if n not in finished]
+    if len(pending) < len(topic_numbers):
+        print(f"Skipping {len(topic_numbers) - len(pending)} models already trained in '{run_dir.path}'")
+    if not pending:
+        return
+
+    timer = timer or instrumentation.StageTimer()
+    gensim_dict, _, texts, coherence_index = corpus_data()
+    docs = [" ".join(t) for t in texts]
+    store = embeddings.EmbeddingStore(data_dir / "cache" / EMBEDDINGS_DIR, embeddings.load_embedder(args.embedder))
+    print(f"Embedding documents with '{args.embedder}'...")
+    with timer.stage("embed"):
+        vectors = store.embed(docs, batch_size=args.embedding_batch_size)
+    with timer.stage("reduce"):
+        reduced = bertopic_models.reduce_embeddings(vectors, seed=args.seed)
+
+    for n in tqdm(pending, desc="Training BERTopic models", unit="model"):
+        model_timer = instrumentation.StageTimer(run_dir.profiles_dir() if args.profile else None)
+        with model_timer.stage("train", n_topics=n):
+            model = bertopic_models.fit(n, docs, reduced, gensim_dict, seed=args.seed)
+        with model_timer.stage("top_words", n_topics=n):
+            topics_df = exports.top_words_df(model)
+        with model_timer.stage("save_model", n_topics=n):
+            run_dir.save_model(n, model, topics_df)
+        metrics = score_model(model, coherence_index, args.coherence, timer=model_timer, run_dir=run_dir)
+        run_dir.save_timings(n, model_timer.rows)
+        run_dir.save_metrics(metrics)
+
+
+def search_topics(
+        run_dir: checkpoints.RunDirectory, corpus_data: Callable[[], tuple],
+        args, workers_per_job: int) -> tuple[pl.DataFrame, pl.DataFrame]:
+    """
+    Searches the range of topics adaptively, in two rungs of increasing fidelity.
+    Cheap models are first trained on a coarse grid, on a subsample of the documents and with fewer iterations.
+    They are ranked on the coherence/exclusivity frontier, and only the numbers of topics around the best
+    ones are fully trained. Coarse models are checkpointed in their own subdirectory of the run directory.
+
+    Parameters
+    ----------
+    run_dir : checkpoints.RunDirectory
+        Run directory of the fully trained models.
+    corpus_data : Callable[[], tuple]
+        Returns the dictionary, corpus, texts and coherence index.
+    args
+        Parsed CLI arguments.
+    workers_per_job : int
+        Number of workers for each model.
+
+    Returns
+    -------
+    tuple[pl.DataFrame, pl.DataFrame]
+        Metrics and stage timings of the coarse models, with a `fidelity` column.
+    """
+    coarse_config = {**run_dir.config, "lda": search.COARSE_LDA_PARAMS, "fraction": args.search_fraction}
+    coarse_dir = checkpoints.RunDirectory(run_dir.path / checkpoints.COARSE_DIR, coarse_config, execution=run_dir.execution)
+    grid = search.coarse_grid(args.min_topics, args.max_topics, args.search_step)
+    print(f"Training coarse models for {grid} topics")
+    train_pending(coarse_dir, grid, corpus_data, args, workers_per_job,
+        lda_params=search.COARSE_LDA_PARAMS, fraction=args.search_fraction)
+
+    coarse_df = coarse_dir.metrics_df().filter(pl.col("n_topics").is_in(grid))
+    best = search.frontier_order(coarse_df)[:args.search_keep]
+    full = search.neighbourhood(best, args.search_step, args.min_topics, args.max_topics)
+    print(f"Best coarse models have {best} topics. Fully training {full} topics")
+    train_pending(run_dir, full, corpus_data, args, workers_per_job)
+    coarse_timings = coarse_dir.timings_df().filter(pl.col("n_topics").is_in(grid))
+    return coarse_df.with_columns(fidelity=pl.lit("coarse")), coarse_timings.with_columns(fidelity=pl.lit("coarse"))
+
+
+def run_sweep(topic_numbers: list[int], train: Callable[..., dict], jobs: int = 1, parity_texts=None) -> Iterator[dict]:
+    """
+    Trains and scores one model for each number of topics.
+    With more than one job, models are trained in a process pool.
+    While a model is being scored, which mostly runs on a single core, the others keep training.
+
+    Parameters
+    ----------
+    topic_numbers : list[int]
+        Numbers of topics to train models for.
+    train : Callable[..., dict]
+        `train_model` with every argument but the number of topics bound.
+    jobs : int, optional
+        Number of models trained at the same time. Default `1`.
+    parity_texts : optional
+        Tokenized documents. If given, the coherence of the first model is checked against gensim.
+
+    Yields
+    ------
+    dict
+        Metrics row of each model, in order of completion.
+    """
+    kwargs = [{"parity_texts": parity_texts if i == 0 else None} for i in range(len(topic_numbers))]
+    if jobs == 1:
+        for n, kw in zip(topic_numbers, kwargs):
+            yield train(n, **kw)
+        return
+
+    # Spawning rather than forking, since polars' thread pool does not survive a fork
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=context) as executor:
+        futures = [executor.submit(train, n, **kw) for n, kw in zip(topic_numbers, kwargs)]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def train_model(
+        n: int, gensim_dict: Dictionary, corpus, coherence_index: coherence.CoherenceIndex,
+        workers: int, measure: str = "c_v", seed: int | None = None,
+        run_dir: checkpoints.RunDirectory | None = None, parity_texts=None, lda_params: dict = LDA_PARAMS,
+        profile: bool = False) -> dict:
+    """
+    Trains an LDA model and computes its exclusivity and coherence.
+
+    Parameters
+    ----------
+    n : int
+        Number of topics.
+    gensim_dict : Dictionary
+        Dictionary of the corpus.
+    corpus
+        Bag-of-words corpus.
+    coherence_index : coherence.CoherenceIndex
+        Word occurrence index of the corpus.
+    workers : int
+        Number of workers for training.
+    measure : str, optional
+        Coherence measure. Default `"c_v"`.
+    seed : int, optional
+        Random seed for LDA.
+    run_dir : checkpoints.RunDirectory, optional
+        If given, the model and its topics are saved to it as soon as the model is trained.
+    parity_texts : optional
+        Tokenized documents. If given, the coherence is checked against gensim.
+    lda_params : dict, optional
+        Training parameters passed to `LdaMulticore`. Default `LDA_PARAMS`.
+    profile : bool, optional
+        Whether to profile each stage with cProfile. Stats are saved in the run directory. Default `False`.
+
+    Returns
+    -------
+    dict
+        Metrics row.
+    """
+    # Each model gets its own timer, since models may be trained in other processes
+    timer = instrumentation.StageTimer(run_dir.profiles_dir() if profile and run_dir is not None else None)
+    with timer.stage("train", n_topics=n):
+        lda = LdaMulticore(corpus, num_topics=n, workers=workers, id2word=gensim_dict, random_state=seed, **lda_params)
+    with timer.stage("top_words", n_topics=n):
+        topics_df = exports.top_words_df(lda)
+    if run_dir is not None:
+        with timer.stage("save_model", n_topics=n):
+            run_dir.save_model(n, lda, topics_df)
+
+    if parity_texts is not None:
+        with timer.stage("check_parity", n_topics=n):
+            coherence.check_parity(lda, coherence_index, corpus, parity_texts, measure)
+    metrics = score_model(lda, coherence_index, measure, timer=timer, run_dir=run_dir)
+    if run_dir is not None:
+        run_dir.save_timings(n, timer.rows)
+    return metrics
+
+
+def score_model(
+        lda: LdaMulticore, coherence_index: coherence.CoherenceIndex, measure: str = "c_v",
+        timer: instrumentation.StageTimer | None = None, run_dir: checkpoints.RunDirectory | None = None) -> dict:
+    """
+    Computes the exclusivity and coherence of a trained LDA model.
+    If a timer is given, both are recorded as stages.
+    If a run directory is given, the FREX words of each topic are saved to it, from the same FREX pass.
+
+    Returns
+    -------
+    dict
+        Metrics row.
+    """
+    timer = timer or instrumentation.StageTimer()
+    n = lda.num_topics
+    topics = lda.get_topics()
+    with timer.stage("frex", n_topics=n):
+        [frex_result] = frex.exclusivity_batch([topics], FREX_WEIGHTS)
+        if run_dir is not None:
+            exports.frex_words_df(lda, frex_result).write_csv(run_dir.frex_path(n))
+    frex_metric = frex_result.scores[0]
+    exclusivity = np.mean(frex_metric) # The original R `plotModels` function computes the average
+    with timer.stage("coherence", n_topics=n):
+        model_coherence = coherence_index.coherence(topics, measure)
+
+    return {"n_topics": lda.num_topics, "exclusivity": float(exclusivity), "coherence": model_coherence}
+
+
+def update_models(
+        run_dir: checkpoints.RunDirectory, path: pathlib.Path, dataset: str, data_dir: pathlib.Path,
+        measure: str = "c_v", min_df: int = updates.MIN_NEW_DF, max_new_terms: int = updates.MAX_NEW_TERMS,
+        vocabulary: pathlib.Path | None = None, base_key: str | None = None,
+        timer: instrumentation.StageTimer | None = None, profile: bool = False) -> Iterator[dict]:
+    """
+    Updates every model trained in a run directory with new documents, without retraining on the old ones.
+    The dictionary is extended with the frequent new terms, each model is grown to the new vocabulary
+    and trained online on the new documents only. Models and topics are saved again as they are updated.
+
+    An update is identified by the contents of its file, so a file is only ever applied once.
+    An interrupted update resumes with the models it had not reached yet.
+
+    Parameters
+    ----------
+    run_dir : checkpoints.RunDirectory
+        Run directory of the models.
+    path : pathlib.Path
+        Parquet file with a `text` column of stemmed documents, e.g. the output of `news_processing.py`.
+    dataset : str
+        Name of the dataset the models were trained on.
+    data_dir : pathlib.Path
+        Path to the data.
+    measure : str, optional
+        Coherence measure. Default `"c_v"`.
+    min_df : int, optional
+        Minimum number of new documents a new term must occur in to be added.
+    max_new_terms : int, optional
+        Maximum number of new terms added.
+    vocabulary : pathlib.Path, optional
+        Pruned dictionary the models were trained with, if any.
+    base_key : str, optional
+        Corpus cache key of the dataset, as returned by `corpus_key`. Computed if not given.
+    timer : instrumentation.StageTimer, optional
+        Timer of the stages shared by every model. Those of each model are saved in the run directory.
+    profile : bool, optional
+        Whether to profile the stages of each model with cProfile. Default `False`.
+
+    Yields
+    ------
+    dict
+        Metrics row of each updated model, computed over the old and new documents.
+    """
+    finished = sorted(run_dir.finished())
+    if not finished:
+        raise ValueError(f"No trained models to update in '{run_dir.path}'")
+
+    key = corpora.cache_key(corpus_settings(dataset), path)
+    log = run_dir.updates()
+    entry = next((e for e in log if e["key"] == key), None)
+    if entry is not None and all(n in entry["n_topics"] for n in finished):
+        print(f"'{path}' was already applied to every model")
+        return
+
+    timer = timer or instrumentation.StageTimer()
+    with timer.stage("load_corpus"):
+        base_dict, _, base_texts = load_corpus(dataset, data_dir, vocabulary=vocabulary, key=base_key)
+    gensim_dict = run_dir.load_dictionary()
+    if gensim_dict is None:
+        gensim_dict = base_dict
+
+    cache = corpora.CorpusCache(run_dir.path / checkpoints.UPDATES_DIR, key)
+    if entry is None:
+        new_texts = corpora.ParquetTexts(path)
+        with timer.stage("extend_dictionary"):
+            added = updates.extend_dictionary(gensim_dict, new_texts, min_df, max_new_terms)
+        print(f"Added {added} new terms to the dictionary")
+        with timer.stage("cache_update"):
+            cache.build(new_texts, {**corpus_settings(dataset), "file": str(path)}, gensim_dict=gensim_dict)
+            if (doc_ids := update_doc_ids(path)) is not None:
+                cache.save_doc_ids(doc_ids)
+        # The dictionary is saved once the new corpus is cached, and the update is logged last,
+        # so a logged update always has both behind it
+        run_dir.save_dictionary(gensim_dict)
+        entry = {"file": str(path), "key": key, "n_topics": []}
+        run_dir.record_update(entry)
+        log.append(entry)
+    _, new_corpus, _ = cache.load()
+
+    # Coherence is scored over every document the models have seen so far
+    texts = itertools.chain(base_texts, *(
+        corpora.TextFile(run_dir.path / checkpoints.UPDATES_DIR / e["key"] / corpora.TEXTS_FILE) for e in log
+    ))
+    print("Indexing word occurrences for coherence...")
+    with timer.stage("coherence_index"):
+        # Kept with the cache of the update, as the texts and dictionary are those of the models after it
+        coherence_index = coherence.CoherenceIndex.cached(cache.directory / COHERENCE_DIR, texts, gensim_dict)
+
+    for n in finished:
+        if n in entry["n_topics"]:
+            continue
+        model_timer = instrumentation.StageTimer(run_dir.profiles_dir() if profile else None)
+        with model_timer.stage("load_model", n_topics=n):
+            lda = run_dir.load_model(n)
+            updates.extend_model_vocabulary(lda, gensim_dict)
+        with model_timer.stage("update", n_topics=n):
+            lda.update(new_corpus)
+        with model_timer.stage("save_model", n_topics=n):
+            run_dir.save_model(n, lda, exports.top_words_df(lda))
+        metrics = score_model(lda, coherence_index, measure, timer=model_timer, run_dir=run_dir)
+        run_dir.save_timings(n, model_timer.rows)
+        yield metrics
+        # Resumed once the caller has saved the metrics row
+        entry["n_topics"].append(n)
+        run_dir.record_update(entry)
+
+
+def export_models(
+        run_dir: checkpoints.RunDirectory, corpus, dtype: type = np.float64, top_n: int | None = None,
+        doc_ids: np.ndarray | None = None, timer: instrumentation.StageTimer | None = None):
+    """
+    Exports the topic-word matrix and theta of every model in the run directory to parquet,
+    in the same layout as the `topic_dist.parquet` and `theta.parquet` files written by `run_stm.R`.
+    Theta covers the documents of every update applied to the model too, after those of the corpus.
+
+    Parameters
+    ----------
+    run_dir : checkpoints.RunDirectory
+        Run directory of the models.
+    corpus
+        Bag-of-words corpus theta is inferred for, streamed in batches.
+    dtype : type, optional
+        Floating point type of the output. Default `np.float64`.
+    top_n : int, optional
+        If given, only the `top_n` most probable topics of each document are kept in theta.
+    doc_ids : np.ndarray, optional
+        `documents.DOC_ID` of each document of the corpus, which keys the rows of theta. The documents of
+        updates are keyed by the IDs saved in their cache. By default, or if an update has none, rows
+        are keyed by the position of their document, counting on from the corpus through the updates.
+    timer : instrumentation.StageTimer, optional
+        If given, the export of each model is recorded as a stage.
+    """
+    timer = timer or instrumentation.StageTimer()
+    log = run_dir.updates()
+    update_caches = [corpora.CorpusCache(run_dir.path / checkpoints.UPDATES_DIR, e["key"]) for e in log]
+    for entry, cache in zip(log, update_caches):
+        # Also saved for updates applied before IDs were kept
+        if cache.doc_ids() is None and (ids := update_doc_ids(pathlib.Path(entry["file"]))) is not None:
+            cache.save_doc_ids(ids)
+
+    for n in tqdm(sorted(run_dir.finished()), desc="Exporting topic distributions", unit="model"):
+        with timer.stage("export", n_topics=n):
+            lda = run_dir.load_model(n)
+            exports.topic_word_df(lda, dtype=dtype).write_parquet(run_dir.topic_dist_path(n))
+            applied = [cache for entry, cache in zip(log, update_caches) if n in entry["n_topics"]]
+            model_corpus = itertools.chain(corpus, *(cache.load()[1] for cache in applied))
+            update_ids = [cache.doc_ids() for cache in applied]
+            model_ids = None
+            if doc_ids is not None and all(ids is not None for ids in update_ids):
+                model_ids = np.concatenate([doc_ids, *update_ids])
+            exports.write_theta(lda, model_corpus, run_dir.theta_path(n), dtype=dtype, top_n=top_n, doc_ids=model_ids)
+
+
+def load_corpus(
+        dataset: str, data_dir: pathlib.Path, rebuild: bool = False,
+        vocabulary: pathlib.Path | None = None, key: str | None = None) -> tuple[Dictionary, MmCorpus, corpora.TextFile]:
+    """
+    Loads the dictionary, bag-of-words corpus and texts for the chosen dataset from the corpus cache.
+    The cache is built from `load_dataset` the first time a dataset is used or when its input file changes.
+    The IDs of the documents of news datasets are saved in the cache too, see `corpora.CorpusCache.doc_ids`.
+
+    Parameters
+    ----------
+    dataset : str
+        Name of the dataset.
+
+    data_dir : pathlib.Path
+        Path to the data.
+
+    rebuild : bool, optional
+        Whether to rebuild the cache even if it exists. Default `False`.
+
+    vocabulary : pathlib.Path, optional
+        Pruned dictionary, as written by `vocabulary.py`. The corpus is built with it instead of a new
+        dictionary of every term, and cached under its own key.
+
+    key : str, optional
+        Corpus cache key, as returned by `corpus_key`. Computed if not given, which reads the whole input file.
+
+    Returns
+    -------
+    tuple[Dictionary, MmCorpus, TextFile]
+        Dictionary, streamed bag-of-words corpus and streamed tokenized texts.
+    """
+    if key is None:
+        key = corpus_key(dataset, data_dir, vocabulary)
+    cache = corpora.CorpusCache(data_dir / "cache", key)
+    if rebuild or not cache.exists():
+        print(f"Building corpus cache in '{cache.directory}'...")
+        gensim_dict = Dictionary.load(str(vocabulary)) if vocabulary is not None else None
+        cache.build(load_dataset(dataset, data_dir), corpus_settings(dataset, vocabulary), gensim_dict=gensim_dict)
+    # Also saved for caches built before IDs were kept
+    if cache.doc_ids() is None and (doc_ids := dataset_doc_ids(dataset, data_dir)) is not None:
+        cache.save_doc_ids(doc_ids)
+    return cache.load()
+
+
+def dataset_doc_ids(dataset: str, data_dir: pathlib.Path) -> np.ndarray | None:
+    """
+    Returns the `documents.DOC_ID` of each document of a news dataset, in corpus order, or `None` for the others.
+    Only the ID column is read. See `documents.with_doc_id` for files that do not carry it.
+    """
+    if dataset not in ("news", "news_full"):
+        return None
+    lf = documents.with_doc_id(pl.scan_parquet(data_dir / DATASET_FILES[dataset]))
+    return lf.select(pl.col(documents.DOC_ID).cast(pl.Int64)).collect().to_series().to_numpy()
+
+
+def update_doc_ids(path: pathlib.Path) -> np.ndarray | None:
+    """
+    Returns the `documents.DOC_ID` of each document of an update file, or `None` if it does not carry them.
+    Row positions are not used, as they would clash with the IDs of the corpus.
+    """
+    if not path.exists() or not documents.has_doc_id(pl.scan_parquet(path)):
+        return None
+    lf = documents.with_doc_id(pl.scan_parquet(path))
+    return lf.select(pl.col(documents.DOC_ID).cast(pl.Int64)).collect().to_series().to_numpy()
+
+
+def corpus_settings(dataset: str, vocabulary: pathlib.Path | None = None) -> dict:
+    """
+    Returns the preprocessing settings of a dataset, which are part of its corpus cache key.
+    A pruned dictionary is identified by the hash of its file, so re-pruning gets a new key.
+    """
+    settings = {"dataset": dataset, "stop_words": "nltk-english", "stemmer": "snowball-english"}
+    if vocabulary is not None:
+        settings["vocabulary"] = corpora.cache_key({}, vocabulary)
+    return settings
+
+
+def corpus_key(dataset: str, data_dir: pathlib.Path, vocabulary: pathlib.Path | None = None) -> str:
+    """
+    Returns the corpus cache key of a dataset, computed from its settings and its input file.
+    """
+    path = data_dir / DATASET_FILES[dataset] if dataset in DATASET_FILES else None
+    return corpora.cache_key(corpus_settings(dataset, vocabulary), path)
+
+
+def load_dataset(dataset: str, data_dir: pathlib.Path) -> Iterable[list[str]]:
     """
     Loads chosen dataset.
 
@@ -109,35 +766,28 @@ def load_dataset(dataset: str, data_dir: pathlib.Path) -> list[list[str]]:
     
     Returns
     -------
-    list[list[str]]
-        List of documents. Each document is stripped, so it's a list of strings.
+    Iterable[list[str]]
+        Documents. Each document is stripped, so it's a list of strings.
+        News datasets are streamed from parquet instead of being loaded into a list.
     """
     if dataset == "fed":
-        filename = data_dir / "communications.csv"
+        filename = data_dir / DATASET_FILES["fed"]
         df = pl.read_csv(filename)
         texts = [s.split() for s in df["stemmed_text"]]
     elif dataset == "newsgroups":
         data = fetch_20newsgroups(subset="all", remove=("headers", "footers", "quotes"))
         stop_words = set(stopwords.words("english"))
-        stemmer = nltk.stem.SnowballStemmer("english")
+        stem_cache = StemCache(data_dir / "processed")
 
         preprocessed_texts = [preprocessing.preprocess(t, stop_words=stop_words) for t in data["data"]]
-        stemmed_texts = [preprocessing.stem(t, stemmer=stemmer) for t in preprocessed_texts]
+        stemmed_texts = stem_cache.stem_texts(preprocessed_texts)
+        stem_cache.save()
         texts = [t.split() for t in stemmed_texts]
+    elif dataset in ("news", "news_full"):
+        texts = corpora.ParquetTexts(data_dir / DATASET_FILES[dataset])
     return texts
 
 
-def get_topics_df(lda) -> pl.DataFrame:
-    topics = lda.show_topics(num_topics=-1, formatted=False)
-    d = {"word": [], "topic": [], "prob": []}
-    for topic_num, word_probs in topics:
-        for word, prob in word_probs:
-            d["word"].append(word)
-            d["topic"].append(topic_num + 1)
-            d["prob"].append(prob)
-    return pl.DataFrame(d)
-
-
 def plot_coherence_and_exclusivity(df: pl.DataFrame) -> matplotlib.figure.Figure:
     """
     Plots coherence and exclusivity chart.
@@ -146,6 +796,7 @@ def plot_coherence_and_exclusivity(df: pl.DataFrame) -> matplotlib.figure.Figure
     ---------
     df : pl.DataFrame
         DataFrame containing coherence and exclusivity metrics for each topic model.
+        If it has a `fidelity` column, coarse models are drawn as hollow markers.
 
     Returns
     -------
@@ -153,7 +804,14 @@ def plot_coherence_and_exclusivity(df: pl.DataFrame) -> matplotlib.figure.Figure
         Plot of coherence and exclusivity.
     """
     fig, ax = plt.subplots(figsize=(8, 6))
-    ax.scatter(df["coherence"], df["exclusivity"])
+    if "fidelity" in df.columns and df["fidelity"].n_unique() > 1:
+        for fidelity, group in df.group_by("fidelity", maintain_order=True):
+            hollow = fidelity[0] == "coarse"
+            ax.scatter(group["coherence"], group["exclusivity"], label=fidelity[0],
+                facecolors="none" if hollow else None, edgecolors="tab:gray" if hollow else None)
+        ax.legend(title="Fidelity")
+    else:
+        ax.scatter(df["coherence"], df["exclusivity"])
 
     # Add text labels for each point (topic number)
     for coherence, exclusivity, n_topics in zip(
@@ -0,0 +1,162 @@
+import contextlib
+import cProfile
+import functools
+import os
+import pathlib
+import platform
+import time
+from collections.abc import Iterator
+
+import polars as pl
+
+# `resource` is only available on Unix. Memory is not reported elsewhere.
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+class StageTimer:
+    """
+    Records the wall time, CPU time and memory of the stages of a run.
+
+    Stages are timed with the `stage` context manager or the `timed` decorator, and can be nested.
+    Each stage adds one row with its name, its labels (e.g. the number of topics) and its measurements.
+
+    Parameters
+    ----------
+    profile_dir : pathlib.Path, optional
+        If given, each stage is also run under cProfile and its stats are dumped to
+        `<profile_dir>/<stage>[_<label>...].pstats`, to be read with `pstats` or snakeviz.
+        Stages nested in a profiled stage are only part of the outer profile.
+
+    Notes
+    -----
+    CPU time includes child processes once they have exited, such as the worker pool of `LdaMulticore`.
+    Memory is the resident set size of the current process only: at the start of the stage and its peak
+    during the stage. The peak is exact on Linux. Elsewhere it is the peak since the process started.
+    """
+    def __init__(self, profile_dir: pathlib.Path | None = None):
+        self.profile_dir = pathlib.Path(profile_dir) if profile_dir is not None else None
+        self.rows = []
+        # Peak memory of the stages still running, innermost last
+        self._peaks = []
+        self._profiling = False
+
+    @contextlib.contextmanager
+    def stage(self, name: str, **labels) -> Iterator[None]:
+        """
+        Times the enclosed block as a stage.
+
+        Parameters
+        ----------
+        name : str
+            Name of the stage.
+        **labels
+            Values identifying the stage among others of the same name, e.g. `n_topics=10`.
+        """
+        start_memory = memory_mb("VmRSS")
+        reset_peak_memory()
+        self._peaks.append(start_memory)
+
+        profiler = None
+        if self.profile_dir is not None and not self._profiling:
+            profiler = cProfile.Profile()
+            self._profiling = True
+            profiler.enable()
+
+        start, start_cpu = time.perf_counter(), cpu_seconds()
+        try:
+            yield
+        finally:
+            seconds, cpu = time.perf_counter() - start, cpu_seconds() - start_cpu
+            if profiler is not None:
+                profiler.disable()
+                self._profiling = False
+                self.profile_dir.mkdir(parents=True, exist_ok=True)
+                profiler.dump_stats(self.profile_dir / profile_filename(name, labels))
+
+            # Nested stages reset the peak, so theirs is carried over to the enclosing stage
+            peak = max_memory(memory_mb("VmHWM"), self._peaks.pop())
+            if self._peaks:
+                self._peaks[-1] = max_memory(self._peaks[-1], peak)
+            self.rows.append({
+                "stage": name,
+                **labels,
+                "seconds": seconds,
+                "cpu_seconds": cpu,
+                "start_memory_mb": start_memory,
+                "peak_memory_mb": peak,
+            })
+
+    def timed(self, name: str | None = None, **labels):
+        """
+        Decorator timing every call of a function as a stage, named after the function by default.
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.stage(name or func.__name__, **labels):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def df(self) -> pl.DataFrame:
+        """
+        Returns the recorded stages, in order of completion.
+        """
+        return pl.DataFrame(self.rows)
+
+    def write_csv(self, path: pathlib.Path):
+        self.df().write_csv(path)
+        print(f"Stage timings saved to {path}")
+
+
+def profile_filename(name: str, labels: dict) -> str:
+    return "_".join([name, *(f"{k}-{v}" for k, v in labels.items())]) + ".pstats"
+
+
+def cpu_seconds() -> float:
+    """
+    Returns the CPU time of the current process and of its exited child processes.
+    """
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+
+def max_memory(a: float | None, b: float | None) -> float | None:
+    return max((m for m in (a, b) if m is not None), default=None)
+
+
+def reset_peak_memory():
+    """
+    Resets the peak resident set size of the current process to its current size, where Linux allows it.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def memory_mb(field: str) -> float | None:
+    """
+    Returns a memory figure of the current process in megabytes, or `None` where it is not available.
+
+    Parameters
+    ----------
+    field : str
+        `"VmRSS"` for the current resident set size, `"VmHWM"` for its peak.
+        Read from `/proc` on Linux. Elsewhere, both fall back to the peak since the process started.
+    """
+    status = pathlib.Path("/proc/self/status")
+    if status.exists():
+        for line in status.read_text().splitlines():
+            if line.startswith(field + ":"):
+                return round(int(line.split()[1]) / 1024, 1)
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in kilobytes on Linux and in bytes on macOS
+    scale = 1 if platform.system() == "Darwin" else 1024
+    return round(peak * scale / 2**20, 1)
@@ -0,0 +1,154 @@
+import argparse
+import pathlib
+from datetime import date, timedelta
+from functools import reduce
+from typing import NamedTuple
+
+import polars as pl
+
+# Local imports
+import documents
+import presidents_and_chairmen
+
+
+RAW_DATA = pathlib.Path("data/raw")
+PROCESSED_DATA = pathlib.Path("data/processed")
+NEWS_DATA = pathlib.Path("data/filtered/07_sampled_news.parquet")
+COMMUNICATIONS = PROCESSED_DATA / "communications_stemmed.parquet"
+ECON_DATA = PROCESSED_DATA / "econ_data.parquet"
+NEWS_FINAL = PROCESSED_DATA / "news_final.parquet"
+COMMS_FINAL = PROCESSED_DATA / "communications_final.parquet"
+
+# Period of the communications kept for modelling
+COMMS_START = date(2006, 10, 25)
+COMMS_END = date(2023, 12, 13)
+FINAL_COLUMNS = ["date", "text", "cpi", "funds_rate", "gdp", "unemployment", "president", "party", "fed_chair"]
+DATASETS = ["news", "communications"]
+
+
+class TimeSeries(NamedTuple):
+    name: str
+    filepath: pathlib.Path
+    date_col: str
+    data_col: str
+    # "monthly" values hold for the month after their observation, when they are published.
+    # "quarterly" values hold for the quarter ending on their observation date.
+    frequency: str = "monthly"
+
+
+TIMESERIES = [
+    TimeSeries("cpi", RAW_DATA / "cpi_2006-2025.csv", "observation_date", "CPIAUCSL_PC1"),
+    TimeSeries("funds_rate", RAW_DATA / "fed_funds_rate_2006-2025.csv", "observation_date", "FEDFUNDS"),
+    TimeSeries("gdp", RAW_DATA / "gdp_2006-2025.csv", "observation_date", "GDP_PC1", "quarterly"),
+    TimeSeries("unemployment", RAW_DATA / "unemployment_2006-2025.csv", "observation_date", "UNRATE"),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Join the macroeconomic series, presidents and Fed chairs onto the news and communications")
+    parser.add_argument("--datasets", type=str, nargs="+", choices=DATASETS, default=DATASETS,
+        help="Datasets to build the final files of (default: every dataset)")
+    args = parser.parse_args()
+
+    econ_data = daily_econ_data(TIMESERIES)
+    econ_data.write_parquet(ECON_DATA)
+    print(f"Saved daily series to '{ECON_DATA}'")
+
+    if "news" in args.datasets:
+        lf = pl.scan_parquet(NEWS_DATA).with_columns(pl.col("date").dt.date())
+        if documents.LEGACY_ID in lf.collect_schema().names():
+            lf = documents.with_doc_id(lf)
+        sink(join_covariates(lf, econ_data), NEWS_FINAL)
+
+    if "communications" in args.datasets:
+        lf = (
+            pl.scan_parquet(COMMUNICATIONS)
+            .select(pl.col("Date").str.strptime(pl.Date, "%Y-%m-%d").alias("date"), "text")
+        )
+        lf = (
+            join_covariates(lf, econ_data)
+            .drop_nulls()
+            .filter(pl.col("date").is_between(COMMS_START, COMMS_END))
+        )
+        sink(lf, COMMS_FINAL)
+
+
+def read_timeseries(ts: TimeSeries) -> pl.DataFrame:
+    df = pl.read_csv(ts.filepath, schema={ts.date_col: pl.Date, ts.data_col: pl.Float64})
+    return df.rename({ts.date_col: "date", ts.data_col: ts.name})
+
+
+def daily_series(ts: TimeSeries) -> pl.DataFrame:
+    """
+    Expands a series to one row per day, each holding the value in force on that day.
+
+    Each observation is turned into the first day it holds for, the series is upsampled to daily
+    frequency and the gaps are forward filled. The last value holds until the end of its period.
+
+    Returns
+    -------
+    pl.DataFrame
+        Table with a `date` and a `ts.name` column, sorted by date.
+    """
+    df = read_timeseries(ts).sort("date")
+    if ts.frequency == "monthly":
+        # Published the month after the observation, so each value holds from the next observation date
+        starts = df.select(pl.col("date").shift(-1), ts.name).drop_nulls("date")
+        end = starts["date"].max().replace(day=1)
+        end = (end + timedelta(days=32)).replace(day=1)
+    elif ts.frequency == "quarterly":
+        # Each value holds for the three months up to its observation date, which belongs to the next quarter
+        # if there is one
+        starts = df.select(pl.col("date").dt.offset_by("-3mo"), ts.name)
+        end = df["date"].max() + timedelta(days=1)
+    else:
+        raise ValueError(f"Unknown frequency '{ts.frequency}' of series '{ts.name}'")
+
+    # A last, empty row marks the end of the last period, so that upsampling covers it
+    last = pl.DataFrame({"date": [end], ts.name: [None]}, schema=starts.schema)
+    return (
+        pl.concat([starts, last])
+        .upsample("date", every="1d")
+        .with_columns(pl.col(ts.name).forward_fill())
+        .filter(pl.col("date") < end)
+    )
+
+
+def daily_econ_data(timeseries: list[TimeSeries]) -> pl.DataFrame:
+    """
+    Returns every series at daily frequency, one column each, over the union of their days.
+    """
+    dfs = [daily_series(ts) for ts in timeseries]
+    return reduce(lambda left, right: left.join(right, on="date", how="full", coalesce=True), dfs).sort("date")
+
+
+def join_covariates(lf: pl.LazyFrame, econ_data: pl.DataFrame) -> pl.LazyFrame:
+    """
+    Adds the daily series and the president, party and Fed chair of each document, by its `date` column.
+    The documents are never collected: the series are a small table joined onto the scan, and the roles
+    are looked up per row, so the plan streams.
+
+    Returns
+    -------
+    pl.LazyFrame
+        Documents with the `FINAL_COLUMNS`, in their original order, after their `documents.DOC_ID` if they have one.
+    """
+    id_columns = [documents.DOC_ID] if documents.DOC_ID in lf.collect_schema().names() else []
+    lf = lf.join(econ_data.lazy(), on="date", how="left", maintain_order="left")
+    lf = presidents_and_chairmen.annotate(lf)
+    return lf.select(id_columns + FINAL_COLUMNS)
+
+
+def sink(lf: pl.LazyFrame, path: pathlib.Path):
+    """
+    Streams a plan to parquet through a temporary file, so an interrupted run leaves no partial output.
+    """
+    print(f"Sinking '{path}'...")
+    tmp_path = path.with_suffix(".tmp")
+    lf.sink_parquet(tmp_path)
+    tmp_path.replace(path)
+    print(f"Saved final data to '{path}'")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+import argparse
+import pathlib
+from datetime import datetime
+
+import polars as pl
+
+# Local imports
+import documents
+import instrumentation
+
+
+RAW_FILE = "data/raw/nasdaq_exteral_data.csv"
+FILTERED_DIR = "data/filtered"
+FILTERED_FILENAME = "data/filtered/04_no_null_articles.parquet"
+TIMINGS_FILE = "data/filtered/04_no_null_articles_timings.csv"
+PROFILES_DIR = "data/filtered/04_no_null_articles_profiles"
+# Articles published before this are dropped
+EARLIEST = datetime(1999, 12, 21)
+RENAME_COLUMNS = {
+    "Unnamed: 0": documents.DOC_ID,
+    "Date": "date",
+    "Article_title": "title",
+    "Article": "article",
+    "Url": "url",
+    "Publisher": "publisher",
+    "Author": "author",
+}
+CYRILLIC = r"[\u0400-\u04FF]"
+# Output of each step, as written by the filtering notebook
+STEP_FILES = {
+    "relevant_cols": "01_relevant_cols.parquet",
+    "date": "02_1999-2023.parquet",
+    "no_russians": "03_no_russians.parquet",
+    "no_null_articles": "04_no_null_articles.parquet",
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Filter the raw Nasdaq news dump down to the articles to model")
+    parser.add_argument("-i", "--input", type=str, default=RAW_FILE,
+        help=f"Raw news CSV (default: {RAW_FILE})")
+    parser.add_argument("-o", "--output", type=str, default=FILTERED_FILENAME,
+        help=f"Filtered parquet file (default: {FILTERED_FILENAME})")
+    parser.add_argument("--publishers", type=str, nargs="+", default=None,
+        help="Only keep the articles of these publishers (default: every publisher)")
+    parser.add_argument("--debug", action="store_true",
+        help=f"Also write the output of every step to '{FILTERED_DIR}', like the filtering notebook did")
+    parser.add_argument("--profile", action="store_true",
+        help="Profile every stage with cProfile and save the stats next to the output")
+    args = parser.parse_args()
+    timer = instrumentation.StageTimer(PROFILES_DIR if args.profile else None)
+
+    steps = filter_steps(pl.scan_csv(args.input), publishers=args.publishers)
+    output = pathlib.Path(args.output)
+    print("Sinking filtered parquet file...")
+    with timer.stage("sink"):
+        sink_steps(steps, output, debug_dir=pathlib.Path(FILTERED_DIR) if args.debug else None)
+    print(f"Saved filtered data to '{output}'")
+    timer.write_csv(TIMINGS_FILE)
+
+
+def sink_steps(steps: dict[str, pl.LazyFrame], output: pathlib.Path, debug_dir: pathlib.Path | None = None):
+    """
+    Writes the last step of `filter_steps` to `output`, and the others to `debug_dir` if given,
+    named as in `STEP_FILES`. Every step is sunk from the same plan, so the CSV is still read once.
+    """
+    tmp_path = output.with_suffix(".tmp")
+    if debug_dir is not None:
+        sinks = [
+            lf.sink_parquet(debug_dir / STEP_FILES[step], lazy=True)
+            for step, lf in steps.items() if step != "no_null_articles"
+        ]
+        pl.collect_all([*sinks, steps["no_null_articles"].sink_parquet(tmp_path, lazy=True)])
+    else:
+        steps["no_null_articles"].sink_parquet(tmp_path)
+    tmp_path.replace(output)
+
+
+def filter_steps(lf: pl.LazyFrame, publishers: list[str] | None = None) -> dict[str, pl.LazyFrame]:
+    """
+    Builds the filtering of the raw news as one lazy plan, returning the plan up to each step.
+    Only the last one needs to be run: polars pushes the column selection and the filters down
+    to the CSV scan, so the articles are read once and dropped rows are never carried along.
+
+    Steps, each starting from the previous one:
+    - `relevant_cols`: keeps and renames the columns, parses the dates and turns the raw row number into `documents.DOC_ID`.
+    - `date`: drops the articles published before `EARLIEST`.
+    - `no_russians`: drops the articles with Cyrillic characters or no title.
+    - `no_null_articles`: drops the articles with no text, and those of other publishers if `publishers` is given.
+
+    Parameters
+    ----------
+    lf : pl.LazyFrame
+        Scan of the raw Nasdaq CSV.
+    publishers : list[str], optional
+        Publishers whose articles are kept. By default, every publisher's, as in the notebook.
+
+    Returns
+    -------
+    dict[str, pl.LazyFrame]
+        Plan ending at each step, in order.
+    """
+    steps = {}
+    lf = lf.select(
+        pl.col("Unnamed: 0").cast(pl.Int64, strict=False),
+        pl.col("Date").str.replace(" UTC", "", literal=True).str.strptime(pl.Datetime, "%Y-%m-%d %H:%M:%S"),
+        "Article_title", "Article", "Url", "Publisher", "Author",
+    ).rename(RENAME_COLUMNS)
+    steps["relevant_cols"] = lf
+
+    lf = lf.filter(pl.col("date") >= EARLIEST)
+    steps["date"] = lf
+
+    # Articles with no title are dropped too, as they were by the notebook's `map_elements` filter
+    lf = lf.filter(pl.col("title").is_not_null() & ~pl.col("title").str.contains(CYRILLIC))
+    steps["no_russians"] = lf
+
+    lf = lf.filter(pl.col("article").is_not_null())
+    if publishers is not None:
+        lf = lf.filter(pl.col("publisher").is_in(publishers))
+    steps["no_null_articles"] = lf
+    return steps
+
+
+if __name__ == "__main__":
+    main()
@@ -1,51 +1,192 @@
 import polars as pl
+import documents
+import instrumentation
 import preprocessing
-import nltk
+from stemming import StemCache
 from nltk.corpus import stopwords
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
+from tqdm import tqdm
 import argparse
+import pathlib
+import json
 
 
 FILE = "data/filtered/04_no_null_articles.parquet"
-CLEANED_FILENAME = "data/filtered/05_cleaned_text.parquet"
 STEMMED_FILENAME = "data/filtered/06_stemmed_text.parquet"
+STEM_CACHE_DIR = "data/processed"
+PARTS_DIR = "data/filtered/06_stemmed_text_parts"
+MANIFEST = "manifest.json"
+TIMINGS_FILE = "data/filtered/06_stemmed_text_timings.csv"
+PROFILES_DIR = "data/filtered/06_stemmed_text_profiles"
+# Default CLI options
+PROCESSES = 1
+CHUNK_SIZE = 50_000
 
 
 def main():
     parser = argparse.ArgumentParser(description="Clean and stem news data")
     parser.add_argument("-d", "--dummy_data", action="store_true",
         help="Whether to use dummy data (to test the pipeline) or not")
+    parser.add_argument("-p", "--processes", type=int, default=PROCESSES,
+        help=f"Number of processes. More than one processes the file in resumable chunks (default: {PROCESSES})")
+    parser.add_argument("--chunk_size", type=int, default=CHUNK_SIZE,
+        help=f"Rows per chunk when running with more than one process (default: {CHUNK_SIZE})")
+    parser.add_argument("--profile", action="store_true",
+        help="Profile every stage with cProfile and save the stats next to the output")
     args = parser.parse_args()
+    timer = instrumentation.StageTimer(PROFILES_DIR if args.profile else None)
 
-    lf = pl.scan_parquet(FILE)
+    lf = documents.with_doc_id(pl.scan_parquet(FILE))
     if args.dummy_data:
         lf = lf.head()
 
     stopword_set = set(stopwords.words("english"))
-    stemmer = nltk.stem.SnowballStemmer("english")
-
-    lf = lf.with_columns(
-        pl.col("article")
-        .map_elements(lambda s: preprocessing.preprocess(s, stopword_set), return_dtype=pl.String)
-        .alias("clean_text")
-    )
-
-    lf = lf.select(pl.exclude("article")).rename({"clean_text": "text"})
-    print("Sinking cleaned parquet file...")
-    lf.sink_parquet(CLEANED_FILENAME)
-    print(f"Saved preprocessed data to '{CLEANED_FILENAME}'")
-
-    lf = pl.scan_parquet(CLEANED_FILENAME)
-    lf = lf.with_columns(
-        pl.col("text")
-        .map_elements(lambda s: preprocessing.stem(s, stemmer), return_dtype=pl.String)
-        .alias("stemmed_text")
-    )
-    lf = lf.select(pl.exclude("text")).rename({"stemmed_text": "text"})
+    stem_cache = StemCache(STEM_CACHE_DIR)
+
+    with timer.stage("check_parity"):
+        sample = lf.head(preprocessing.PARITY_ROWS).collect()["article"]
+        preprocessing.check_parity(sample, stopword_set, stem_cache)
+
+    if args.processes > 1:
+        n_rows = lf.select(pl.len()).collect().item()
+        process_in_chunks(n_rows, args.chunk_size, args.processes, stem_cache, timer)
+        timer.write_csv(TIMINGS_FILE)
+        return
+
+    with timer.stage("vocabulary"):
+        lf = preprocessing.preprocess_and_stem(lf, "article", stopword_set, stem_cache)
+    lf = lf.rename({"article": "text"})
     print("Sinking stemmed parquet file...")
-    lf.sink_parquet(STEMMED_FILENAME)
+    with timer.stage("sink"):
+        lf.sink_parquet(STEMMED_FILENAME)
+        stem_cache.save()
+    print(f"Saved preprocessed data to '{STEMMED_FILENAME}'")
+    timer.write_csv(TIMINGS_FILE)
+
+
+def process_in_chunks(
+        n_rows: int, chunk_size: int, processes: int, stem_cache: StemCache,
+        timer: instrumentation.StageTimer | None = None):
+    """
+    Cleans and stems the news file in chunks of rows spread over a process pool.
+    Each chunk is written to its own part file and recorded in a manifest,
+    so that an interrupted run picks up where it stopped.
+    The parts are merged into `STEMMED_FILENAME` once all chunks are done.
+
+    Parameters
+    ----------
+    n_rows : int
+        Number of rows in the input file.
+    chunk_size : int
+        Number of rows per chunk.
+    processes : int
+        Size of the process pool.
+    stem_cache : StemCache
+        Stem cache. Stems found by the workers are merged into it and saved as chunks finish.
+    timer : instrumentation.StageTimer, optional
+        If given, processing the chunks and merging the parts are recorded as stages.
+        Only the main process is profiled.
+    """
+    timer = timer or instrumentation.StageTimer()
+    parts_dir = pathlib.Path(PARTS_DIR)
+    parts_dir.mkdir(parents=True, exist_ok=True)
+    manifest = load_manifest(parts_dir, n_rows, chunk_size)
+
+    chunks = {
+        i: (offset, min(chunk_size, n_rows - offset))
+        for i, offset in enumerate(range(0, n_rows, chunk_size))
+    }
+    pending = [i for i in chunks if i not in manifest["done"]]
+    print(f"{len(chunks) - len(pending)} of {len(chunks)} chunks already done")
+
+    # Polars' thread pool does not survive a fork, so workers are spawned
+    context = multiprocessing.get_context("spawn")
+    with timer.stage("chunks"), ProcessPoolExecutor(max_workers=processes, mp_context=context) as executor:
+        futures = {
+            executor.submit(process_chunk, i, *chunks[i], part_path(parts_dir, i)): i
+            for i in pending
+        }
+        for future in tqdm(as_completed(futures), total=len(futures), desc="Processing chunks", unit="chunk"):
+            stem_cache.merge(future.result())
+            stem_cache.save()
+            manifest["done"].append(futures[future])
+            save_manifest(parts_dir, manifest)
+
+    print("Merging part files...")
+    parts = [part_path(parts_dir, i) for i in sorted(chunks)]
+    with timer.stage("merge"):
+        pl.scan_parquet(parts).sink_parquet(STEMMED_FILENAME)
     print(f"Saved preprocessed data to '{STEMMED_FILENAME}'")
 
 
+def process_chunk(chunk: int, offset: int, length: int, out_path: pathlib.Path) -> pl.DataFrame:
+    """
+    Cleans and stems one chunk of the news file and writes it to a part file.
+    Runs in a worker process. The stem cache is only read here, never written.
+
+    Parameters
+    ----------
+    chunk : int
+        Chunk number.
+    offset : int
+        First row of the chunk.
+    length : int
+        Number of rows in the chunk.
+    out_path : pathlib.Path
+        Part file to write to.
+
+    Returns
+    -------
+    pl.DataFrame
+        Stems computed for tokens that were not yet in the stem cache.
+    """
+    stopword_set = set(stopwords.words("english"))
+    stem_cache = StemCache(STEM_CACHE_DIR)
+
+    # IDs are assigned before slicing, so that they do not depend on the chunk
+    df = documents.with_doc_id(pl.scan_parquet(FILE)).slice(offset, length).collect()
+    lf = preprocessing.preprocess_and_stem(df.lazy(), "article", stopword_set, stem_cache)
+    lf = lf.rename({"article": "text"})
+
+    # Writing to a temporary file first, so a killed worker never leaves a partial part behind
+    tmp_path = out_path.with_suffix(".tmp")
+    lf.sink_parquet(tmp_path)
+    tmp_path.replace(out_path)
+    return stem_cache.new_entries()
+
+
+def part_path(parts_dir: pathlib.Path, chunk: int) -> pathlib.Path:
+    return parts_dir / f"part_{chunk:05}.parquet"
+
+
+def load_manifest(parts_dir: pathlib.Path, n_rows: int, chunk_size: int) -> dict:
+    """
+    Loads the manifest of finished chunks.
+    Starts a new one if there is none or if it was written for a different input or chunk size.
+    """
+    config = {"file": FILE, "n_rows": n_rows, "chunk_size": chunk_size}
+    manifest_path = parts_dir / MANIFEST
+    if manifest_path.exists():
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if manifest["config"] == config:
+            # Only trusting chunks whose part file actually made it to disk
+            manifest["done"] = [i for i in manifest["done"] if part_path(parts_dir, i).exists()]
+            return manifest
+        print("Manifest was written for a different input. Starting over")
+        for part in parts_dir.glob("part_*.parquet"):
+            part.unlink()
+    return {"config": config, "done": []}
+
+
+def save_manifest(parts_dir: pathlib.Path, manifest: dict):
+    manifest_path = parts_dir / MANIFEST
+    tmp_path = manifest_path.with_suffix(".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=4)
+    tmp_path.replace(manifest_path)
+
+
 if __name__ == "__main__":
     main()
-
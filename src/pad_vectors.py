@@ -1,69 +1,93 @@
-import polars as pl
+import argparse
 import pathlib
-import sys
-
-
-NEWS_PATH = r"D:\Projeto NLP\output\stm_news_2025-06-14_14-11-59_topics_13"
-FED_PATH = r"D:\Projeto NLP\output\stm_fed_14_2025-06-13_10-32-17"
 
-INTERMEDIARY_NEWS = "news_extended.intermediary.parquet"
-INTERMEDIARY_FED = "fed_extended.intermediary.parquet"
+import polars as pl
 
-FINAL_NEWS = "news_padded.parquet"
-FINAL_FED = "fed_padded.parquet"
 
+# Default CLI options
+# Log probability given to the words missing from a model, i.e. a probability of practically zero
 LARGE_NEGATIVE = -10000
+SUFFIX = "_padded"
 
 
 def main():
-    news_path = pathlib.Path(NEWS_PATH)
-    fed_path = pathlib.Path(FED_PATH)
-
-    try:
-        news_df = pl.read_parquet(news_path / INTERMEDIARY_NEWS)
-    except FileNotFoundError:
-        news_df = pl.read_parquet(news_path / "topic_dist.parquet")
-
-    try:
-        fed_df = pl.read_parquet(fed_path / INTERMEDIARY_FED)
-    except FileNotFoundError:
-        fed_df = pl.read_parquet(fed_path / "topic_dist.parquet")
-
-    try:
-        print("Padding fed file...")
-        padded_fed_df = pad_dataframe(fed_df, news_df, fed_path / INTERMEDIARY_FED, large_negative_number=LARGE_NEGATIVE)
-        padded_fed_df = padded_fed_df.select(sorted(padded_fed_df.columns))
-        print("Done")
-    except KeyboardInterrupt:
-        sys.exit(f"Keyboard interrupt. Fed file saved to {str(fed_path / INTERMEDIARY_FED)}")
-
-    try:
-        print("Padding news file...")
-        padded_news_df = pad_dataframe(news_df, fed_df, news_path / INTERMEDIARY_NEWS, large_negative_number=LARGE_NEGATIVE)
-        padded_news_df = padded_news_df.select(sorted(padded_news_df.columns))
-        print("Done")
-    except KeyboardInterrupt:
-        padded_fed_df.write_parquet(fed_path / INTERMEDIARY_FED)
-        sys.exit(f"Keyboard interrupt. News file saved to {str(news_path / INTERMEDIARY_NEWS)}")
-
-    padded_fed_df.write_parquet(fed_path / FINAL_FED)
-    padded_news_df.write_parquet(news_path / FINAL_NEWS)
-
-
-def pad_dataframe(df1: pl.DataFrame, df2: pl.DataFrame, out_file_path: pathlib.Path, large_negative_number: int = -10000) -> pl.DataFrame:
-    df1_cols = set(df1.columns)
-    df2_cols = set(df2.columns)
-    df2_only_cols = df2_cols - df1_cols
-
-    try:
-        for col in df2_only_cols:
-            df1 = df1.with_columns(pl.lit(large_negative_number).alias(col))
-    except KeyboardInterrupt:
-        df1 = df1.select(sorted(df1.columns))
-        df1.write_parquet(out_file_path)
-        raise KeyboardInterrupt
-    return df1
+    parser = argparse.ArgumentParser(
+        description="Pad topic-word files (e.g. the `topic_dist.parquet` files of `run_stm.R`) to the union of their vocabularies")
+    parser.add_argument("paths", type=str, nargs="+",
+        help="Topic-word parquet files, one column per word")
+    parser.add_argument("-o", "--outputs", type=str, nargs="+", default=None,
+        help=f"Output files, one per input (default: next to each input, with the '{SUFFIX}' suffix)")
+    parser.add_argument("--fill_value", type=float, default=LARGE_NEGATIVE,
+        help=f"Value of the words missing from a file (default: {LARGE_NEGATIVE})")
+    args = parser.parse_args()
+
+    paths = [pathlib.Path(p) for p in args.paths]
+    if args.outputs is None:
+        out_paths = [padded_path(p) for p in paths]
+    elif len(args.outputs) != len(paths):
+        parser.error("--outputs takes one file per input")
+    else:
+        out_paths = [pathlib.Path(p) for p in args.outputs]
+    if len(set(out_paths)) != len(out_paths) or set(out_paths) & set(paths):
+        parser.error("Output files must be distinct from each other and from the inputs")
+
+    pad_files(paths, out_paths, fill_value=args.fill_value)
+
+
+def padded_path(path: pathlib.Path, suffix: str = SUFFIX) -> pathlib.Path:
+    return path.with_name(f"{path.stem}{suffix}{path.suffix}")
+
+
+def column_union(paths: list[pathlib.Path]) -> list[str]:
+    """
+    Returns the sorted union of the columns of parquet files. Only their schemas are read.
+    """
+    columns = set()
+    for path in paths:
+        columns.update(pl.scan_parquet(path).collect_schema().names())
+    return sorted(columns)
+
+
+def align(lf: pl.LazyFrame, columns: list[str], fill_value: float = LARGE_NEGATIVE) -> pl.LazyFrame:
+    """
+    Selects `columns` in order, filling the ones missing from `lf` with `fill_value`.
+    Every column is added in one projection, rather than one `with_columns` call each.
+
+    The filled columns take the type of the first floating point column of `lf`,
+    so that padded files of the same model keep one type throughout.
+    """
+    schema = lf.collect_schema()
+    dtype = next((t for t in schema.dtypes() if t.is_float()), pl.Float64)
+    return lf.select([
+        pl.col(c) if c in schema else pl.lit(fill_value, dtype=dtype).alias(c)
+        for c in columns
+    ])
+
+
+def pad_files(paths: list[pathlib.Path], out_paths: list[pathlib.Path], fill_value: float = LARGE_NEGATIVE):
+    """
+    Pads parquet files to the union of their columns, in sorted order, so that they can be compared column by column.
+    The union is read from the schemas, then each file is streamed once to its output.
+    Outputs are written to a temporary file first, so an interrupted run never leaves a partial output behind.
+
+    Parameters
+    ----------
+    paths : list[pathlib.Path]
+        Input files, any number of them.
+    out_paths : list[pathlib.Path]
+        Output file of each input, in order.
+    fill_value : float, optional
+        Value of the columns missing from a file. Default `-10000`.
+    """
+    columns = column_union(paths)
+    print(f"{len(columns)} columns in the union of {len(paths)} files")
+    for path, out_path in zip(paths, out_paths):
+        print(f"Padding '{path}'...")
+        tmp_path = out_path.with_suffix(".tmp")
+        align(pl.scan_parquet(path), columns, fill_value).sink_parquet(tmp_path)
+        tmp_path.replace(out_path)
+        print(f"Saved padded file to '{out_path}'")
+
 
 if __name__ == "__main__":
     main()
-
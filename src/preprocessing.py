@@ -3,10 +3,25 @@ import re
 import nltk
 from nltk.corpus import stopwords
 from dotenv import dotenv_values
+import argparse
 import pathlib
 
+import instrumentation
+from stemming import StemCache
+
+
+# Regex matching everything `preprocess` strips out
+NON_WORDS = r"[^a-zA-Z]"
+# Rows compared against `preprocess`/`stem` before running the vectorized pipeline
+PARITY_ROWS = 100
+
 
 def main():
+    parser = argparse.ArgumentParser(description="Clean and stem Fed communications")
+    parser.add_argument("--profile", action="store_true",
+        help="Profile every stage with cProfile and save the stats next to the output")
+    args = parser.parse_args()
+
     nltk.download("punkt_tab")
 
     config: dict = dotenv_values(".env") 
@@ -15,41 +30,30 @@ def main():
     processed_data = data_dir / "processed"
 
     communications_raw_path = processed_data / "communications_raw.parquet"
-    communications_clean_path = processed_data / "communications_clean.parquet"
     communications_stemmed_path = processed_data / "communications_stemmed.parquet"
+    timer = instrumentation.StageTimer(processed_data / "communications_profiles" if args.profile else None)
 
     # Converting to parquet
-    df = pl.read_csv(raw_data / "communications.csv")
-    df = df.rename({"Text": "text"})
-    df.write_parquet(communications_raw_path)
+    with timer.stage("to_parquet"):
+        df = pl.read_csv(raw_data / "communications.csv")
+        df = df.rename({"Text": "text"})
+        df.write_parquet(communications_raw_path)
 
-    # Removing numbers, stopwords
-    lf = pl.scan_parquet(processed_data / "communications_raw.parquet")
+    # Removing numbers, stopwords and stemming in a single lazy plan
+    lf = pl.scan_parquet(communications_raw_path)
     stop_words = set(stopwords.words("english"))
-    lf = lf.with_columns(
-            pl.col("text")
-            .map_elements(lambda s: preprocess(s, stop_words), return_dtype=pl.String)
-            .alias("clean_text")
-            )
-
-    lf = lf.select(pl.exclude("text")).rename({"clean_text": "text"})
-    print("Sinking cleaned parquet file...")
-    lf.sink_parquet(communications_clean_path)
-    print(f"Saved preprocessed data to '{str(communications_clean_path)}'")
-
-    # Stemming
-    lf = pl.scan_parquet(communications_clean_path)
-    stemmer = nltk.stem.SnowballStemmer("english")
-    lf = lf.with_columns(
-            pl.col("text")
-            .map_elements(lambda s: stem(s, stemmer), return_dtype=pl.String)
-            .alias("stemmed_text")
-            )
+    stem_cache = StemCache(processed_data)
 
-    lf = lf.select(pl.exclude("text")).rename({"stemmed_text": "text"})
+    with timer.stage("check_parity"):
+        check_parity(lf.head(PARITY_ROWS).collect()["text"], stop_words, stem_cache)
+    with timer.stage("vocabulary"):
+        lf = preprocess_and_stem(lf, "text", stop_words, stem_cache)
     print("Sinking stemmed parquet...")
-    lf.sink_parquet(communications_stemmed_path)
+    with timer.stage("sink"):
+        lf.sink_parquet(communications_stemmed_path)
+        stem_cache.save()
     print(f"Saved preprocessed data to '{str(communications_stemmed_path)}'")
+    timer.write_csv(processed_data / "communications_timings.csv")
 
 
 def preprocess(text: str, stop_words: set) -> str:
@@ -75,7 +79,7 @@ def preprocess(text: str, stop_words: set) -> str:
     return " ".join(filtered_words)
 
 
-def stem(text: str, stemmer) -> str:
+def stem(text: str, stemmer, tokenize=nltk.word_tokenize) -> str:
     """
     Stems the string.
 
@@ -83,17 +87,141 @@ def stem(text: str, stemmer) -> str:
     ----------
     text : str
         String to be stemmed. Expected to be preprocessed text from `communications_preprocessed.csv`.
+    tokenize : Callable[[str], list[str]], optional
+        Tokenizer. Default `nltk.word_tokenize`, which needs nltk's Punkt data.
 
     Returns
     -------
     str
         String containing stemmed words.
     """
-    tokens = nltk.word_tokenize(text)
+    tokens = tokenize(text)
     return " ".join([stemmer.stem(t) for t in tokens])
 
 
-if __name__ == "__main__":
-    main()
+def clean_expr(column: str, stop_words: set) -> pl.Expr:
+    """
+    Native Polars equivalent of `preprocess`.
+    Removes non-words, lowercases, splits on whitespace and drops stopwords.
+
+    Parameters
+    ----------
+    column : str
+        Name of the column holding raw text.
+    stop_words : set
+        Set of English stopwords from nltk.
+
+    Returns
+    -------
+    pl.Expr
+        Expression evaluating to a list of clean tokens per row.
+    """
+    return (
+        pl.col(column)
+        .str.replace_all(NON_WORDS, " ")
+        .str.to_lowercase()
+        .str.split(" ")
+        .list.eval(
+            pl.element().filter(
+                (pl.element() != "") & ~pl.element().is_in(list(stop_words))
+            )
+        )
+    )
+
+
+def stem_expr(tokens: pl.Expr, table: pl.DataFrame) -> pl.Expr:
+    """
+    Native Polars equivalent of `stem`.
+    Looks each token up in the stem table and joins the result back into a string.
+
+    Parameters
+    ----------
+    tokens : pl.Expr
+        Expression evaluating to a list of tokens, e.g. `clean_expr`.
+    table : pl.DataFrame
+        Token to stem table returned by `stemming.StemCache.lookup`.
+
+    Returns
+    -------
+    pl.Expr
+        Expression evaluating to the stemmed text.
+    """
+    return (
+        tokens
+        # Imploding turns the table columns into single list literals.
+        # A bare Series would be aligned element by element inside `list.eval`.
+        .list.eval(
+            pl.element().replace(
+                pl.lit(table["token"].implode()),
+                pl.lit(table["stem"].implode()),
+            )
+        )
+        .list.join(" ")
+    )
+
+
+def preprocess_and_stem(lf: pl.LazyFrame, column: str, stop_words: set, stem_cache: StemCache) -> pl.LazyFrame:
+    """
+    Cleans and stems a text column without leaving the Polars engine.
+    The vocabulary is collected in one streaming pass and only tokens missing from
+    the stem cache are stemmed, so that the returned plan can be sunk straight to a single file.
 
+    Parameters
+    ----------
+    lf : pl.LazyFrame
+        Frame holding the raw text.
+    column : str
+        Name of the text column. It is replaced by the stemmed text.
+    stop_words : set
+        Set of English stopwords from nltk.
+    stem_cache : StemCache
+        Persisted token to stem table. New tokens are added to it, but it is not saved.
 
+    Returns
+    -------
+    pl.LazyFrame
+        Lazy plan with `column` replaced by its stemmed text.
+    """
+    tokens = clean_expr(column, stop_words)
+    vocab = (
+        lf.select(tokens.explode().drop_nulls().unique())
+        .collect(engine="streaming")
+        .get_column(column)
+    )
+    table = stem_cache.lookup(vocab)
+    return lf.with_columns(stem_expr(tokens, table).alias(column))
+
+
+def check_parity(texts: pl.Series, stop_words: set, stem_cache: StemCache):
+    """
+    Checks that `preprocess_and_stem` gives the same output as `preprocess` followed by `stem`.
+
+    Parameters
+    ----------
+    texts : pl.Series
+        Sample of raw texts.
+    stop_words : set
+        Set of English stopwords from nltk.
+    stem_cache : StemCache
+        Persisted token to stem table. Its stemmer and tokenizer are used for the reference output.
+        Preprocessed text has no sentence punctuation, so the tokenizer gives the same tokens as
+        `nltk.word_tokenize` without needing the Punkt data.
+
+    Raises
+    ------
+    ValueError
+        If any of the texts is processed differently by both paths.
+    """
+    expected = [
+        None if t is None else stem(preprocess(t, stop_words), stem_cache.stemmer, stem_cache.tokenizer.tokenize)
+        for t in texts
+    ]
+    lf = pl.LazyFrame({"text": texts})
+    result = preprocess_and_stem(lf, "text", stop_words, stem_cache).collect()["text"]
+    mismatches = [i for i, (a, b) in enumerate(zip(expected, result)) if a != b]
+    if mismatches:
+        raise ValueError(f"Vectorized pipeline differs from `preprocess`/`stem` on rows {mismatches}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+import argparse
+import itertools
+import pathlib
+from typing import NamedTuple
+
+import numpy as np
+import polars as pl
+from scipy.special import xlogy
+
+
+METRICS = ["cosine", "hellinger", "jensen_shannon"]
+# Maximum number of entries of the temporaries of one block, which caps the peak memory.
+# Jensen-Shannon needs a (topics x topics x words) temporary, the other metrics (topics x words).
+BLOCK_ELEMENTS = 1 << 22
+# Default CLI options
+TOP_K = 3
+OUTPUT = "proximity.csv"
+
+
+class TopicStats(NamedTuple):
+    """
+    Row statistics of a topic-word file over its whole vocabulary.
+
+    Attributes
+    ----------
+    columns : list[str]
+        Vocabulary, in file order.
+    mass : np.ndarray
+        Total probability of each topic, shape (K,). 1 for a normalized file.
+    norm : np.ndarray
+        Euclidean norm of each normalized topic, shape (K,).
+    """
+    columns: list[str]
+    mass: np.ndarray
+    norm: np.ndarray
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Find the nearest topics between two groups of topic-word files, e.g. Fed and news `topic_dist.parquet` files")
+    parser.add_argument("--left", type=str, nargs="+", required=True,
+        help="Topic-word parquet files of the first group, e.g. Fed models")
+    parser.add_argument("--right", type=str, nargs="+", required=True,
+        help="Topic-word parquet files of the second group, e.g. news models")
+    parser.add_argument("--metrics", type=str, nargs="+", choices=METRICS, default=METRICS,
+        help="Similarity metrics (default: every metric)")
+    parser.add_argument("-k", "--top_k", type=int, default=TOP_K,
+        help=f"Number of nearest topics listed per topic, in each direction (default: {TOP_K})")
+    parser.add_argument("--block_elements", type=int, default=BLOCK_ELEMENTS,
+        help=f"Maximum number of entries of the temporaries of one block (default: {BLOCK_ELEMENTS})")
+    parser.add_argument("-o", "--output", type=str, default=OUTPUT,
+        help=f"Output CSV file (default: {OUTPUT})")
+    args = parser.parse_args()
+
+    df = compare(
+        [pathlib.Path(p) for p in args.left], [pathlib.Path(p) for p in args.right],
+        metrics=args.metrics, top_k=args.top_k, block_elements=args.block_elements)
+    df.write_csv(args.output)
+    print(f"Nearest topics saved to '{args.output}'")
+
+
+def compare(
+        left: list[pathlib.Path], right: list[pathlib.Path], metrics: list[str] = METRICS,
+        top_k: int = TOP_K, block_elements: int = BLOCK_ELEMENTS) -> pl.DataFrame:
+    """
+    Compares every file of `left` with every file of `right`, e.g. every Fed model of a sweep with every news model.
+    The statistics of each file are computed once, however many pairs it is part of.
+
+    Returns
+    -------
+    pl.DataFrame
+        The tables of `nearest_topics` of every pair, with a `left` and a `right` column holding the paths.
+    """
+    stats = {path: topic_stats(path, block_elements) for path in {*left, *right}}
+    tables = []
+    for left_path, right_path in itertools.product(left, right):
+        print(f"Comparing '{left_path}' with '{right_path}'...")
+        similarities = similarity(left_path, right_path, metrics, block_elements, stats[left_path], stats[right_path])
+        tables.append(
+            nearest_topics(similarities, top_k)
+            .select(pl.lit(str(left_path)).alias("left"), pl.lit(str(right_path)).alias("right"), pl.all())
+        )
+    return pl.concat(tables)
+
+
+def topic_stats(path: pathlib.Path, block_elements: int = BLOCK_ELEMENTS) -> TopicStats:
+    """
+    Reads the vocabulary of a topic-word file and the mass and norm of its topics, a block of columns at a time.
+    """
+    columns = pl.scan_parquet(path).collect_schema().names()
+    mass, squares = 0.0, 0.0
+    for block in _column_blocks(columns, _block_words(block_elements, _num_topics(path))):
+        probs = read_probabilities(path, block)
+        mass = mass + probs.sum(axis=1)
+        squares = squares + (probs ** 2).sum(axis=1)
+    return TopicStats(columns, np.asarray(mass, dtype=np.float64), np.sqrt(squares) / mass)
+
+
+def read_probabilities(path: pathlib.Path, columns: list[str]) -> np.ndarray:
+    """
+    Reads columns of a topic-word file as probabilities, shape (K, len(columns)).
+    Files hold log probabilities, like the `topic_dist.parquet` files of `run_stm.R` and the exports of
+    `generate_topics.py`. Sentinels of padded files, e.g. -10000, become probabilities of zero.
+    """
+    return np.exp(pl.read_parquet(path, columns=columns).to_numpy().astype(np.float64, copy=False))
+
+
+def similarity(
+        left_path: pathlib.Path, right_path: pathlib.Path, metrics: list[str] = METRICS,
+        block_elements: int = BLOCK_ELEMENTS, left_stats: TopicStats | None = None,
+        right_stats: TopicStats | None = None) -> dict[str, np.ndarray]:
+    """
+    Computes the similarity of every topic of one file to every topic of another.
+
+    Only the words both vocabularies share are read, a block of columns at a time. A word missing from a
+    file has a probability of zero there, so its terms are known without padding: it adds nothing to the
+    dot products of cosine and Hellinger, and a fixed amount per unit of mass to Jensen-Shannon, which is
+    accounted for with the mass of each topic outside the shared vocabulary. Topics are normalized to sum to 1.
+
+    Parameters
+    ----------
+    left_path, right_path : pathlib.Path
+        Topic-word parquet files, one row per topic and one column of log probabilities per word.
+    metrics : list[str], optional
+        Any of `"cosine"`, `"hellinger"` and `"jensen_shannon"`. Default every metric.
+    block_elements : int, optional
+        Maximum number of entries of the temporaries of one block. Default `2 ** 22`.
+    left_stats, right_stats : TopicStats, optional
+        Statistics of the files, computed with `topic_stats` if not given.
+
+    Returns
+    -------
+    dict[str, np.ndarray]
+        Similarity matrix of each metric, shape (K_left, K_right), where 1 means identical topics:
+        - `cosine`: cosine similarity of the probability vectors.
+        - `hellinger`: 1 minus the Hellinger distance.
+        - `jensen_shannon`: 1 minus the Jensen-Shannon divergence in bits, between 0 and 1.
+    """
+    unknown = set(metrics) - set(METRICS)
+    if unknown:
+        raise ValueError(f"Unknown metrics {sorted(unknown)}, expected some of {METRICS}")
+    left_stats = left_stats or topic_stats(left_path, block_elements)
+    right_stats = right_stats or topic_stats(right_path, block_elements)
+    right_columns = set(right_stats.columns)
+    shared = [c for c in left_stats.columns if c in right_columns]
+
+    k_left, k_right = len(left_stats.mass), len(right_stats.mass)
+    pairwise = k_left * k_right if "jensen_shannon" in metrics else k_left + k_right
+    dot = np.zeros((k_left, k_right))
+    bhattacharyya = np.zeros((k_left, k_right))
+    # Jensen-Shannon sums over shared words, in nats: p log p + q log q - (p + q) log((p + q) / 2)
+    js_shared = np.zeros((k_left, k_right))
+    left_shared_mass, right_shared_mass = np.zeros(k_left), np.zeros(k_right)
+    for block in _column_blocks(shared, _block_words(block_elements, pairwise)):
+        p = read_probabilities(left_path, block) / left_stats.mass[:, np.newaxis]
+        q = read_probabilities(right_path, block) / right_stats.mass[:, np.newaxis]
+        left_shared_mass += p.sum(axis=1)
+        right_shared_mass += q.sum(axis=1)
+        if "cosine" in metrics:
+            dot += p @ q.T
+        if "hellinger" in metrics:
+            bhattacharyya += np.sqrt(p) @ np.sqrt(q).T
+        if "jensen_shannon" in metrics:
+            m = p[:, np.newaxis, :] + q[np.newaxis, :, :]
+            js_shared += xlogy(p, p).sum(axis=1)[:, np.newaxis] + xlogy(q, q).sum(axis=1)[np.newaxis, :]
+            js_shared -= xlogy(m, m / 2).sum(axis=2)
+
+    results = {}
+    if "cosine" in metrics:
+        results["cosine"] = dot / np.outer(left_stats.norm, right_stats.norm)
+    if "hellinger" in metrics:
+        results["hellinger"] = 1 - np.sqrt(np.clip(1 - bhattacharyya, 0, 1))
+    if "jensen_shannon" in metrics:
+        # Each unit of mass outside the shared words adds (1/2) log 2
+        outside = (1 - left_shared_mass)[:, np.newaxis] + (1 - right_shared_mass)[np.newaxis, :]
+        divergence = (js_shared / 2 + outside * np.log(2) / 2) / np.log(2)
+        results["jensen_shannon"] = 1 - np.clip(divergence, 0, 1)
+    return results
+
+
+def nearest_topics(similarities: dict[str, np.ndarray], top_k: int = TOP_K) -> pl.DataFrame:
+    """
+    Lists the `top_k` most similar topics of the other file for each topic, in both directions.
+
+    Returns
+    -------
+    pl.DataFrame
+        Table with a `metric`, a `direction` (`"left"` for the neighbours of left topics among right topics,
+        `"right"` for the reverse), a `topic`, a `rank` and a `neighbour` (all starting at 1) and a `similarity` column.
+    """
+    tables = []
+    for metric, matrix in similarities.items():
+        for direction, sims in [("left", matrix), ("right", matrix.T)]:
+            k = min(top_k, sims.shape[1])
+            order = np.argsort(-sims, axis=1, kind="stable")[:, :k]
+            tables.append(pl.DataFrame({
+                "metric": metric,
+                "direction": direction,
+                "topic": np.repeat(np.arange(1, sims.shape[0] + 1), k),
+                "rank": np.tile(np.arange(1, k + 1), sims.shape[0]),
+                "neighbour": (order + 1).ravel(),
+                "similarity": np.take_along_axis(sims, order, axis=1).ravel(),
+            }))
+    return pl.concat(tables)
+
+
+def _num_topics(path: pathlib.Path) -> int:
+    return pl.scan_parquet(path).select(pl.len()).collect().item()
+
+
+def _block_words(block_elements: int, rows: int) -> int:
+    """
+    Returns the number of words per block so that temporaries of `rows` rows stay within `block_elements`.
+    """
+    return max(1, block_elements // max(rows, 1))
+
+
+def _column_blocks(columns: list[str], size: int) -> list[list[str]]:
+    return [columns[i:i + size] for i in range(0, len(columns), size)]
+
+
+if __name__ == "__main__":
+    main()
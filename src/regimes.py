@@ -0,0 +1,110 @@
+from datetime import date
+from typing import NamedTuple, TypeVar
+
+import polars as pl
+
+
+# Which end of the intervals belongs to the role. See `annotate`.
+CLOSED = ["left", "right"]
+
+Frame = TypeVar("Frame", pl.DataFrame, pl.LazyFrame)
+
+
+class Role(NamedTuple):
+    """
+    A person holding an office, e.g. a president, from `start` to `end`.
+    Consecutive roles share a boundary: the `end` of one is the `start` of the next.
+    """
+    name: str
+    party: str | None
+    start: date
+    end: date
+
+
+def sort_roles(roles: list[Role]) -> list[Role]:
+    """
+    Returns the roles sorted by start date, checking that they do not overlap. Gaps are allowed.
+
+    Raises
+    ------
+    ValueError
+        If a role ends before it starts, or ends after the start of the next role.
+    """
+    roles = sorted(roles, key=lambda r: r.start)
+    for r in roles:
+        if r.end < r.start:
+            raise ValueError(f"Role of {r.name} ends on {r.end}, before it starts on {r.start}")
+    for prev, r in zip(roles, roles[1:]):
+        if prev.end > r.start:
+            raise ValueError(f"Role of {prev.name} ends on {prev.end}, after the role of {r.name} starts on {r.start}")
+    return roles
+
+
+def role_index(roles: list[Role], day: pl.Expr, closed: str = "left") -> pl.Expr:
+    """
+    Returns the position in `roles` of the role held on each day, or null outside of every role.
+    Found by binary search over the boundaries, without sorting the days.
+
+    Parameters
+    ----------
+    roles : list[Role]
+        Roles as returned by `sort_roles`.
+    day : pl.Expr
+        Dates to look up.
+    closed : str, optional
+        Which role a day shared by two roles belongs to: `"left"` for the one starting on it, `"right"`
+        for the one ending on it. Roles are held from their start to their end, both included,
+        otherwise. Default `"left"`.
+    """
+    starts = pl.lit(pl.Series([r.start for r in roles], dtype=pl.Date))
+    ends = pl.lit(pl.Series([r.end for r in roles], dtype=pl.Date))
+    if closed == "left":
+        # Last role starting on or before the day
+        index = starts.search_sorted(day, side="right").cast(pl.Int64) - 1
+        valid = (index >= 0) & (day <= ends.gather(index.clip(0)))
+    elif closed == "right":
+        # First role ending on or after the day
+        index = ends.search_sorted(day, side="left").cast(pl.Int64)
+        valid = (index < len(roles)) & (day >= starts.gather(index.clip(upper_bound=len(roles) - 1)))
+    else:
+        raise ValueError(f"Unknown closed '{closed}', expected one of {CLOSED}")
+    return pl.when(valid).then(index)
+
+
+def annotate(
+        frame: Frame, roles: list[Role], columns: dict[str, str], date_column: str = "date",
+        closed: str = "left") -> Frame:
+    """
+    Labels each row of a table with the role held on its date, e.g. the president on the day a news article was published.
+
+    The roles are sorted once and each date is looked up by binary search, so tables of any size are labelled
+    in one vectorized pass, lazily for a `pl.LazyFrame`, and without a table of every day.
+
+    Parameters
+    ----------
+    frame : pl.DataFrame or pl.LazyFrame
+        Table to label.
+    roles : list[Role]
+        Roles, in any order. They must not overlap.
+    columns : dict[str, str]
+        Output column of each `Role` field, e.g. `{"name": "president", "party": "party"}`.
+    date_column : str, optional
+        Column with the dates to label. Datetimes are labelled by their date. Default `"date"`.
+    closed : str, optional
+        Which role a boundary day belongs to, when one role ends on the day the next starts.
+        With `"left"`, the incoming role: a president is labelled from inauguration day on.
+        With `"right"`, the outgoing role, which is what checking `start <= day <= end` and taking
+        the first match gives for roles listed in order.
+        Default `"left"`.
+
+    Returns
+    -------
+    pl.DataFrame or pl.LazyFrame
+        `frame` with the output columns added. They are null for dates outside of every role.
+    """
+    roles = sort_roles(roles)
+    index = role_index(roles, pl.col(date_column).cast(pl.Date), closed)
+    return frame.with_columns(
+        pl.lit(pl.Series([getattr(r, field) for r in roles], dtype=pl.String)).gather(index).alias(name)
+        for field, name in columns.items()
+    )
@@ -0,0 +1,88 @@
+import numpy as np
+import polars as pl
+
+
+# Default CLI options of the adaptive search
+SEARCH_STEP = 5
+SEARCH_FRACTION = 0.2
+SEARCH_KEEP = 2
+# Training parameters of the cheap models of the coarse grid, passed to `LdaMulticore`
+COARSE_LDA_PARAMS = {"passes": 1, "iterations": 10, "chunksize": 2000}
+
+
+def coarse_grid(min_topics: int, max_topics: int, step: int) -> list[int]:
+    """
+    Returns every `step`-th number of topics of the range, always including both ends.
+    """
+    grid = list(range(min_topics, max_topics + 1, step))
+    if grid[-1] != max_topics:
+        grid.append(max_topics)
+    return grid
+
+
+def neighbourhood(centres: list[int], step: int, min_topics: int, max_topics: int) -> list[int]:
+    """
+    Returns the numbers of topics closer than `step` to any of the centres, within the range.
+    Those are the values the coarse grid skipped around each centre, along with the centres themselves.
+    """
+    values = {
+        n for c in centres
+        for n in range(max(min_topics, c - step + 1), min(max_topics, c + step - 1) + 1)
+    }
+    return sorted(values)
+
+
+def frontier_order(df: pl.DataFrame) -> list[int]:
+    """
+    Orders models from best to worst on the coherence/exclusivity frontier.
+
+    Models are first ordered by Pareto layer: the first layer holds the models no other model beats
+    on both coherence and exclusivity, the second layer those only beaten by the first, and so on.
+    Within a layer, models are ordered by the sum of their coherence and exclusivity ranks,
+    so that neither metric dominates because of its scale.
+
+    Parameters
+    ----------
+    df : pl.DataFrame
+        Metrics with `n_topics`, `coherence` and `exclusivity` columns. Higher is better for both,
+        which holds for every coherence measure, u_mass included.
+
+    Returns
+    -------
+    list[int]
+        Numbers of topics, best first.
+    """
+    points = df.select("coherence", "exclusivity").to_numpy()
+    layers = pareto_layers(points)
+    rank_sum = (
+        df["coherence"].rank("average", descending=True).to_numpy()
+        + df["exclusivity"].rank("average", descending=True).to_numpy()
+    )
+    order = np.lexsort((df["n_topics"].to_numpy(), rank_sum, layers))
+    return df["n_topics"].to_numpy()[order].tolist()
+
+
+def pareto_layers(points: np.ndarray) -> np.ndarray:
+    """
+    Returns the Pareto layer of each point. Objectives are maximized; layer 0 is the non-dominated front.
+
+    Parameters
+    ----------
+    points : np.ndarray
+        Matrix with one row per point and one column per objective.
+    """
+    # A point dominates another if it is at least as good on every objective and better on one
+    at_least = (points[:, None, :] >= points[None, :, :]).all(axis=-1)
+    better = (points[:, None, :] > points[None, :, :]).any(axis=-1)
+    dominates = at_least & better
+
+    layers = np.full(len(points), -1)
+    layer = 0
+    remaining = np.ones(len(points), dtype=bool)
+    while remaining.any():
+        dominated = dominates[remaining][:, remaining].any(axis=0)
+        current = np.flatnonzero(remaining)[~dominated]
+        layers[current] = layer
+        remaining[current] = False
+        layer += 1
+    return layers
@@ -0,0 +1,120 @@
+import polars as pl
+import nltk
+from nltk.tokenize import NLTKWordTokenizer
+import pathlib
+
+
+SCHEMA = {"token": pl.String, "stem": pl.String}
+
+
+class StemCache:
+    """
+    Token to stem table persisted as parquet.
+    Each unique token is stemmed once and reused in later runs,
+    so only tokens never seen before go through the stemmer.
+
+    Parameters
+    ----------
+    directory : pathlib.Path
+        Directory where the table is stored.
+    language : str, optional
+        Language of the Snowball stemmer. Default `"english"`.
+        Part of the file name, so tables for different stemmers never mix.
+
+    Notes
+    -----
+    Tokens are expected to be `preprocessing.preprocess` output, i.e. lowercase letters only.
+    They are run through the Treebank word tokenizer without Punkt sentence splitting,
+    which gives the same result as `nltk.word_tokenize` on such tokens.
+    The tokenizer still splits a few words (e.g. "cannot" into "can not"),
+    so a stem may hold more than one word.
+    """
+    def __init__(self, directory: pathlib.Path, language: str = "english"):
+        self.path = pathlib.Path(directory) / f"stem_cache_{language}.parquet"
+        self.stemmer = nltk.stem.SnowballStemmer(language)
+        self.tokenizer = NLTKWordTokenizer()
+        if self.path.exists():
+            self.table = pl.read_parquet(self.path)
+        else:
+            self.table = pl.DataFrame(schema=SCHEMA)
+        self.saved_rows = len(self.table)
+
+    def stem(self, token: str) -> str:
+        """
+        Stems a single token, bypassing the table.
+        """
+        return " ".join(self.stemmer.stem(t) for t in self.tokenizer.tokenize(token))
+
+    def lookup(self, tokens: pl.Series) -> pl.DataFrame:
+        """
+        Returns the stems for the given tokens, stemming only those not yet in the table.
+
+        Parameters
+        ----------
+        tokens : pl.Series
+            Tokens to be stemmed. May contain duplicates.
+
+        Returns
+        -------
+        pl.DataFrame
+            Table with a `token` and a `stem` column, one row per unique token.
+        """
+        tokens = tokens.drop_nulls().unique().rename("token")
+        new_tokens = tokens.filter(~tokens.is_in(self.table["token"].implode()))
+        if len(new_tokens) > 0:
+            new_rows = pl.DataFrame(
+                {"token": new_tokens, "stem": [self.stem(t) for t in new_tokens]},
+                schema=SCHEMA,
+            )
+            self.table = pl.concat([self.table, new_rows])
+        return self.table.filter(pl.col("token").is_in(tokens.implode()))
+
+    def stem_texts(self, texts: list[str]) -> list[str]:
+        """
+        Stems whitespace-tokenized texts such as `preprocessing.preprocess` output.
+
+        Parameters
+        ----------
+        texts : list[str]
+            Texts to be stemmed.
+
+        Returns
+        -------
+        list[str]
+            Stemmed texts.
+        """
+        docs = [t.split() for t in texts]
+        vocab = pl.Series([w for doc in docs for w in doc], dtype=pl.String)
+        table = self.lookup(vocab)
+        stems = dict(zip(table["token"], table["stem"]))
+        return [" ".join(stems[w] for w in doc) for doc in docs]
+
+    def new_entries(self) -> pl.DataFrame:
+        """
+        Returns the rows stemmed since the table was loaded or last saved.
+        """
+        return self.table.slice(self.saved_rows)
+
+    def merge(self, entries: pl.DataFrame):
+        """
+        Adds rows stemmed elsewhere, e.g. by another process, to the table.
+
+        Parameters
+        ----------
+        entries : pl.DataFrame
+            Table with a `token` and a `stem` column, as returned by `new_entries`.
+        """
+        entries = entries.unique("token").filter(~pl.col("token").is_in(self.table["token"]))
+        self.table = pl.concat([self.table, entries.select(SCHEMA.keys())])
+
+    def save(self):
+        """
+        Writes the table to disk if new tokens were stemmed.
+        """
+        if self.saved_rows == len(self.table):
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        self.table.write_parquet(tmp_path)
+        tmp_path.replace(self.path)
+        self.saved_rows = len(self.table)
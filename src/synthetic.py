@@ -0,0 +1,109 @@
+import numpy as np
+import polars as pl
+
+
+# Default settings of the generated corpus
+DOC_LENGTH = 100
+VOCAB_SIZE = 50_000
+ZIPF_EXPONENT = 1.1
+SEED = 0
+# Suffixes appended to some words, so that stemming has inflections to merge
+SUFFIXES = ["", "", "", "s", "ed", "ing", "ly", "ation"]
+# Surface forms of each word and how often they occur: as is, capitalized,
+# followed by a comma and ending a sentence
+FORMS = [("{}", 0.8), ("{}", 0.08), ("{},", 0.07), ("{}.", 0.05)]
+CONSONANTS = list("bcdfghjklmnprstvwz")
+VOWELS = list("aeiou")
+
+
+def vocabulary(size: int, exclude: set[str] | None = None, seed: int = SEED) -> list[str]:
+    """
+    Returns distinct pronounceable pseudo-words made of consonant-vowel syllables, some with an English suffix.
+
+    Parameters
+    ----------
+    size : int
+        Number of words.
+    exclude : set[str], optional
+        Words never returned, e.g. stopwords.
+    seed : int, optional
+        Seed of the random syllables and suffixes. Default `0`.
+    """
+    rng = np.random.default_rng(seed)
+    syllables = np.array([c + v for c in CONSONANTS for v in VOWELS], dtype=object)
+    words = []
+    seen = set(exclude or ())
+    while len(words) < size:
+        n = size - len(words)
+        n_syllables = rng.integers(1, 4, size=n)
+        picks = rng.integers(0, len(syllables), size=(n, 3))
+        suffixes = rng.integers(0, len(SUFFIXES), size=n)
+        for k, row, s in zip(n_syllables, picks, suffixes):
+            word = "".join(syllables[row[:k]]) + SUFFIXES[s]
+            if word not in seen:
+                seen.add(word)
+                words.append(word)
+    return words
+
+
+def generate_texts(
+        n_docs: int, doc_length: int = DOC_LENGTH, vocab_size: int = VOCAB_SIZE,
+        zipf_exponent: float = ZIPF_EXPONENT, stop_words: list[str] | None = None,
+        seed: int = SEED) -> pl.DataFrame:
+    """
+    Generates a random raw text corpus, the same for a given seed.
+
+    Word frequencies follow Zipf's law over a finite vocabulary, like in natural language.
+    Document lengths are Poisson distributed. Some words are capitalized or followed by punctuation,
+    so that the texts go through every step of `preprocessing.preprocess`.
+    Everything is drawn at once in NumPy and joined in polars, so millions of documents take seconds.
+
+    Parameters
+    ----------
+    n_docs : int
+        Number of documents.
+    doc_length : int, optional
+        Average number of words per document. Default `100`.
+    vocab_size : int, optional
+        Number of distinct words, stopwords included. Default `50_000`.
+    zipf_exponent : float, optional
+        Exponent of Zipf's law. The k-th most frequent word occurs with probability proportional to `k ** -zipf_exponent`.
+        Default `1.1`.
+    stop_words : list[str], optional
+        Stopwords, placed at the top of the frequency ranking as they are in real text.
+    seed : int, optional
+        Random seed. Default `0`.
+
+    Returns
+    -------
+    pl.DataFrame
+        Table with a `text` column.
+    """
+    stop_words = sorted(stop_words or [])
+    words = stop_words + vocabulary(vocab_size - len(stop_words), exclude=set(stop_words), seed=seed)
+    surface_forms = [
+        (fmt.format(w.capitalize() if i == 1 else w))
+        for w in words for i, (fmt, _) in enumerate(FORMS)
+    ]
+
+    rng = np.random.default_rng(seed)
+    lengths = rng.poisson(doc_length, size=n_docs)
+    n_tokens = int(lengths.sum())
+
+    ranks = np.arange(1, len(words) + 1, dtype=np.float64)
+    word_probs = ranks ** -zipf_exponent
+    word_probs /= word_probs.sum()
+    # The ranking is shuffled once, past the stopwords, so that frequency does not follow word length
+    order = np.concatenate([np.arange(len(stop_words)), len(stop_words) + rng.permutation(len(words) - len(stop_words))])
+    word_ids = order[rng.choice(len(words), size=n_tokens, p=word_probs)]
+    form_ids = rng.choice(len(FORMS), size=n_tokens, p=[p for _, p in FORMS])
+
+    tokens = pl.Series("text", word_ids * len(FORMS) + form_ids, dtype=pl.UInt32).cast(pl.Enum(surface_forms))
+    return (
+        pl.DataFrame({"doc": np.repeat(np.arange(n_docs), lengths), "text": tokens})
+        .group_by("doc", maintain_order=True)
+        .agg(pl.col("text").cast(pl.String).str.join(" "))
+        # Empty documents have no tokens to group, so they are added back
+        .join(pl.DataFrame({"doc": np.arange(n_docs)}), on="doc", how="right")
+        .select(pl.col("text").fill_null(""))
+    )
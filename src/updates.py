@@ -0,0 +1,82 @@
+from collections.abc import Iterable
+
+import numpy as np
+from gensim.corpora.dictionary import Dictionary
+from gensim.models.ldamulticore import LdaMulticore
+
+
+# Default CLI options for dictionary extension
+MIN_NEW_DF = 5
+MAX_NEW_TERMS = 10_000
+
+
+def extend_dictionary(gensim_dict: Dictionary, texts: Iterable[list[str]], min_df: int = MIN_NEW_DF, max_new_terms: int = MAX_NEW_TERMS) -> int:
+    """
+    Adds the terms of new documents to a dictionary, in place.
+    Existing terms keep their ids. Only new terms that occur in at least `min_df` of the new documents
+    are added, at most `max_new_terms` of them, most frequent first.
+    Document frequencies of existing terms are updated with the new documents.
+
+    Parameters
+    ----------
+    gensim_dict : Dictionary
+        Dictionary the models were trained with.
+    texts : Iterable[list[str]]
+        New tokenized documents. Iterated over once.
+    min_df : int, optional
+        Minimum number of new documents a new term must occur in. Default `5`.
+    max_new_terms : int, optional
+        Maximum number of terms added. Default `10_000`.
+
+    Returns
+    -------
+    int
+        Number of terms added.
+    """
+    new_dict = Dictionary(texts)
+    candidates = [
+        (new_dict.dfs[i], token) for token, i in new_dict.token2id.items()
+        if token not in gensim_dict.token2id and new_dict.dfs[i] >= min_df
+    ]
+    candidates.sort(key=lambda c: (-c[0], c[1]))
+    added = {token for _, token in candidates[:max_new_terms]}
+
+    keep_ids = [
+        i for token, i in new_dict.token2id.items()
+        if token in gensim_dict.token2id or token in added
+    ]
+    new_dict.filter_tokens(good_ids=keep_ids)
+    gensim_dict.merge_with(new_dict)
+    return len(added)
+
+
+def extend_model_vocabulary(lda: LdaMulticore, gensim_dict: Dictionary):
+    """
+    Grows a trained LDA model to the size of an extended dictionary, in place.
+    New terms start with no topic statistics, so their weight in each topic is only the prior `eta`
+    until the model is updated with documents that contain them.
+
+    Parameters
+    ----------
+    lda : LdaMulticore
+        Trained model.
+    gensim_dict : Dictionary
+        Extended dictionary. Ids of the terms the model was trained with must be unchanged.
+    """
+    extra = len(gensim_dict) - lda.num_terms
+    if extra < 0:
+        raise ValueError("Dictionary is smaller than the model vocabulary")
+    if extra > 0:
+        eta = lda.eta
+        # A symmetric or per-term prior is a vector, a per-topic prior a matrix. Either way, new terms
+        # get the prior of the last term, which is the same as any other for symmetric priors.
+        eta = np.concatenate([eta, np.repeat(eta[..., -1:], extra, axis=-1)], axis=-1)
+        lda.eta = eta
+        lda.state.eta = eta
+        lda.state.sstats = np.hstack([
+            lda.state.sstats,
+            np.zeros((lda.num_topics, extra), dtype=lda.state.sstats.dtype),
+        ])
+        lda.num_terms = len(gensim_dict)
+    lda.id2word = gensim_dict
+    lda.sync_state()
@@ -0,0 +1,220 @@
+import argparse
+import json
+import pathlib
+
+import polars as pl
+from dotenv import dotenv_values
+from gensim.corpora.dictionary import Dictionary
+
+# Local imports
+import corpora
+import generate_topics
+import instrumentation
+
+
+CONFIG = dotenv_values(".env")
+# Column of stemmed text of each dataset stored in a file. `newsgroups` is fetched and stemmed when loaded,
+# so it has no file to scan.
+TEXT_COLUMNS = {"fed": "stemmed_text", "news": "text", "news_full": "text"}
+DATASETS = list(TEXT_COLUMNS)
+# Directory of the cached statistics, relative to the corpus cache
+STATS_DIR = "vocabulary"
+STATS_FILE = "stats.parquet"
+SETTINGS_FILE = "settings.json"
+# Directory of the pruned dictionaries, relative to `DATA_DIR`
+OUTPUT_DIR = "processed/vocabulary"
+# Default CLI options, the same as gensim's `filter_extremes`
+MIN_DF = 5
+MAX_DF = 0.5
+TOP_N = 100_000
+# Number of documents counted at once
+BATCH_SIZE = 100_000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Collect the vocabulary statistics of a dataset and prune its dictionary")
+    parser.add_argument("--dataset", type=str, choices=DATASETS, default="news",
+        help=f"Dataset to collect statistics of (choices: {DATASETS}, default: news)")
+    parser.add_argument("--column", type=str, default=None,
+        help="Column of whitespace-separated stems (default: the column of the dataset, e.g. text for news)")
+    parser.add_argument("--min_df", type=int, default=MIN_DF,
+        help=f"Minimum number of documents a term must occur in (default: {MIN_DF})")
+    parser.add_argument("--max_df", type=float, default=MAX_DF,
+        help=f"Maximum fraction of the documents a term may occur in (default: {MAX_DF})")
+    parser.add_argument("--top_n", type=int, default=TOP_N,
+        help=f"Number of most frequent terms kept, by document frequency, or 0 to keep all (default: {TOP_N})")
+    parser.add_argument("-o", "--output", type=str, default=None,
+        help=f"Pruned gensim dictionary (default: '<DATA_DIR>/{OUTPUT_DIR}/<dataset>.dict')")
+    parser.add_argument("--rescan", action="store_true",
+        help="Collect the statistics again even if they are cached")
+    parser.add_argument("--profile", action="store_true",
+        help="Profile every stage with cProfile and save the stats next to the output")
+    args = parser.parse_args()
+
+    if args.min_df < 1:
+        parser.error("min_df must be at least 1")
+    if not 0 < args.max_df <= 1:
+        parser.error("max_df must be in (0, 1]")
+    if args.top_n < 0:
+        parser.error("top_n cannot be negative")
+
+    data_dir = pathlib.Path(CONFIG["DATA_DIR"])
+    output = pathlib.Path(args.output) if args.output is not None else data_dir / OUTPUT_DIR / f"{args.dataset}.dict"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    timer = instrumentation.StageTimer(output.with_name(output.stem + "_profiles") if args.profile else None)
+
+    path = data_dir / generate_topics.DATASET_FILES[args.dataset]
+    column = args.column if args.column is not None else TEXT_COLUMNS[args.dataset]
+    with timer.stage("stats"):
+        stats = VocabularyStats.cached(path, data_dir / "cache" / STATS_DIR, column=column, rescan=args.rescan)
+    with timer.stage("prune"):
+        gensim_dict = stats.dictionary(args.min_df, args.max_df, args.top_n or None)
+    gensim_dict.save(str(output))
+    # Read by generate_topics.py and dtm.py, which only accept the dictionary for this dataset
+    settings = {
+        "dataset": args.dataset, "file": str(path), "column": column,
+        "min_df": args.min_df, "max_df": args.max_df, "top_n": args.top_n,
+    }
+    with open(corpora.vocabulary_settings_path(output), "w") as f:
+        json.dump(settings, f, indent=4)
+    print(f"Kept {len(gensim_dict)} of {len(stats.df)} terms, saved pruned dictionary to '{output}'")
+    timer.write_csv(output.with_name(output.stem + "_timings.csv"))
+
+
+class VocabularyStats:
+    """
+    Document and term frequency of every term of a corpus, collected in one pass over its parquet or CSV file.
+    Pruning only reads these statistics, so any thresholds can be tried without rescanning the corpus.
+
+    Documents are split on whitespace, like `corpora.ParquetTexts`, so the terms are those gensim sees.
+
+    Layout of the cache directory::
+
+        <directory>/
+            stats.parquet  # term, df, tf, sorted by decreasing df then term
+            settings.json  # input file, column and number of documents
+
+    Parameters
+    ----------
+    df : pl.DataFrame
+        Statistics of each term, with columns `term`, `df` (number of documents it occurs in) and
+        `tf` (number of occurrences), sorted by decreasing `df` then `term`.
+    n_docs : int
+        Number of documents, empty ones included.
+    """
+    def __init__(self, df: pl.DataFrame, n_docs: int):
+        self.df = df
+        self.n_docs = n_docs
+
+    @classmethod
+    def scan(cls, path: pathlib.Path, column: str = "text", batch_size: int = BATCH_SIZE) -> "VocabularyStats":
+        """
+        Collects the statistics of a parquet or CSV file in one pass.
+        Documents are counted in batches of rows, each folded into the running totals,
+        so memory grows with the vocabulary and the batch size, not with the corpus.
+        """
+        lf = scan_file(path).select(pl.col(column).str.extract_all(r"\S+").alias("term"))
+        n_docs = lf.select(pl.len()).collect().item()
+        stats = pl.DataFrame(schema={"term": pl.String, "df": pl.UInt32, "tf": pl.UInt64})
+        for offset in range(0, n_docs, batch_size):
+            # Slices are pushed down to the parquet reader, as in `corpora.ParquetTexts`.
+            # The CSV reader reads the file up to the slice, which is fine for the small `fed` corpus.
+            # Polars' streaming engine is not used, since it crashes on `explode`.
+            terms = lf.slice(offset, batch_size)
+            tf = terms.explode("term").group_by("term").agg(tf=pl.len())
+            df = terms.select(pl.col("term").list.unique()).explode("term").group_by("term").agg(df=pl.len())
+            batch = df.join(tf, on="term").drop_nulls("term").collect()
+            stats = (
+                pl.concat([stats, batch], how="vertical_relaxed")
+                .group_by("term")
+                .agg(pl.col("df").sum().cast(pl.UInt32), pl.col("tf").sum().cast(pl.UInt64))
+            )
+        return cls(stats.sort(["df", "term"], descending=[True, False]), n_docs)
+
+    @classmethod
+    def load(cls, directory: pathlib.Path) -> "VocabularyStats":
+        directory = pathlib.Path(directory)
+        with open(directory / SETTINGS_FILE) as f:
+            settings = json.load(f)
+        return cls(pl.read_parquet(directory / STATS_FILE), settings["n_docs"])
+
+    def save(self, directory: pathlib.Path, settings: dict):
+        directory = pathlib.Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        tmp_path = (directory / STATS_FILE).with_suffix(".tmp")
+        self.df.write_parquet(tmp_path)
+        tmp_path.replace(directory / STATS_FILE)
+        # Written last, so interrupted statistics are never mistaken for finished ones
+        with open(directory / SETTINGS_FILE, "w") as f:
+            json.dump({**settings, "n_docs": self.n_docs}, f, indent=4)
+
+    @classmethod
+    def cached(cls, path: pathlib.Path, cache_dir: pathlib.Path, column: str = "text", rescan: bool = False) -> "VocabularyStats":
+        """
+        Returns the statistics of a parquet or CSV file, scanning it only if they are not cached yet or the file changed.
+
+        Parameters
+        ----------
+        path : pathlib.Path
+            Parquet or CSV file of stemmed documents.
+        cache_dir : pathlib.Path
+            Directory holding all cached statistics. Each file and column gets its own subdirectory.
+        column : str, optional
+            Column of whitespace-separated stems. Default `"text"`.
+        rescan : bool, optional
+            Whether to scan the file even if its statistics are cached. Default `False`.
+        """
+        settings = {"file": str(path), "column": column}
+        directory = pathlib.Path(cache_dir) / corpora.cache_key({"column": column}, path)
+        if not rescan and (directory / SETTINGS_FILE).exists():
+            return cls.load(directory)
+        print(f"Collecting vocabulary statistics of '{path}'...")
+        stats = cls.scan(path, column)
+        stats.save(directory, settings)
+        return stats
+
+    def prune(self, min_df: int = MIN_DF, max_df: float = MAX_DF, top_n: int | None = TOP_N) -> pl.DataFrame:
+        """
+        Returns the statistics of the terms kept, like gensim's `filter_extremes`.
+
+        Parameters
+        ----------
+        min_df : int, optional
+            Minimum number of documents a term must occur in. Default `5`.
+        max_df : float, optional
+            Maximum fraction of the documents a term may occur in. Default `0.5`.
+        top_n : int, optional
+            Number of terms kept after the other two filters, those occurring in the most documents.
+            Default `100_000`. `None` keeps them all. Ties at the cut are broken by term,
+            where gensim keeps the terms it saw first.
+        """
+        kept = self.df.filter(pl.col("df").is_between(min_df, max_df * self.n_docs))
+        return kept if top_n is None else kept.head(top_n)
+
+    def dictionary(self, min_df: int = MIN_DF, max_df: float = MAX_DF, top_n: int | None = TOP_N) -> Dictionary:
+        """
+        Returns the gensim dictionary of the terms kept by `prune`, with their frequencies.
+        Terms get their ids in order of decreasing document frequency.
+        """
+        kept = self.prune(min_df, max_df, top_n)
+        gensim_dict = Dictionary()
+        gensim_dict.token2id = {term: i for i, term in enumerate(kept["term"])}
+        gensim_dict.dfs = dict(enumerate(kept["df"].to_list()))
+        gensim_dict.cfs = dict(enumerate(kept["tf"].to_list()))
+        # Corpus totals count every term, as they do after `filter_extremes`
+        gensim_dict.num_docs = self.n_docs
+        gensim_dict.num_pos = int(self.df["tf"].sum())
+        gensim_dict.num_nnz = int(self.df["df"].sum())
+        return gensim_dict
+
+
+def scan_file(path: pathlib.Path) -> pl.LazyFrame:
+    """
+    Scans a CSV file, like the `fed` communications, or a parquet file otherwise.
+    """
+    path = pathlib.Path(path)
+    return pl.scan_csv(path) if path.suffix == ".csv" else pl.scan_parquet(path)
+
+
+if __name__ == "__main__":
+    main()
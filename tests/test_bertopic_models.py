@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+from gensim.corpora.dictionary import Dictionary
+
+pytest.importorskip("bertopic")
+import bertopic_models  # noqa: E402
+import embeddings  # noqa: E402
+
+
+def test_fit_gives_one_normalized_row_per_topic(tmp_path):
+    rng = np.random.default_rng(0)
+    vocab = ["rate", "bank", "stock", "market", "inflat", "job", "tariff", "crypto"]
+    texts = [" ".join(rng.choice(vocab, size=12)) for _ in range(60)]
+    gensim_dict = Dictionary(t.split() for t in texts)
+    vectors = embeddings.EmbeddingStore(tmp_path, embeddings.HashingEmbedder(16)).embed(texts)
+
+    model = bertopic_models.fit(4, texts, np.asarray(vectors), gensim_dict, seed=0)
+    topics = model.get_topics()
+    assert -1 not in model.model.topic_representations_
+    assert topics.shape == (4, len(gensim_dict))
+    np.testing.assert_allclose(topics.sum(axis=1), 1, rtol=1e-5)
+    # Rows follow topic ids, like the top words BERTopic reports
+    for topic in range(4):
+        top_word = gensim_dict[int(np.argmax(topics[topic]))]
+        assert top_word == model.model.get_topic(topic)[0][0]
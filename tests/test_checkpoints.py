@@ -0,0 +1,30 @@
+import json
+
+import checkpoints
+
+
+CONFIG = {"dataset": "fed", "seed": 0, "lda": {"passes": 1}}
+
+
+def finish(run_dir: checkpoints.RunDirectory, n: int):
+    run_dir.model_path(n).touch()
+    run_dir.save_metrics({"n_topics": n, "coherence": 0.5})
+
+
+def test_execution_settings_keep_checkpoints(tmp_path):
+    finish(checkpoints.RunDirectory(tmp_path, CONFIG, execution={"workers": 4, "jobs": 1}), 5)
+
+    resumed = checkpoints.RunDirectory(tmp_path, CONFIG, execution={"workers": 2, "jobs": 2})
+    assert list(resumed.finished()) == [5]
+    with open(tmp_path / checkpoints.CONFIG_FILE) as f:
+        assert json.load(f)["execution"] == {"workers": 2, "jobs": 2}
+    assert not checkpoints.RunDirectory(tmp_path, {**CONFIG, "seed": 1}).finished()
+
+
+def test_metrics_df_of_a_fresh_run_is_empty(tmp_path):
+    run_dir = checkpoints.RunDirectory(tmp_path, CONFIG)
+    assert run_dir.metrics_df().schema == checkpoints.METRICS_SCHEMA
+    assert run_dir.metrics_df().is_empty()
+    finish(run_dir, 10)
+    finish(run_dir, 5)
+    assert run_dir.metrics_df()["n_topics"].to_list() == [5, 10]
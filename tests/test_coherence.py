@@ -0,0 +1,81 @@
+import gc
+import pickle
+
+import numpy as np
+import pytest
+from gensim.corpora.dictionary import Dictionary
+from gensim.models.coherencemodel import CoherenceModel
+
+import coherence
+
+
+def make_texts(seed: int = 0) -> list[list[str]]:
+    # Small vocabulary and long documents, so that words repeat within windows
+    rng = np.random.default_rng(seed)
+    vocab = [f"w{i}" for i in range(40)]
+    probs = rng.dirichlet(np.full(len(vocab), 0.3))
+    return [list(rng.choice(vocab, size=rng.integers(1, 150), p=probs)) for _ in range(60)]
+
+
+@pytest.mark.parametrize("measure", coherence.MEASURES)
+def test_topic_coherences_match_gensim(measure):
+    texts = make_texts()
+    gensim_dict = Dictionary(texts)
+    corpus = [gensim_dict.doc2bow(t) for t in texts]
+    rng = np.random.default_rng(1)
+    top_ids = np.stack([rng.choice(len(gensim_dict), size=8, replace=False) for _ in range(5)])
+
+    expected = CoherenceModel(
+        topics=top_ids.tolist(), dictionary=gensim_dict, corpus=corpus, texts=texts,
+        coherence=measure, processes=1,
+    ).get_coherence_per_topic()
+    index = coherence.CoherenceIndex(texts, gensim_dict)
+    np.testing.assert_allclose(index.topic_coherences(top_ids, measure), expected, atol=coherence.TOLERANCE)
+
+
+def test_block_size_does_not_change_counts(monkeypatch):
+    texts = make_texts(seed=2)
+    gensim_dict = Dictionary(texts)
+    top_ids = np.arange(10)[np.newaxis]
+    expected = coherence.CoherenceIndex(texts, gensim_dict).topic_coherences(top_ids, "c_npmi")
+    monkeypatch.setattr(coherence, "BLOCK_SIZE", 50)
+    result = coherence.CoherenceIndex(texts, gensim_dict).topic_coherences(top_ids, "c_npmi")
+    np.testing.assert_allclose(result, expected)
+
+
+def test_batched_build_matches_single_batch(monkeypatch):
+    texts = make_texts(seed=3) + [[]]
+    gensim_dict = Dictionary(texts[::2])
+    top_ids = np.random.default_rng(4).choice(len(gensim_dict), size=(3, 6), replace=False)
+    expected = {m: coherence.CoherenceIndex(texts, gensim_dict).topic_coherences(top_ids, m) for m in coherence.MEASURES}
+    monkeypatch.setattr(coherence, "BUILD_DOCS", 7)
+    monkeypatch.setattr(coherence, "BUILD_TOKENS", 50)
+    index = coherence.CoherenceIndex(texts, gensim_dict)
+    for measure in coherence.MEASURES:
+        np.testing.assert_array_equal(index.topic_coherences(top_ids, measure), expected[measure])
+
+
+def test_pickled_and_cached_indexes_share_the_directory(tmp_path):
+    texts = make_texts(seed=5)
+    gensim_dict = Dictionary(texts)
+    top_ids = np.arange(8)[np.newaxis]
+    index = coherence.CoherenceIndex.cached(tmp_path / "index", texts, gensim_dict)
+    expected = index.topic_coherences(top_ids, "c_v")
+
+    state = pickle.dumps(index)
+    assert len(state) < 1000
+    np.testing.assert_array_equal(pickle.loads(state).topic_coherences(top_ids, "c_v"), expected)
+    # Opened without reading the texts again
+    reopened = coherence.CoherenceIndex.cached(tmp_path / "index", iter(()), gensim_dict)
+    np.testing.assert_array_equal(reopened.topic_coherences(top_ids, "c_v"), expected)
+    assert not list((tmp_path / "index").glob("*.tmp"))
+
+
+def test_temporary_directory_is_removed_with_the_index():
+    texts = make_texts(seed=6)
+    index = coherence.CoherenceIndex(texts, Dictionary(texts))
+    directory = index.directory
+    assert directory.exists()
+    del index
+    gc.collect()
+    assert not directory.exists()
@@ -0,0 +1,38 @@
+import polars as pl
+import pytest
+
+import documents
+
+
+@pytest.fixture
+def files(tmp_path):
+    texts = ["fed rate", "bank stock", "inflat job"]
+    paths = {"stemmed": tmp_path / "stemmed.parquet", "legacy": tmp_path / "legacy.parquet", "final": tmp_path / "final.parquet"}
+    pl.DataFrame({documents.DOC_ID: [30, 10, 20], "text": texts}).write_parquet(paths["stemmed"])
+    pl.DataFrame({documents.LEGACY_ID: [10, 20], "text": texts[1:]}).write_parquet(paths["legacy"])
+    # Rewritten after filtering, without its IDs, so positions are not IDs
+    pl.DataFrame({"text": texts[2:0:-1]}).write_parquet(paths["final"])
+    return paths
+
+
+def test_build_leaves_out_files_without_ids(files, tmp_path):
+    unkeyed = documents.DocumentIndex.build(files, tmp_path / "index", hashed_file="stemmed")
+    assert unkeyed == ["final"]
+
+    index = documents.DocumentIndex(tmp_path / "index")
+    assert set(index.paths) == {"stemmed", "legacy"}
+    assert index.rows([20, 10, 30], "stemmed").tolist() == [2, 1, 0]
+    assert index.rows([20], "legacy").tolist() == [1]
+    with pytest.raises(KeyError):
+        index.rows([30], "legacy")
+    assert index.fetch([20, 10], "legacy", columns=["text"])["text"].to_list() == ["inflat job", "bank stock"]
+
+    final = pl.read_parquet(files["final"])["text"]
+    assert index.doc_ids_for_texts(final).rows() == [(0, 20), (1, 10)]
+
+
+def test_build_requires_ids_in_hashed_file(files, tmp_path):
+    with pytest.raises(ValueError):
+        documents.DocumentIndex.build(files, tmp_path / "index", hashed_file="final")
+    with pytest.raises(ValueError):
+        documents.DocumentIndex.build({"final": files["final"]}, tmp_path / "index")
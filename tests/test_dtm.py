@@ -0,0 +1,39 @@
+from datetime import date
+
+import polars as pl
+import pytest
+import scipy.io
+
+import dtm
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    path = tmp_path / "communications_final.parquet"
+    pl.DataFrame({
+        "date": [date(2007, 1, 31), date(2007, 3, 21), date(2007, 5, 9)],
+        "text": ["rate rate inflat", "", "bank rate"],
+        "cpi": [2.1, 2.4, 2.7],
+    }).write_parquet(path)
+    return path
+
+
+def test_export_writes_rows_of_the_dataset(dataset, tmp_path):
+    cache = dtm.build_cache("fed", dataset, tmp_path / "cache")
+    dtm.export(cache, tmp_path / "dtm", dtm.row_keys(dataset))
+
+    counts = scipy.io.mmread(tmp_path / "dtm" / dtm.MATRIX_FILE).toarray()
+    vocab = (tmp_path / "dtm" / dtm.VOCAB_FILE).read_text(encoding="utf-8").split()
+    assert [dict(zip(vocab, row)) for row in counts] == [
+        {"rate": 2, "inflat": 1, "bank": 0}, {"rate": 0, "inflat": 0, "bank": 0}, {"rate": 1, "inflat": 0, "bank": 1},
+    ]
+    rows = pl.read_parquet(tmp_path / "dtm" / dtm.ROWS_FILE)
+    assert rows.columns == ["row", "date"]
+    assert rows["date"].equals(pl.read_parquet(dataset)["date"])
+
+
+def test_export_rejects_keys_of_another_file(dataset, tmp_path):
+    cache = dtm.build_cache("fed", dataset, tmp_path / "cache")
+    with pytest.raises(ValueError):
+        dtm.export(cache, tmp_path / "dtm", dtm.row_keys(dataset).head(2))
+    assert not (tmp_path / "dtm").exists()
@@ -0,0 +1,56 @@
+import numpy as np
+
+import embeddings
+
+
+class CountingEmbedder(embeddings.HashingEmbedder):
+    """Hashing embedder recording the texts it encodes."""
+    def __init__(self, dim: int = 16):
+        super().__init__(dim)
+        self.encoded = []
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        self.encoded.extend(texts)
+        return super().encode(texts)
+
+
+def test_store_encodes_each_text_once(tmp_path):
+    embedder = CountingEmbedder()
+    store = embeddings.EmbeddingStore(tmp_path, embedder)
+    texts = ["rate hike", "bank stock", "rate hike", "job report"]
+    first = store.embed(texts, batch_size=2)
+    assert embedder.encoded == ["rate hike", "bank stock", "job report"]
+    assert len(store) == 3
+    np.testing.assert_array_equal(first, embedder.encode(texts).astype(np.float32))
+
+    # Hits are read back, and only the new text is encoded
+    embedder.encoded = []
+    second = store.embed(["job report", "inflat", "rate hike"])
+    assert embedder.encoded == ["inflat"]
+    np.testing.assert_array_equal(second[[0, 2]], first[[3, 0]])
+    assert second.dtype == np.float32
+
+
+def test_store_rows_follow_the_texts(tmp_path):
+    embedder = CountingEmbedder()
+    texts = ["a b", "c d", "e f"]
+    store = embeddings.EmbeddingStore(tmp_path, embedder)
+    stored = store.embed(texts)
+    assert isinstance(stored, np.memmap)
+
+    reopened = embeddings.EmbeddingStore(tmp_path, CountingEmbedder())
+    shuffled = reopened.embed(["e f", "a b", "e f", "c d"])
+    np.testing.assert_array_equal(shuffled, np.asarray(stored)[[2, 0, 2, 1]])
+    assert reopened.embedder.encoded == []
+
+
+def test_store_drops_vectors_of_an_interrupted_batch(tmp_path):
+    embedder = CountingEmbedder()
+    store = embeddings.EmbeddingStore(tmp_path, embedder)
+    store.embed(["a b"])
+    # Vectors written without their hashes
+    with open(store.directory / embeddings.VECTORS_FILE, "ab") as f:
+        f.write(np.ones(16, dtype=np.float32).tobytes())
+    result = store.embed(["c d", "a b"])
+    np.testing.assert_array_equal(result, embedder.encode(["c d", "a b"]).astype(np.float32))
+    assert (store.directory / embeddings.VECTORS_FILE).stat().st_size == 2 * 16 * 4
@@ -0,0 +1,72 @@
+import numpy as np
+import polars as pl
+import pytest
+from gensim.corpora.dictionary import Dictionary
+from gensim.models.ldamodel import LdaModel
+
+import checkpoints
+import corpora
+import documents
+import exports
+import generate_topics
+
+
+@pytest.fixture(scope="module")
+def model_and_corpus():
+    rng = np.random.default_rng(0)
+    texts = [list(rng.choice(["rate", "bank", "stock", "market", "inflat", "job"], size=20)) for _ in range(25)]
+    gensim_dict = Dictionary(texts)
+    corpus = [gensim_dict.doc2bow(t) for t in texts]
+    lda = LdaModel(corpus, num_topics=3, id2word=gensim_dict, random_state=0)
+    return lda, corpus
+
+
+@pytest.mark.parametrize("top_n", [None, 2])
+def test_write_theta_keys_rows_by_doc_id(model_and_corpus, tmp_path, top_n):
+    lda, corpus = model_and_corpus
+    doc_ids = np.arange(100, 100 + len(corpus)) * 7
+    exports.write_theta(lda, corpus, tmp_path / "theta.parquet", top_n=top_n, batch_size=4, doc_ids=doc_ids)
+    exports.write_theta(lda, corpus, tmp_path / "theta_doc.parquet", top_n=top_n, batch_size=4)
+    keyed = pl.read_parquet(tmp_path / "theta.parquet")
+    positional = pl.read_parquet(tmp_path / "theta_doc.parquet")
+
+    repeat = 1 if top_n is None else top_n
+    assert keyed.columns[0] == documents.DOC_ID
+    assert keyed[documents.DOC_ID].to_list() == np.repeat(doc_ids, repeat).tolist()
+    assert positional["doc"].to_list() == np.repeat(np.arange(len(corpus)), repeat).tolist()
+    assert keyed.columns[1:] == positional.columns[1:]
+
+
+def test_write_theta_checks_doc_id_count(model_and_corpus, tmp_path):
+    lda, corpus = model_and_corpus
+    with pytest.raises(ValueError):
+        exports.write_theta(lda, corpus, tmp_path / "theta.parquet", doc_ids=np.arange(3))
+    with pytest.raises(ValueError):
+        exports.write_theta(lda, corpus, tmp_path / "theta.parquet", doc_ids=np.arange(len(corpus) + 1))
+    assert not (tmp_path / "theta.parquet").exists()
+
+
+def test_export_models_appends_updates(model_and_corpus, tmp_path):
+    lda, corpus = model_and_corpus
+    run_dir = checkpoints.RunDirectory(tmp_path / "run", {"dataset": "news"})
+    for n in (3, 4):
+        run_dir.save_model(n, lda, exports.top_words_df(lda))
+        run_dir.save_metrics({"n_topics": n})
+
+    new_texts = [["rate", "bank"], ["job", "job", "stock"]]
+    update = tmp_path / "update.parquet"
+    pl.DataFrame({documents.DOC_ID: [900, 901], "text": [" ".join(t) for t in new_texts]}).write_parquet(update)
+    cache = corpora.CorpusCache(run_dir.path / checkpoints.UPDATES_DIR, "update")
+    cache.build(new_texts, {}, gensim_dict=lda.id2word)
+    # Applied to the model with 3 topics only, before IDs were kept in the cache
+    run_dir.record_update({"file": str(update), "key": "update", "n_topics": [3]})
+
+    doc_ids = np.arange(len(corpus))
+    generate_topics.export_models(run_dir, corpus, doc_ids=doc_ids)
+    updated = pl.read_parquet(run_dir.theta_path(3))
+    assert updated[documents.DOC_ID].to_list() == doc_ids.tolist() + [900, 901]
+    assert pl.read_parquet(run_dir.theta_path(4))[documents.DOC_ID].to_list() == doc_ids.tolist()
+    assert cache.doc_ids().tolist() == [900, 901]
+
+    generate_topics.export_models(run_dir, corpus)
+    assert pl.read_parquet(run_dir.theta_path(3))["doc"].to_list() == list(range(len(corpus) + 2))
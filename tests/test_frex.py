@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+import scipy.sparse as sps
+from scipy.stats import rankdata
+
+import frex
+
+
+def reference(topics: np.ndarray, top_words: int = 10, weight: float = 0.7, n_words: int = 10):
+    """
+    FREX as in stm's R code: ECDFs within each topic, with average ranks for ties.
+    Returns the score and the FREX words of each topic.
+    """
+    topics = np.asarray(topics, dtype=np.float64)
+    num_words = topics.shape[1]
+    ex = rankdata(topics / topics.sum(axis=0), axis=1) / num_words
+    fr = rankdata(topics, axis=1) / num_words
+    values = 1.0 / (weight / (ex + frex.EPSILON) + (1 - weight) / (fr + frex.EPSILON))
+    top = np.argsort(-topics, axis=1, kind="stable")[:, :top_words]
+    words = np.argsort(-values, axis=1, kind="stable")[:, :n_words]
+    return np.take_along_axis(values, top, axis=1).sum(axis=1), words
+
+
+def make_topics(seed: int = 0, num_topics: int = 12, num_words: int = 300, ties: bool = False) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    topics = rng.dirichlet(np.full(num_words, 0.1), size=num_topics)
+    if ties:
+        # Coarse values, so that many words tie within each topic
+        topics = np.round(topics, 3) + 1e-3
+        topics /= topics.sum(axis=1, keepdims=True)
+    return topics
+
+
+def make_sparse(seed: int = 0, num_topics: int = 12, num_words: int = 300) -> np.ndarray:
+    # Dense matrix with many zeros, but none in a whole column, where exclusivity is undefined
+    rng = np.random.default_rng(seed)
+    topics = make_topics(seed, num_topics, num_words)
+    topics[rng.random(topics.shape) < 0.7] = 0
+    topics[rng.integers(num_topics, size=num_words), np.arange(num_words)] += 1e-4
+    return topics / topics.sum(axis=1, keepdims=True)
+
+
+@pytest.mark.parametrize("ties", [False, True])
+def test_exclusivity_matches_reference(ties):
+    topics = make_topics(ties=ties)
+    expected, _ = reference(topics)
+    np.testing.assert_allclose(frex.exclusivity(topics), expected, rtol=1e-12)
+
+
+def test_exclusivity_chunked():
+    topics = make_topics(ties=True)
+    expected, _ = reference(topics, top_words=5, weight=0.5)
+    # One topic per chunk, and chunks smaller than a row
+    for chunk_elements in (300, 1):
+        result = frex.exclusivity(topics, top_words=5, exclusivity_weight=0.5, chunk_elements=chunk_elements)
+        np.testing.assert_allclose(result, expected, rtol=1e-12)
+
+
+def test_exclusivity_float32():
+    topics = make_topics().astype(np.float32)
+    expected, _ = reference(topics)
+    np.testing.assert_allclose(frex.exclusivity(topics), expected, rtol=1e-5)
+
+
+def test_exclusivity_sparse():
+    topics = make_sparse()
+    expected, _ = reference(topics)
+    np.testing.assert_allclose(frex.exclusivity(sps.csr_matrix(topics)), expected, rtol=1e-12)
+    np.testing.assert_allclose(frex.exclusivity(topics), expected, rtol=1e-12)
+
+
+@pytest.mark.parametrize("sparse", [False, True])
+def test_exclusivity_batch(sparse):
+    matrices = [make_sparse(seed) if sparse else make_topics(seed, ties=True) for seed in range(3)]
+    weights = [0.7, 0.5]
+    inputs = [sps.csr_matrix(m) for m in matrices] if sparse else matrices
+    results = frex.exclusivity_batch(inputs, weights, top_words=10, n_words=7, chunk_elements=600)
+    for topics, result in zip(matrices, results):
+        for i, w in enumerate(weights):
+            expected_scores, expected_words = reference(topics, 10, w, n_words=7)
+            np.testing.assert_allclose(result.scores[i], expected_scores, rtol=1e-12)
+            np.testing.assert_array_equal(result.words[i], expected_words)
+
+
+def test_truncate_keeps_top_words():
+    topics = make_topics()
+    truncated = frex.truncate(topics, 20)
+    assert truncated.shape == topics.shape
+    assert (truncated.getnnz(axis=1) == 20).all()
+    top = np.sort(np.argsort(-topics, axis=1, kind="stable")[:, :20], axis=1)
+    np.testing.assert_array_equal(truncated.indices.reshape(-1, 20), top)
+    np.testing.assert_array_equal(truncated.toarray()[np.arange(12)[:, None], top], np.take_along_axis(topics, top, axis=1))
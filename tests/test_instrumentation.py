@@ -0,0 +1,28 @@
+import pytest
+
+import instrumentation
+
+
+def test_timed_records_a_stage_per_call():
+    timer = instrumentation.StageTimer()
+
+    @timer.timed()
+    def export(n):
+        """Exports n things."""
+        return n * 2
+
+    @timer.timed("train", n_topics=5)
+    def fail():
+        raise RuntimeError
+
+    assert export(3) == 6
+    assert export.__doc__ == "Exports n things."
+    with pytest.raises(RuntimeError):
+        fail()
+    with timer.stage("outer"):
+        export(1)
+
+    df = timer.df()
+    assert df["stage"].to_list() == ["export", "train", "export", "outer"]
+    assert df["n_topics"].to_list() == [None, 5, None, None]
+    assert (df["seconds"] >= 0).all()
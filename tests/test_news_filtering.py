@@ -0,0 +1,46 @@
+import polars as pl
+import pytest
+
+import documents
+import news_filtering
+
+
+@pytest.fixture
+def raw_csv(tmp_path):
+    path = tmp_path / "raw.csv"
+    pl.DataFrame({
+        "Unnamed: 0": [0, 1, 2, 3, 4, 5],
+        "Date": [
+            "2020-01-02 10:00:00 UTC", "1999-01-01 10:00:00 UTC", "2021-05-06 12:30:00 UTC",
+            "2022-03-04 08:00:00 UTC", "2023-07-08 09:15:00 UTC", "2019-11-12 16:45:00 UTC",
+        ],
+        "Article_title": ["Fed holds rates", "Old news", "Рынок", None, "Stocks rally", "Jobs report"],
+        "Article": ["text a", "text b", "text c", "text d", None, "text f"],
+        "Url": [f"https://example.com/{i}" for i in range(6)],
+        "Publisher": ["Reuters", "Reuters", "Benzinga", "Reuters", "Reuters", "Benzinga"],
+        "Author": ["A", "B", "C", "D", "E", "F"],
+    }).write_csv(path)
+    return path
+
+
+def test_debug_writes_every_step(raw_csv, tmp_path):
+    steps = news_filtering.filter_steps(pl.scan_csv(raw_csv))
+    output = tmp_path / "out.parquet"
+    news_filtering.sink_steps(steps, output, debug_dir=tmp_path)
+
+    ids = {
+        step: pl.read_parquet(tmp_path / name)[documents.DOC_ID].to_list()
+        for step, name in news_filtering.STEP_FILES.items() if step != "no_null_articles"
+    }
+    assert ids == {"relevant_cols": [0, 1, 2, 3, 4, 5], "date": [0, 2, 3, 4, 5], "no_russians": [0, 4, 5]}
+    assert pl.read_parquet(output)[documents.DOC_ID].to_list() == [0, 5]
+    assert not output.with_suffix(".tmp").exists()
+
+
+def test_publishers_filter(raw_csv, tmp_path):
+    steps = news_filtering.filter_steps(pl.scan_csv(raw_csv), publishers=["Benzinga"])
+    news_filtering.sink_steps(steps, tmp_path / "out.parquet")
+    df = pl.read_parquet(tmp_path / "out.parquet")
+    assert df[documents.DOC_ID].to_list() == [5]
+    assert df.columns == list(news_filtering.RENAME_COLUMNS.values())
+    assert not (tmp_path / news_filtering.STEP_FILES["date"]).exists()
@@ -0,0 +1,31 @@
+import polars as pl
+import pytest
+
+import pad_vectors
+
+
+@pytest.mark.parametrize("dtype", [pl.Float64, pl.Float32])
+def test_align_fills_missing_columns(dtype):
+    lf = pl.LazyFrame({"rate": [-1.0, -2.0], "bank": [-3.0, -4.0]}, schema={"rate": dtype, "bank": dtype})
+    result = pad_vectors.align(lf, ["bank", "inflat", "rate"], fill_value=-99).collect()
+    assert result.columns == ["bank", "inflat", "rate"]
+    assert result.schema == pl.Schema({"bank": dtype, "inflat": dtype, "rate": dtype})
+    assert result["inflat"].to_list() == [-99, -99]
+    assert result["rate"].to_list() == [-1.0, -2.0]
+
+
+def test_pad_files(tmp_path):
+    fed = pl.DataFrame({"rate": [-1.0], "fed": [-2.0]})
+    news = pl.DataFrame({"stock": [-3.0], "rate": [-4.0], "market": [-5.0]})
+    paths = [tmp_path / "fed.parquet", tmp_path / "news.parquet"]
+    fed.write_parquet(paths[0])
+    news.write_parquet(paths[1])
+    out_paths = [pad_vectors.padded_path(p) for p in paths]
+
+    pad_vectors.pad_files(paths, out_paths)
+    columns = ["fed", "market", "rate", "stock"]
+    fill = pad_vectors.LARGE_NEGATIVE
+    assert pl.read_parquet(out_paths[0]).rows(named=True) == [{"fed": -2.0, "market": fill, "rate": -1.0, "stock": fill}]
+    assert pl.read_parquet(out_paths[1]).rows(named=True) == [{"fed": fill, "market": -5.0, "rate": -4.0, "stock": -3.0}]
+    assert all(pl.read_parquet_schema(p) == {c: pl.Float64 for c in columns} for p in out_paths)
+    assert not list(tmp_path.glob("*.tmp"))
@@ -0,0 +1,63 @@
+import nltk
+import polars as pl
+import pytest
+from nltk.tokenize import NLTKWordTokenizer
+
+import preprocessing
+from stemming import StemCache
+
+
+STOP_WORDS = {"the", "a", "of", "and", "is", "to", "in"}
+TEXTS = [
+    "The Committee decided to raise the target range of the federal funds rate.",
+    "Inflation is 2.5% and   unemployment IS at 3.9 percent, in 2023!!",
+    "Cannot, won't -- e-commerce; naïve café résumé",
+    "",
+    "123 456 ...",
+    None,
+    "Running runners ran; the economy's outlook was weakening and strengthening",
+]
+
+
+def reference(text: str | None, stemmer) -> str | None:
+    # The per-row functions the vectorized pipeline replaced
+    if text is None:
+        return None
+    return preprocessing.stem(preprocessing.preprocess(text, STOP_WORDS), stemmer, NLTKWordTokenizer().tokenize)
+
+
+def test_clean_expr_matches_preprocess():
+    df = pl.DataFrame({"text": TEXTS}).select(preprocessing.clean_expr("text", STOP_WORDS).list.join(" "))
+    expected = [None if t is None else preprocessing.preprocess(t, STOP_WORDS) for t in TEXTS]
+    assert df["text"].to_list() == expected
+
+
+def test_preprocess_and_stem_matches_per_row_functions(tmp_path):
+    stem_cache = StemCache(tmp_path)
+    lf = pl.LazyFrame({"text": TEXTS})
+    result = preprocessing.preprocess_and_stem(lf, "text", STOP_WORDS, stem_cache).collect()["text"].to_list()
+    assert result == [reference(t, stem_cache.stemmer) for t in TEXTS]
+
+
+def test_stem_expr_stems_every_token():
+    # Every token of a row is looked up, not only the first ones
+    table = pl.DataFrame({"token": ["rates", "raised", "banks"], "stem": ["rate", "rais", "bank"]})
+    tokens = pl.DataFrame({"tokens": [["banks", "rates", "raised", "banks"], ["raised"], []]})
+    result = tokens.select(preprocessing.stem_expr(pl.col("tokens"), table))["tokens"].to_list()
+    assert result == ["bank rate rais bank", "rais", ""]
+
+
+def test_check_parity_runs_without_punkt(tmp_path):
+    preprocessing.check_parity(pl.Series(TEXTS), STOP_WORDS, StemCache(tmp_path))
+
+
+def test_treebank_tokenizer_matches_word_tokenize():
+    try:
+        nltk.word_tokenize("check")
+    except LookupError:
+        pytest.skip("nltk's Punkt data is not installed")
+    for text in TEXTS:
+        if text is None:
+            continue
+        clean = preprocessing.preprocess(text, STOP_WORDS)
+        assert nltk.word_tokenize(clean) == NLTKWordTokenizer().tokenize(clean)
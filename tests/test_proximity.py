@@ -0,0 +1,49 @@
+import numpy as np
+import polars as pl
+import pytest
+from scipy.spatial import distance
+
+import proximity
+
+
+def write_topics(path, columns, seed, num_topics, mass=1.0):
+    rng = np.random.default_rng(seed)
+    probs = rng.dirichlet(np.full(len(columns), 0.5), size=num_topics) * mass
+    pl.DataFrame(np.log(probs), schema=columns, orient="row").write_parquet(path)
+    return probs
+
+
+def padded(probs, columns, vocab):
+    # Topics over the union of the vocabularies, normalized, with zeros for missing words
+    out = np.zeros((len(probs), len(vocab)))
+    out[:, [vocab.index(c) for c in columns]] = probs / probs.sum(axis=1, keepdims=True)
+    return out
+
+
+@pytest.mark.parametrize("block_elements", [7, proximity.BLOCK_ELEMENTS])
+def test_similarity_matches_scipy(tmp_path, block_elements):
+    left_columns = [f"w{i}" for i in range(30)]
+    right_columns = [f"w{i}" for i in range(12, 45)][::-1]
+    left = write_topics(tmp_path / "left.parquet", left_columns, seed=0, num_topics=4)
+    # Not quite normalized, as after padding and rounding
+    right = write_topics(tmp_path / "right.parquet", right_columns, seed=1, num_topics=5, mass=0.9)
+    vocab = sorted({*left_columns, *right_columns})
+    p, q = padded(left, left_columns, vocab), padded(right, right_columns, vocab)
+
+    result = proximity.similarity(tmp_path / "left.parquet", tmp_path / "right.parquet", block_elements=block_elements)
+    expected = {
+        "cosine": 1 - distance.cdist(p, q, "cosine"),
+        "hellinger": 1 - distance.cdist(np.sqrt(p), np.sqrt(q), "euclidean") / np.sqrt(2),
+        "jensen_shannon": 1 - np.array([[distance.jensenshannon(a, b, base=2) ** 2 for b in q] for a in p]),
+    }
+    assert set(result) == set(expected)
+    for metric, matrix in expected.items():
+        np.testing.assert_allclose(result[metric], matrix, atol=1e-10, err_msg=metric)
+
+
+def test_identical_files_are_fully_similar(tmp_path):
+    columns = [f"w{i}" for i in range(20)]
+    write_topics(tmp_path / "topics.parquet", columns, seed=2, num_topics=3)
+    result = proximity.similarity(tmp_path / "topics.parquet", tmp_path / "topics.parquet", block_elements=5)
+    for metric, matrix in result.items():
+        np.testing.assert_allclose(np.diag(matrix), 1, atol=1e-7, err_msg=metric)
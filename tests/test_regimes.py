@@ -0,0 +1,49 @@
+from datetime import date, datetime, timedelta
+
+import polars as pl
+import pytest
+
+import regimes
+from presidents_and_chairmen import CHAIRMEN, PRESIDENTS
+from regimes import Role
+
+
+def loop_role(day: date, roles: list[Role]) -> Role | None:
+    # The daily loop `annotate` replaced: the first role listed with start <= day <= end
+    for r in roles:
+        if r.start <= day <= r.end:
+            return r
+    return None
+
+
+def every_day(start: date, end: date) -> list[date]:
+    return [start + timedelta(days=i) for i in range((end - start).days + 1)]
+
+
+@pytest.mark.parametrize("roles", [PRESIDENTS, CHAIRMEN])
+def test_annotate_right_matches_loop(roles):
+    days = every_day(date(1985, 1, 1), date(2030, 12, 31))
+    df = regimes.annotate(pl.DataFrame({"date": days}), roles, {"name": "name", "party": "party"}, closed="right")
+    expected = [loop_role(d, roles) for d in days]
+    assert df["name"].to_list() == [None if r is None else r.name for r in expected]
+    assert df["party"].to_list() == [None if r is None else r.party for r in expected]
+
+
+def test_annotate_left_labels_boundary_with_incoming_role():
+    days = [date(2009, 1, 19), date(2009, 1, 20), date(2009, 1, 21), date(2000, 1, 1), date(2029, 1, 20), date(2029, 1, 21)]
+    df = regimes.annotate(pl.DataFrame({"date": days}), PRESIDENTS, {"name": "president"})
+    assert df["president"].to_list() == ["George W. Bush", "Barack Obama", "Barack Obama", None, "Donald Trump", None]
+
+
+def test_annotate_lazy_datetimes_in_any_order():
+    days = [datetime(2017, 1, 20, 15), datetime(2006, 1, 31, 9), None, datetime(2014, 2, 1)]
+    roles = list(reversed(CHAIRMEN))
+    lf = regimes.annotate(pl.LazyFrame({"date": days}), roles, {"name": "fed_chair"}, closed="right")
+    assert isinstance(lf, pl.LazyFrame)
+    assert lf.collect()["fed_chair"].to_list() == ["Janey Yellen", "Alan Greenspan", None, "Ben Bernanke"]
+
+
+def test_sort_roles_rejects_overlaps():
+    roles = [Role("A", None, date(2000, 1, 1), date(2001, 1, 2)), Role("B", None, date(2001, 1, 1), date(2002, 1, 1))]
+    with pytest.raises(ValueError):
+        regimes.sort_roles(roles)
@@ -0,0 +1,38 @@
+import numpy as np
+import polars as pl
+
+import search
+
+
+def test_coarse_grid_includes_both_ends():
+    assert search.coarse_grid(5, 30, 5) == [5, 10, 15, 20, 25, 30]
+    assert search.coarse_grid(5, 27, 5) == [5, 10, 15, 20, 25, 27]
+    assert search.coarse_grid(5, 5, 5) == [5]
+
+
+def test_neighbourhood_stays_within_range():
+    assert search.neighbourhood([5, 20], 5, 5, 22) == [5, 6, 7, 8, 9, 16, 17, 18, 19, 20, 21, 22]
+
+
+def test_pareto_layers():
+    points = np.array([
+        [1.0, 5.0],  # front
+        [3.0, 3.0],  # front
+        [5.0, 1.0],  # front
+        [2.0, 2.0],  # beaten by [3, 3] only
+        [3.0, 3.0],  # equal to a front point, so not dominated by it
+        [1.0, 1.0],  # beaten by [2, 2] too
+        [0.5, 5.0],  # beaten by [1, 5] on one objective, tied on the other
+    ])
+    assert search.pareto_layers(points).tolist() == [0, 0, 0, 1, 0, 2, 1]
+
+
+def test_frontier_order_breaks_ties_by_rank_sum_then_topics():
+    df = pl.DataFrame({
+        "n_topics": [5, 10, 15, 20, 25],
+        "coherence": [0.1, 0.5, 0.3, 0.2, 0.4],
+        "exclusivity": [0.9, 0.5, 0.7, 0.1, 0.6],
+    })
+    # Front: 5, 10, 15, 25. Rank sums: 5 -> 5 + 1, 10 -> 1 + 4, 15 -> 3 + 2, 25 -> 2 + 3.
+    # 10, 15 and 25 tie on 5 and are ordered by number of topics. 20 is dominated.
+    assert search.frontier_order(df) == [10, 15, 25, 5, 20]
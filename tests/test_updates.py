@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+from gensim.corpora.dictionary import Dictionary
+from gensim.models.ldamulticore import LdaMulticore
+
+import updates
+
+
+def make_texts(words, seed, n_docs=40):
+    rng = np.random.default_rng(seed)
+    return [list(rng.choice(words, size=15)) for _ in range(n_docs)]
+
+
+@pytest.mark.parametrize("per_term_eta", [False, True])
+def test_extended_model_learns_new_terms(per_term_eta):
+    old_words = ["rate", "bank", "stock", "market", "inflat", "job"]
+    texts = make_texts(old_words, seed=0)
+    gensim_dict = Dictionary(texts)
+    lda = LdaMulticore([gensim_dict.doc2bow(t) for t in texts], num_topics=3, id2word=gensim_dict,
+        workers=1, random_state=0)
+    if per_term_eta:
+        # A per-term prior, like one learned with eta="auto"
+        lda.eta = np.linspace(0.1, 0.3, len(gensim_dict), dtype=lda.dtype)
+        lda.state.eta = lda.eta
+    num_terms = lda.num_terms
+    old_sstats = lda.state.sstats.copy()
+    old_eta = np.array(lda.eta, copy=True)
+
+    new_texts = make_texts(old_words + ["crypto", "tariff"], seed=1)
+    assert updates.extend_dictionary(gensim_dict, new_texts, min_df=2) == 2
+    updates.extend_model_vocabulary(lda, gensim_dict)
+
+    assert lda.num_terms == len(gensim_dict) == num_terms + 2
+    assert lda.state.sstats.shape == lda.expElogbeta.shape == (3, num_terms + 2)
+    assert lda.eta.shape[-1] == num_terms + 2
+    np.testing.assert_array_equal(lda.state.sstats[:, :num_terms], old_sstats)
+    np.testing.assert_array_equal(lda.state.sstats[:, num_terms:], 0)
+    np.testing.assert_array_equal(lda.eta[..., :num_terms], old_eta)
+
+    lda.update([gensim_dict.doc2bow(t) for t in new_texts])
+    topics = lda.get_topics()
+    assert topics.shape == (3, num_terms + 2)
+    np.testing.assert_allclose(topics.sum(axis=1), 1, rtol=1e-5)
+    new_ids = [gensim_dict.token2id[w] for w in ("crypto", "tariff")]
+    assert (lda.state.sstats[:, new_ids].sum(axis=0) > 0).all()
+
+
+def test_smaller_dictionary_is_rejected():
+    texts = make_texts(["rate", "bank", "stock"], seed=2)
+    gensim_dict = Dictionary(texts)
+    lda = LdaMulticore([gensim_dict.doc2bow(t) for t in texts], num_topics=2, id2word=gensim_dict, workers=1)
+    with pytest.raises(ValueError):
+        updates.extend_model_vocabulary(lda, Dictionary([["rate"]]))
@@ -0,0 +1,27 @@
+import json
+
+import polars as pl
+
+import corpora
+import generate_topics
+import vocabulary
+
+
+def test_scan_reads_csv_like_parquet(tmp_path):
+    df = pl.DataFrame({"stemmed_text": ["rate rate inflat", "bank  rate", None, "inflat"]})
+    df.write_csv(tmp_path / "communications.csv")
+    df.write_parquet(tmp_path / "communications.parquet")
+    from_csv = vocabulary.VocabularyStats.scan(tmp_path / "communications.csv", "stemmed_text", batch_size=3)
+    from_parquet = vocabulary.VocabularyStats.scan(tmp_path / "communications.parquet", "stemmed_text")
+    assert from_csv.n_docs == from_parquet.n_docs == 4
+    assert from_csv.df.equals(from_parquet.df)
+    assert from_csv.df.rows() == [("inflat", 2, 2), ("rate", 2, 3), ("bank", 1, 1)]
+
+
+def test_vocabulary_error_rejects_other_datasets(tmp_path):
+    path = tmp_path / "news.dict"
+    assert generate_topics.vocabulary_error(path, "news") is not None
+    with open(corpora.vocabulary_settings_path(path), "w") as f:
+        json.dump({"dataset": "news"}, f)
+    assert generate_topics.vocabulary_error(path, "news") is None
+    assert "news" in generate_topics.vocabulary_error(path, "fed")